@@ -1,8 +1,9 @@
 
 import os
 from collections import Counter
-import glob
 import yaml
+
+from label_index import load_split
 import matplotlib.pyplot as plt
 
 def analyze_dataset(root_dir):
@@ -17,21 +18,12 @@ def analyze_dataset(root_dir):
     stats = {}
     
     for split in splits:
-        label_dir = os.path.join(root_dir, split, 'labels')
-        label_files = glob.glob(os.path.join(label_dir, '*.txt'))
-        
-        cnt = Counter()
-        for lf in label_files:
-            with open(lf, 'r') as f:
-                lines = f.readlines()
-                for line in lines:
-                    try:
-                        cls_id = int(line.strip().split()[0])
-                        cnt[cls_id] += 1
-                    except:
-                        pass
+        # Cached array index: the histogram is one bincount, not a pass over every .txt
+        index = load_split(root_dir, split)
+        hist = index.class_histogram()
+        cnt = Counter({cls_id: int(n) for cls_id, n in enumerate(hist) if n})
         stats[split] = cnt
-        print(f"\nStats for {split} ({len(label_files)} files):")
+        print(f"\nStats for {split} ({index.num_images} files):")
         for cls_id, count in cnt.items():
             name = classes.get(cls_id, str(cls_id))
             print(f"  {name}: {count}")
@@ -1,13 +1,26 @@
 
 import streamlit as st
-from ultralytics import YOLO
 import cv2
 import numpy as np
 import pandas as pd
 from PIL import Image
 import tempfile
+import time
 import os
 
+import profiling
+from inference_client import InferenceClient
+from detection_store import filter_dets
+from inference_queue import InferenceQueue, QueueFull
+from openvino_backend import OpenVINODetector, is_openvino_dir
+from model_registry import get_model, resolve_path
+from render import draw_detections
+from result_cache import ResultCache, image_digest, model_fingerprint, cache_key
+from yolo_text import to_numpy
+
+# Set SERVESMART_PROFILE=<dir> to write stage timings after every analysis (trace of the newest spans)
+profile_dir = profiling.enable_from_env()
+
 # Page Config
 st.set_page_config(page_title="EQUINOX | Advanced Vision", page_icon="🌑", layout="wide")
 
@@ -185,16 +198,107 @@ st.markdown("""
 st.sidebar.markdown("### 🎛️ CONTROL PANEL")
 st.sidebar.markdown("<br>", unsafe_allow_html=True)
 conf_thresh = st.sidebar.slider("SENSITIVITY", 0.1, 1.0, 0.25, 0.05)
-model_path = st.sidebar.text_input("NEURAL CORE", r"best.pt")
+model_path = st.sidebar.text_input("NEURAL CORE", r"best.pt")  # path or registry name, e.g. military-l-int8
+# Optional: hand inference to a shared inference_server.py instead of loading a model per app process
+server_url = st.sidebar.text_input("INFERENCE SERVER", "", placeholder="http://127.0.0.1:8765").strip()
 
 # Load Model
-@st.cache_resource
+# The registry keeps models warm across reruns and sessions and reloads them when the file changes
 def load_model(path):
-    return YOLO(path)
+    if is_openvino_dir(resolve_path(path)):
+        # e.g. best_int8_openvino_model/ runs on the dedicated CPU backend
+        # LATENCY hint: one request at a time, all cores on it (interactive use)
+        return get_model(path, native_openvino=True, hint='LATENCY')
+    return get_model(path)
+
+@st.cache_resource
+def get_client(url):
+    return InferenceClient(url)
 
+# Looked up on every rerun (slider moves included), so not a request each time
+@st.cache_data(ttl=30)
+def server_model(url):
+    return get_client(url).health()['model']
+
+# Re-uploaded frames are answered from the detection cache (shared on disk with predict.py)
+@st.cache_resource
+def get_result_cache():
+    return ResultCache()
+
+# Analyses run on one background queue shared by all sessions (inference_queue.py).
+# The network runs once per image at the slider's floor; SENSITIVITY changes only refilter.
+RAW_CONF = 0.1
+
+@st.cache_resource
+def get_inference_queue():
+    return InferenceQueue(max_pending=16)
+
+def analysis_job(upload, model, client, result_cache, key):
+    # Runs on the queue thread: no st.* calls in here.
+    # The full-resolution decode happens only here, for the model.
+    def run():
+        start_time = time.time()
+        if client is not None:
+            with profiling.stage('inference'):
+                dets, shape = client.predict(upload, conf=RAW_CONF)
+        else:
+            with profiling.stage('decode'):
+                image = cv2.imdecode(np.frombuffer(upload, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if image is None:
+                raise ValueError("could not decode the uploaded image")
+            shape = image.shape[:2]
+            with profiling.stage('inference'):
+                if isinstance(model, OpenVINODetector):
+                    dets = model.predict(image, conf=RAW_CONF)
+                else:
+                    results = model.predict(image, conf=RAW_CONF, verbose=False)
+                    dets = to_numpy(results[0].boxes.data)
+        result_cache.put(key, dets, shape)
+        return np.asarray(dets, dtype=np.float32).reshape(-1, 6), tuple(shape), (time.time() - start_time) * 1000
+    return run
+
+# Reruns (every widget change) only need the preview: it is decoded at reduced resolution
+# straight from a memoryview of the upload and kept per session, and boxes are drawn on it.
+PREVIEW_MAX = 1280
+REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+def decode_preview(uploaded_file, upload, max_side=PREVIEW_MAX):
+    # Largest decoder-side downscale that keeps >= max_side pixels (JPEG scales in the DCT,
+    # far cheaper than a full decode), then at most one resize
+    flag = cv2.IMREAD_COLOR
+    try:
+        uploaded_file.seek(0)
+        side = max(Image.open(uploaded_file).size)  # header only
+        for factor, reduced in REDUCED_FLAGS:
+            if side // factor >= max_side:
+                flag = reduced
+                break
+    except OSError:
+        pass
+    img = cv2.imdecode(np.frombuffer(upload, dtype=np.uint8), flag)
+    if img is None:
+        return None
+    h, w = img.shape[:2]
+    s = max_side / max(h, w)
+    if s < 1:
+        img = cv2.resize(img, (max(1, round(w * s)), max(1, round(h * s))), interpolation=cv2.INTER_AREA)
+    return img
+
+client = None
+names = {}
 try:
-    if os.path.exists(model_path):
+    if server_url:
+        client = get_client(server_url)
+        names = client.names
+        model = None
+        st.sidebar.markdown("""
+        <div style="padding:10px; border-radius:10px; background:rgba(0,201,255,0.1); color:#00C9FF; text-align:center; margin-top:20px; border: 1px solid #00C9FF;">
+            ● REMOTE CORE LINKED
+        </div>
+        """, unsafe_allow_html=True)
+    elif os.path.exists(resolve_path(model_path)):
         model = load_model(model_path)
+        names = model.names
         st.sidebar.markdown("""
         <div style="padding:10px; border-radius:10px; background:rgba(0,201,255,0.1); color:#00C9FF; text-align:center; margin-top:20px; border: 1px solid #00C9FF;">
             ● NEURAL CORE ACTIVE
@@ -206,9 +310,14 @@ try:
 except Exception as e:
     st.sidebar.error(f"SYSTEM FAILURE: {e}")
     model = None
+    client = None
+
+# Views over the stored raw detections: changing these never re-runs the model
+class_filter = st.sidebar.multiselect("TARGET CLASSES", [str(n) for n in names.values()])
+max_targets = st.sidebar.number_input("MAX TARGETS (0 = ALL)", 0, 1000, 0, 10)
+view_classes = [c for c, n in names.items() if str(n) in class_filter] or None
 
 # Real Telemetry (Moved AFTER model loading)
-import time
 import torch
 
 # Initialize session state for latency tracking
@@ -216,14 +325,14 @@ if 'inference_time' not in st.session_state:
     st.session_state.inference_time = 0
 
 # System Stats
-device_name = "GPU (CUDA)" if torch.cuda.is_available() else "CPU (INTEL)"
-active_classes = len(model.names) if model else 0
+device_name = "REMOTE SERVER" if client else ("GPU (CUDA)" if torch.cuda.is_available() else "CPU (INTEL)")
+active_classes = len(names)
 latency_display = f"{st.session_state.inference_time:.1f} ms" if st.session_state.inference_time > 0 else "STANDBY"
 
 st.sidebar.markdown(f"""
 <div class="telemetry-box">
     <b>📡 SYSTEM TELEMETRY</b><br>
-    CORE: YOLOv8l<br>
+    CORE: {"YOLOv8l INT8 (OpenVINO)" if isinstance(model, OpenVINODetector) else "YOLOv8l"}<br>
     UNIT: {device_name}<br>
     CLASSES: {active_classes}<br>
     LATENCY: {latency_display}<br>
@@ -238,51 +347,110 @@ with col1:
     st.markdown('<div class="neo-card scan-container"><h3>📡 UPLINK FEED</h3>', unsafe_allow_html=True)
     uploaded_file = st.file_uploader("Drop Satellite Imagery", type=['jpg', 'jpeg', 'png'])
 
+    preview = None
     if uploaded_file is not None:
-        file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-        image = cv2.imdecode(file_bytes, 1)
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        
+        # memoryview of the uploaded buffer: hashing and decoding read it in place, no copies
+        upload = uploaded_file.getbuffer()
+        digest = image_digest(upload)
+        kept = st.session_state.get('preview')
+        if kept is not None and kept[0] == digest:
+            preview = kept[1]
+        else:
+            with profiling.stage('decode_preview'):
+                preview = decode_preview(uploaded_file, upload)
+            st.session_state.preview = (digest, preview)
+
         # Spacer to align with right column
         st.markdown('<div style="height: 5px;"></div>', unsafe_allow_html=True)
-        st.image(image_rgb, use_container_width=True, channels="RGB")
+        if preview is None:
+            st.error("⚠️ UNREADABLE IMAGE")
+        else:
+            st.image(preview, use_container_width=True, channels="BGR")
     st.markdown('</div>', unsafe_allow_html=True)
 
 with col2:
     st.markdown('<div class="neo-card"><h3>🎯 TARGET ACQUISITION</h3>', unsafe_allow_html=True)
-    if uploaded_file is not None and model is not None:
+    if preview is not None and (model is not None or client is not None):
+        # Identify the raw (floor-threshold) detections of this image + model
+        if client is not None:
+            fingerprint = f"{server_url}:{server_model(server_url)}"
+            iou, imgsz = 0.7, 640
+        else:
+            fingerprint = model_fingerprint(model_path)
+            iou, imgsz = (model.iou, model.imgsz) if isinstance(model, OpenVINODetector) else (0.7, 640)
+        key = cache_key(digest, fingerprint, RAW_CONF, iou, imgsz)
+
         if st.button("ENGAGE ANALYSIS"):
-            with st.spinner('PROCESSING NEURAL LAYERS...'):
-                # Run inference with Timer
-                start_time = time.time()
-                results = model.predict(image, conf=conf_thresh)
-                end_time = time.time()
-                
-                # Update Session State (Will show on next run)
-                st.session_state.inference_time = (end_time - start_time) * 1000
-                st.session_state.results = results # Store results for later use
-                
-                # Plot results
-                res_plotted = results[0].plot()
-                res_plotted_rgb = cv2.cvtColor(res_plotted, cv2.COLOR_BGR2RGB)
-                
-                # Targeting Status Panel (Fills space)
-                st.markdown("""
-                <div style="background: rgba(0, 201, 255, 0.05); border: 1px solid #00C9FF; border-radius: 10px; padding: 10px; margin-bottom: 20px; font-family: 'Courier New', monospace; font-size: 0.8rem; color: #00C9FF;">
-                    <div style="display: flex; justify-content: space-between;">
-                        <span>TARGETING ARRAY: <span style="color:#00ff41;">ONLINE</span></span>
-                        <span>OPTICS: <span style="color:#00ff41;">CALIBRATED</span></span>
-                    </div>
-                    <div style="display: flex; justify-content: space-between; margin-top: 5px;">
-                        <span>LOCK STATUS: <span style="color:#ff0000;">ENGAGED</span></span>
-                        <span>ZOOM: <span style="color:#e0e0e0;">1.0x</span></span>
-                    </div>
+            start_time = time.time()
+            result_cache = get_result_cache()
+            cached = result_cache.get(key)
+            if cached is not None:
+                st.session_state.raw = (key, cached[0], cached[1])
+                st.session_state.inference_time = (time.time() - start_time) * 1000
+                profiling.count('cache_hits')
+            else:
+                job_fn = analysis_job(upload, model, client, result_cache, key)
+                try:
+                    st.session_state.job = get_inference_queue().submit(key, job_fn)
+                except QueueFull as e:
+                    st.error(f"⚠️ ANALYSIS QUEUE FULL ({e}), RETRY SHORTLY")
+
+        # Follow the queued/running analysis; widget changes rerun the script and resume polling here
+        job = st.session_state.get('job')
+        if job is not None and job.key == key:
+            if not job.done():
+                inference_queue = get_inference_queue()
+                status = st.empty()
+                bar = st.progress(0.0)
+                while not job.wait(0.2):
+                    position = inference_queue.position(job)
+                    if position:
+                        status.markdown(f"QUEUE POSITION {position} // {inference_queue.depth()} WAITING")
+                    else:
+                        status.markdown("PROCESSING NEURAL LAYERS...")
+                    bar.progress(inference_queue.progress(job))
+                status.empty()
+                bar.empty()
+            st.session_state.job = None
+            if job.error is not None:
+                st.error(f"SYSTEM FAILURE: {job.error}")
+            else:
+                dets, shape, latency_ms = job.result
+                st.session_state.raw = (key, dets, shape)
+                st.session_state.inference_time = latency_ms
+                profiling.count('images')
+
+        raw = st.session_state.get('raw')
+        if raw is not None and raw[0] == key:
+            # SENSITIVITY / class / max-target changes only refilter the stored detections
+            dets = filter_dets(raw[1], conf_thresh, view_classes, max_targets or None)
+            profiling.count('boxes', len(dets))
+            st.session_state.results = dets # Store detections (x1 y1 x2 y2 conf cls) for later use
+            st.session_state.names = names
+
+            # Plot results: on a copy of the preview, boxes scaled down from full-resolution pixels
+            with profiling.stage('render'):
+                res_plotted = draw_detections(preview, dets, names, scale=preview.shape[1] / raw[2][1])
+            if profile_dir:
+                profiling.export(profile_dir, quiet=True)
+
+            # Targeting Status Panel (Fills space)
+            st.markdown("""
+            <div style="background: rgba(0, 201, 255, 0.05); border: 1px solid #00C9FF; border-radius: 10px; padding: 10px; margin-bottom: 20px; font-family: 'Courier New', monospace; font-size: 0.8rem; color: #00C9FF;">
+                <div style="display: flex; justify-content: space-between;">
+                    <span>TARGETING ARRAY: <span style="color:#00ff41;">ONLINE</span></span>
+                    <span>OPTICS: <span style="color:#00ff41;">CALIBRATED</span></span>
                 </div>
-                """, unsafe_allow_html=True)
-                
-                # Small spacer for final alignment
-                st.markdown('<div style="height: 20px;"></div>', unsafe_allow_html=True)
-                st.image(res_plotted_rgb, use_container_width=True)
+                <div style="display: flex; justify-content: space-between; margin-top: 5px;">
+                    <span>LOCK STATUS: <span style="color:#ff0000;">ENGAGED</span></span>
+                    <span>ZOOM: <span style="color:#e0e0e0;">1.0x</span></span>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+
+            # Small spacer for final alignment
+            st.markdown('<div style="height: 20px;"></div>', unsafe_allow_html=True)
+            st.image(res_plotted, use_container_width=True, channels="BGR")
     else:
         st.markdown("""
         <div style="text-align:center; padding:40px; color:#444;">
@@ -292,26 +460,26 @@ with col2:
     st.markdown('</div>', unsafe_allow_html=True)
 
 # Full Width Mission Intel Section
-if 'results' in st.session_state and st.session_state.results:
+if 'results' in st.session_state and st.session_state.results is not None:
     st.markdown("<br><br>", unsafe_allow_html=True)
     st.markdown("""
     <div class="neo-card" style="text-align:center; padding: 15px; margin-bottom: 20px;">
         <h3 style="margin:0; color:#00C9FF; letter-spacing: 2px;">📊 MISSION INTEL</h3>
     </div>
     """, unsafe_allow_html=True)
-    results = st.session_state.results
+    dets = st.session_state.results
+    result_names = st.session_state.names
     
     col_intel1, col_intel2 = st.columns([2, 1])
     
     with col_intel1:
         st.markdown('<div class="neo-card"><h4>DETECTED SIGNATURES</h4>', unsafe_allow_html=True)
-        boxes = results[0].boxes
-        if len(boxes) > 0:
+        if len(dets) > 0:
             data = []
-            for box in boxes:
-                cls_id = int(box.cls[0])
-                cls_name = model.names[cls_id].upper()
-                conf = float(box.conf[0])
+            for row in dets:
+                cls_id = int(row[5])
+                cls_name = result_names[cls_id].upper()
+                conf = float(row[4])
                 data.append({"Class": cls_name, "Confidence": f"{conf:.1%}"})
                 
                 st.markdown(f"""
@@ -344,7 +512,7 @@ if 'results' in st.session_state and st.session_state.results:
          <div style="font-family: monospace; font-size: 0.8rem; color: #8892b0;">
          > [SYSTEM] INITIALIZING NEURAL CORE... OK<br>
          > [SYSTEM] UPLINK ESTABLISHED... OK<br>
-         > [SCAN] TARGET ACQUIRED: {len(boxes)} SIGNATURES<br>
+         > [SCAN] TARGET ACQUIRED: {len(dets)} SIGNATURES<br>
          > [ANALYSIS] CONFIDENCE THRESHOLD: {conf_thresh}<br>
          > [STATUS] MISSION ACTIVE<br>
          </div>
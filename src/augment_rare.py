@@ -1,50 +1,14 @@
 
 import os
-import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
-import glob
-
-def load_yolo_label(label_path, img_w, img_h):
-    objects = []
-    if not os.path.exists(label_path):
-        return objects
-    
-    with open(label_path, 'r') as f:
-        lines = f.readlines()
-        
-    for line in lines:
-        parts = line.strip().split()
-        cls_id = int(parts[0])
-        if len(parts) > 5:
-            # Handle segmentation/polygon: class x1 y1 x2 y2 ...
-            # Extract points
-            coords = list(map(float, parts[1:]))
-            xs = coords[0::2]
-            ys = coords[1::2]
-            min_x, max_x = min(xs), max(xs)
-            min_y, max_y = min(ys), max(ys)
-            
-            w = max_x - min_x
-            h = max_y - min_y
-            x_c = min_x + w/2
-            y_c = min_y + h/2
-        else:
-            # Standard YOLO: class x_c y_c w h
-            x_c, y_c, w, h = map(float, parts[1:])
-        
-        # Convert to pixel coords
-        x1 = int((x_c - w/2) * img_w)
-        y1 = int((y_c - h/2) * img_h)
-        x2 = int((x_c + w/2) * img_w)
-        y2 = int((y_c + h/2) * img_h)
-        
-        objects.append({
-            'class_id': cls_id,
-            'bbox': [x1, y1, x2, y2],
-            'normalized': [x_c, y_c, w, h]
-        })
-    return objects
+
+from box_ops import xywh_to_xyxy
+from copy_paste import BLEND_MODES, build_patch_bank, paste
+from label_index import load_index
 
 def save_start_yolo_label(objects, file_path, img_w, img_h):
     lines = []
@@ -69,129 +33,133 @@ def save_start_yolo_label(objects, file_path, img_w, img_h):
     with open(file_path, 'w') as f:
         f.write('\n'.join(lines))
 
-def augment_rare_classes(root_dir):
+# Generation runs in a process pool. Each worker gets the patch bank once (initializer), and each
+# job decodes one background and derives several synthetic images from it. Jobs carry their own
+# SeedSequence, so the output is identical for any number of workers.
+_worker = {}
+
+
+def _init_worker(bank, img_dir, lbl_dir, blend, quality):
+    cv2.setNumThreads(1)
+    _worker.update(bank=bank, img_dir=img_dir, lbl_dir=lbl_dir, blend=blend, quality=quality)
+
+
+def _generate(job):
+    job_id, seed, bg_base, outputs, bg_cls, bg_xywh = job
+    bank = _worker['bank']
+    rng = np.random.default_rng(seed)
+    bg_img = cv2.imread(os.path.join(_worker['img_dir'], bg_base + '.jpg'))
+    pasted = np.zeros(max(bank) + 1, dtype=np.int64)
+    if bg_img is None:
+        return pasted
+    h_bg, w_bg = bg_img.shape[:2]
+    bg_boxes = xywh_to_xyxy(np.asarray(bg_xywh, dtype=np.float32).reshape(-1, 4)) * [w_bg, h_bg, w_bg, h_bg]
+
+    for k, classes in enumerate(outputs):
+        img = bg_img.copy()
+        boxes, cls = list(bg_boxes), list(bg_cls)
+        for cls_id in classes:
+            patch = bank[cls_id][rng.integers(len(bank[cls_id]))]
+            box = paste(img, patch, rng, np.array(boxes, dtype=np.float32).reshape(-1, 4), blend=_worker['blend'])
+            if box is not None:
+                boxes.append(box)
+                cls.append(cls_id)
+                pasted[cls_id] += 1
+
+        new_base = f"syn_{job_id:06d}_{k}_{bg_base}"
+        cv2.imwrite(os.path.join(_worker['img_dir'], new_base + '.jpg'), img,
+                    [cv2.IMWRITE_JPEG_QUALITY, _worker['quality']])
+        objects = [{'class_id': int(c), 'bbox': [int(v) for v in b]} for c, b in zip(cls, boxes)]
+        save_start_yolo_label(objects, os.path.join(_worker['lbl_dir'], new_base + '.txt'), w_bg, h_bg)
+    return pasted
+
+
+def plan_jobs(hist, bank, target, backgrounds, index, pastes_per_image=3, per_background=4, seed=0):
+    # Paste quotas from the class histogram: every class in the bank is topped up to `target` instances
+    rng = np.random.default_rng(seed)
+    need = {c: max(0, int(target) - int(hist[c] if c < len(hist) else 0)) for c, patches in bank.items() if patches}
+    instances = np.concatenate([np.full(n, c) for c, n in need.items()] + [np.zeros(0, dtype=int)]).astype(int)
+    rng.shuffle(instances)
+    images = [instances[i:i + pastes_per_image].tolist() for i in range(0, len(instances), pastes_per_image)]
+
+    seeds = np.random.SeedSequence(seed).spawn(-(-len(images) // per_background))
+    jobs = []
+    for job_id, start in enumerate(range(0, len(images), per_background)):
+        bg_base = backgrounds[rng.integers(len(backgrounds))]
+        cls, xywh, _ = index.boxes(bg_base)
+        jobs.append((job_id, seeds[job_id], bg_base, images[start:start + per_background],
+                     np.asarray(cls).tolist(), np.asarray(xywh).tolist()))
+    return jobs, need
+
+
+def augment_rare_classes(root_dir, classes=None, target=None, pastes_per_image=3, per_background=4,
+                         blend='feather', max_patches=200, workers=None, seed=0, quality=90):
     train_img_dir = os.path.join(root_dir, 'train', 'images')
     train_lbl_dir = os.path.join(root_dir, 'train', 'labels')
-    
-    # Sources
-    rare_files = {
-        9: ['011224', '011232'], # Trench
-        5: ['003961', '003986', '003992', '004002', '004170', '004340', '004643', '004834', '005012', '005139', '005201'] # Civilian (sample)
-    }
-    
-    # Store extracted patches
-    patches = {9: [], 5: []}
-    
-    print("Extracting rare object patches...")
-    for cls_id, basenames in rare_files.items():
-        for base in basenames:
-            img_path = os.path.join(train_img_dir, base + '.jpg')
-            lbl_path = os.path.join(train_lbl_dir, base + '.txt')
-            
-            if not os.path.exists(img_path):
-                continue
-                
-            img = cv2.imread(img_path)
-            if img is None: continue
-            h_img, w_img = img.shape[:2]
-            
-            objs = load_yolo_label(lbl_path, w_img, h_img)
-            
-            for obj in objs:
-                if obj['class_id'] == cls_id:
-                    x1, y1, x2, y2 = obj['bbox']
-                    # Ensure coords within bounds
-                    x1, y1 = max(0, x1), max(0, y1)
-                    x2, y2 = min(w_img, x2), min(h_img, y2)
-                    
-                    if x2 > x1 and y2 > y1:
-                        patch = img[y1:y2, x1:x2].copy()
-                        patches[cls_id].append(patch)
-    
-    print(f"Extracted {len(patches[9])} trench patches and {len(patches[5])} civilian patches.")
-    
-    # Background candidates (images WITHOUT rare classes)
-    all_imgs = glob.glob(os.path.join(train_img_dir, '*.jpg'))
-    bg_candidates = []
-    # Just take a random sample of 2000 images to serve as backgrounds
-    random.shuffle(all_imgs)
-    sampled_bgs = all_imgs[:2000]
-    
-    target_count = 500 # Generate 500 new images per class
-    
-    for cls_id in [9, 5]:
-        if not patches[cls_id]:
+
+    # Parsed once into arrays (cached next to the labels), then queried per image
+    index = load_index(train_lbl_dir)
+    hist = index.class_histogram()
+    print(f"Class histogram: {hist.tolist()}")
+
+    # Default: every class below the median instance count is topped up to the median
+    if target is None:
+        target = int(np.median(hist[hist > 0])) if hist.any() else 0
+    if classes is None:
+        classes = [c for c in range(len(hist)) if 0 < hist[c] < target]
+    if not classes:
+        print("No classes below target, nothing to generate.")
+        return
+
+    print(f"Extracting patches for classes {classes}...")
+    bank = build_patch_bank(train_img_dir, index, classes, max_per_class=max_patches, seed=seed)
+    for cls_id, patches in bank.items():
+        if not patches:
             print(f"No patches for class {cls_id}!")
-            continue
-            
-        print(f"Generating {target_count} synthetic images for class {cls_id}...")
-        
-        for i in range(target_count):
-            if i % 50 == 0:
-                print(f"  Generated {i}/{target_count}")
-            # Select random background
-            bg_path = random.choice(sampled_bgs)
-            bg_img = cv2.imread(bg_path)
-            if bg_img is None: continue
-            
-            h_bg, w_bg = bg_img.shape[:2]
-            bg_base = os.path.splitext(os.path.basename(bg_path))[0]
-            
-            # Load existing labels of background
-            bg_lbl_path = os.path.join(train_lbl_dir, bg_base + '.txt')
-            current_objects = load_yolo_label(bg_lbl_path, w_bg, h_bg)
-            
-            # Select random patch
-            patch = random.choice(patches[cls_id])
-            h_p, w_p = patch.shape[:2]
-            
-            # Random scale (0.5 to 1.5)
-            scale = random.uniform(0.5, 1.5)
-            new_w = int(w_p * scale)
-            new_h = int(h_p * scale)
-            
-            # Resize patch
-            try:
-                patch_resized = cv2.resize(patch, (new_w, new_h))
-            except:
-                continue
-
-            # Find valid location (try 50 times to find non-overlapping spot, or just paste anyway)
-            # For simplicity and "occlusion" robustness, we allow some overlap, but prefer empty space.
-            # We'll just pick a random spot that keeps the object fully inside the image.
-            
-            if new_w >= w_bg or new_h >= h_bg:
-                # Patch too big, resize to 20% of bg
-                 scale_factor = min(w_bg*0.2/w_p, h_bg*0.2/h_p)
-                 new_w = int(w_p * scale_factor)
-                 new_h = int(h_p * scale_factor)
-                 patch_resized = cv2.resize(patch, (new_w, new_h))
-
-            # Random position
-            start_x = random.randint(0, w_bg - new_w)
-            start_y = random.randint(0, h_bg - new_h)
-            
-            # Paste (using simple replacement, could use seamless clone but simple is mostly enough for YOLO)
-            # Optional: Gaussian blur edges
-            
-            bg_img[start_y:start_y+new_h, start_x:start_x+new_w] = patch_resized
-            
-            # Add new object
-            current_objects.append({
-                'class_id': cls_id,
-                'bbox': [start_x, start_y, start_x+new_w, start_y+new_h],
-                'normalized': [] # Recomputed in save
-            })
-            
-            # Save new file
-            new_base = f"syn_{cls_id}_{i}_{bg_base}"
-            new_img_path = os.path.join(train_img_dir, new_base + '.jpg')
-            new_lbl_path = os.path.join(train_lbl_dir, new_base + '.txt')
-            
-            cv2.imwrite(new_img_path, bg_img)
-            save_start_yolo_label(current_objects, new_lbl_path, w_bg, h_bg)
-            
-    print("Augmentation complete.")
+
+    # Backgrounds: real images only, not earlier synthetic output
+    backgrounds = [str(n) for n in index.names.tolist() if not str(n).startswith('syn_')]
+    jobs, need = plan_jobs(hist, bank, target, backgrounds, index, pastes_per_image, per_background, seed)
+    n_images = sum(len(job[3]) for job in jobs)
+    print(f"Target {target} instances per class, pasting {need} into {n_images} synthetic images "
+          f"({len(jobs)} backgrounds, blend={blend})")
+
+    workers = workers or os.cpu_count() or 1
+    init = (bank, train_img_dir, train_lbl_dir, blend, quality)
+    pasted = np.zeros(max(bank) + 1, dtype=np.int64)
+    if workers == 1:
+        _init_worker(*init)
+        results = map(_generate, jobs)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init)
+        results = pool.map(_generate, jobs, chunksize=max(1, len(jobs) // (workers * 8)))
+    for i, counts in enumerate(results):
+        pasted += counts
+        if i % 50 == 0:
+            print(f"  Generated {i * per_background}/{n_images}")
+    if workers != 1:
+        pool.shutdown()
+
+    summary = {c: int(pasted[c]) for c in bank if pasted[c]}
+    print(f"Augmentation complete. Pasted instances per class: {summary}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Class-balancing copy-paste augmentation")
+    parser.add_argument('--root', default=r'D:\military_object_dataset\military_object_dataset')
+    parser.add_argument('--classes', type=int, nargs='+', default=None,
+                        help="Classes to boost (default: all below --target)")
+    parser.add_argument('--target', type=int, default=None, help="Instances per class (default: median)")
+    parser.add_argument('--pastes', type=int, default=3, help="Objects pasted per synthetic image")
+    parser.add_argument('--per-background', type=int, default=4, help="Synthetic images per decoded background")
+    parser.add_argument('--blend', choices=BLEND_MODES, default='feather')
+    parser.add_argument('--max-patches', type=int, default=200, help="Patch bank size per class")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quality', type=int, default=90, help="JPEG quality")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    augment_rare_classes(r'D:\military_object_dataset\military_object_dataset')
+    args = parse_args()
+    augment_rare_classes(args.root, classes=args.classes, target=args.target, pastes_per_image=args.pastes,
+                         per_background=args.per_background, blend=args.blend, max_patches=args.max_patches,
+                         workers=args.workers, seed=args.seed, quality=args.quality)
@@ -0,0 +1,97 @@
+import os
+
+import numpy as np
+import torch
+from torch.utils.data import WeightedRandomSampler
+
+# Class-balanced image sampling for training, replacing the cloned syn_*.jpg files of augment_rare.py.
+# Class weight = (count of the most common class / count of the class) ** power, capped at `cap`;
+# an image weighs as much as its rarest class, background images weigh 1. Each epoch draws
+# len(real images) samples with replacement, so rare-class images come up many times per
+# epoch without adding files, and synthetic near-duplicates are left out by default.
+#
+#   weights = image_weights(load_index(labels_dir), names)
+#   sampler = BalancedSampler(weights)     # -> DataLoader(sampler=...), see train_hooks.py
+
+
+def class_weights(hist, cap=50.0, power=1.0):
+    hist = np.asarray(hist, dtype=np.float64)
+    weights = np.zeros(len(hist))
+    present = hist > 0
+    if present.any():
+        weights[present] = np.minimum((hist[present].max() / hist[present]) ** power, cap)
+    return weights
+
+
+def index_image_weights(index, cap=50.0, power=1.0, skip_synthetic=True):
+    # -> weight per image of the label index (index.names order)
+    class_id = np.asarray(index.class_id)
+    real = np.ones(len(class_id), dtype=bool)
+    if skip_synthetic:
+        # Class frequencies as the real data has them, not inflated by augment_rare.py clones
+        synthetic = np.char.startswith(np.asarray(index.names, dtype=str), 'syn_')
+        real = ~synthetic[np.asarray(index.image_id)]
+    box_w = class_weights(np.bincount(class_id[real], minlength=int(class_id.max(initial=-1)) + 1), cap,
+                          power)[class_id]
+    weights = np.ones(index.num_images)
+    has_boxes = index.boxes_per_image() > 0
+    if has_boxes.any():
+        weights[has_boxes] = np.maximum.reduceat(box_w, np.asarray(index.box_offsets[:-1])[has_boxes])
+    return weights
+
+
+def image_weights(index, names, cap=50.0, power=1.0, skip_synthetic=True):
+    # -> weight per name (dataset order); images without a label file count as background
+    per_image = index_image_weights(index, cap, power, skip_synthetic)
+    weights = np.ones(len(names))
+    for i, name in enumerate(names):
+        row = index.image_row(name)
+        if skip_synthetic and name.startswith('syn_'):
+            weights[i] = 0.0
+        elif row is not None:
+            weights[i] = per_image[row]
+    return weights
+
+
+def class_matrix(index, names, num_classes):
+    # -> (len(names), num_classes) instance counts per image, for reporting
+    counts = np.zeros((len(names), num_classes), dtype=np.int64)
+    for i, name in enumerate(names):
+        cls = np.asarray(index.boxes(name)[0])
+        if len(cls):
+            counts[i] = np.bincount(cls, minlength=num_classes)[:num_classes]
+    return counts
+
+
+class BalancedSampler(WeightedRandomSampler):
+    # Remembers each epoch's draw so the trainer can report what the model actually saw
+
+    def __init__(self, weights, num_samples=None, seed=0):
+        weights = np.asarray(weights, dtype=np.float64)
+        if num_samples is None:
+            num_samples = int((weights > 0).sum())
+        generator = torch.Generator()
+        generator.manual_seed(seed)
+        super().__init__(torch.as_tensor(weights), num_samples, replacement=True, generator=generator)
+        self.last_draw = None
+
+    def __iter__(self):
+        draw = torch.multinomial(self.weights, self.num_samples, self.replacement, generator=self.generator)
+        self.last_draw = draw.numpy()
+        return iter(draw.tolist())
+
+
+def distribution(draw, matrix):
+    # Instances per class over the images of one epoch's draw
+    return np.bincount(draw, minlength=len(matrix)) @ matrix
+
+
+def format_distribution(counts, names=None):
+    total = max(int(counts.sum()), 1)
+    names = names or {}
+    return ", ".join(f"{names.get(c, c)} {100 * n / total:.1f}%" for c, n in enumerate(counts))
+
+
+def labels_dir_for(dataset):
+    # ultralytics keeps the label path of every image; the index is built over that folder
+    return os.path.dirname(dataset.label_files[0]) if len(dataset.label_files) else None
@@ -0,0 +1,303 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from engine import list_images
+from image_cache import load_image_cache
+from model_registry import get_model, resolve_path, backend_for
+from openvino_backend import preprocess as ov_preprocess, decode as ov_decode
+from tiling import TiledPredictor
+from yolo_text import to_numpy, xyxy_to_rows, format_rows
+
+# Latency / throughput benchmark across backends, batch sizes, resolutions and plain vs tiled inference.
+# Every image is timed per stage (decode / preprocess / inference / postprocess / write) and the
+# results are written as JSON so exports can be compared run to run.
+# Runs on CPU-only machines; without a dataset it generates synthetic imagery.
+#
+#   python src/benchmark.py --models military-l military-l-onnx military-l-int8 --batch 1 8 --imgsz 640 1280
+# --image-cache times plain runs on image_cache.py's pre-decoded images (decode = memmap view),
+# i.e. what training/validation see with cache_images.
+
+STAGES = ('decode', 'preprocess', 'inference', 'postprocess', 'write')
+TEST_DIR = r'D:\military_object_dataset\military_object_dataset\test\images'
+
+
+def synthetic_images(n, size=1280, seed=0):
+    # Smooth terrain-like background with a scatter of vehicle-sized blobs, JPEG-encoded
+    # so the decode stage does real work.
+    rng = np.random.default_rng(seed)
+    samples = []
+    for i in range(n):
+        base = rng.integers(40, 200, (size // 32, size // 32, 3), dtype=np.uint8)
+        img = cv2.resize(base, (size, size), interpolation=cv2.INTER_CUBIC)
+        for _ in range(rng.integers(5, 40)):
+            x, y = rng.integers(0, size - 64, 2)
+            w, h = rng.integers(6, 64, 2)
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.rectangle(img, (int(x), int(y)), (int(x + w), int(y + h)), color, -1)
+        ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        samples.append((f"synthetic_{i:05d}", buf.tobytes()))
+    return samples
+
+
+def load_samples(source_dir, n, size):
+    # Encoded bytes are held in memory so disk reads don't pollute the decode timing
+    paths = list_images(source_dir)[:n] if source_dir and os.path.isdir(source_dir) else []
+    if not paths:
+        print(f"No dataset at {source_dir}, using {n} synthetic {size}x{size} images")
+        return synthetic_images(n, size), 'synthetic'
+    samples = []
+    for p in paths:
+        with open(p, 'rb') as f:
+            samples.append((os.path.splitext(os.path.basename(p))[0], f.read()))
+    return samples, source_dir
+
+
+def cached_samples(source_dir, n, imgsz):
+    cache = load_image_cache(source_dir, imgsz)
+    return [(os.path.splitext(os.path.basename(p))[0], cache.get(p)[0])
+            for p in list_images(source_dir)[:n] if p in cache]
+
+
+def decode_bytes(data):
+    if isinstance(data, np.ndarray):
+        # Already decoded by the image cache
+        return data
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def write_rows(out_dir, name, dets, shape):
+    t = time.perf_counter()
+    text = format_rows(xyxy_to_rows(dets[:, :4], dets[:, 4], dets[:, 5], shape))
+    with open(os.path.join(out_dir, name + '.txt'), 'w') as f:
+        f.write(text)
+    return (time.perf_counter() - t) * 1000
+
+
+class SpeedProbe:
+    # Wraps an ultralytics model and sums the per-stage Results.speed of every call
+    def __init__(self, model):
+        self.model = model
+        self.reset()
+
+    def reset(self):
+        self.totals = dict.fromkeys(('preprocess', 'inference', 'postprocess'), 0.0)
+
+    def predict(self, *args, **kwargs):
+        results = self.model.predict(*args, **kwargs)
+        for r in results:
+            for k in self.totals:
+                self.totals[k] += r.speed.get(k) or 0.0
+        return results
+
+
+def run_plain(model, samples, batch, imgsz, device, out_dir):
+    records = []
+    for i in range(0, len(samples), batch):
+        chunk = samples[i:i + batch]
+        t0 = time.perf_counter()
+        imgs, decode_ms = [], []
+        for _, data in chunk:
+            t = time.perf_counter()
+            imgs.append(decode_bytes(data))
+            decode_ms.append((time.perf_counter() - t) * 1000)
+
+        results = model.predict(imgs, imgsz=imgsz, device=device, verbose=False)
+        write_ms = [write_rows(out_dir, name, to_numpy(r.boxes.data), img.shape[:2])
+                    for (name, _), r, img in zip(chunk, results, imgs)]
+        latency = (time.perf_counter() - t0) * 1000
+
+        for k, r in enumerate(results):
+            records.append({
+                'decode': decode_ms[k],
+                'preprocess': r.speed['preprocess'],
+                'inference': r.speed['inference'],
+                'postprocess': r.speed['postprocess'],
+                'write': write_ms[k],
+                # Every image in a batch waits for the whole batch
+                'latency': latency,
+            })
+    return records
+
+
+def run_openvino(detector, samples, out_dir):
+    records = []
+    for name, data in samples:
+        rec = {}
+        t0 = time.perf_counter()
+        img = decode_bytes(data)
+        t1 = time.perf_counter()
+        blob, ratio, pad = ov_preprocess(img, detector.imgsz)
+        t2 = time.perf_counter()
+        raw = detector.infer_raw(blob)
+        t3 = time.perf_counter()
+        dets = ov_decode(raw, ratio, pad, img.shape[:2], detector.conf, detector.iou)
+        t4 = time.perf_counter()
+        rec['write'] = write_rows(out_dir, name, dets, img.shape[:2])
+        rec.update(decode=(t1 - t0) * 1000, preprocess=(t2 - t1) * 1000, inference=(t3 - t2) * 1000,
+                   postprocess=(t4 - t3) * 1000, latency=(time.perf_counter() - t0) * 1000)
+        records.append(rec)
+    return records
+
+
+def run_tiled(model, samples, batch, imgsz, device, out_dir, stats=None):
+    probe = SpeedProbe(model)
+    predictor = TiledPredictor(probe, batch_size=batch, imgsz=imgsz, device=device)
+    records = []
+    for name, data in samples:
+        t0 = time.perf_counter()
+        img = decode_bytes(data)
+        t1 = time.perf_counter()
+        probe.reset()
+        (_, dets), = predictor.predict([{'name': name, 'img': img}])
+        t2 = time.perf_counter()
+        rec = {'decode': (t1 - t0) * 1000, 'preprocess': probe.totals['preprocess'],
+               'inference': probe.totals['inference']}
+        # Postprocess = model NMS + tile offsets + cross-tile merge
+        rec['postprocess'] = max((t2 - t1) * 1000 - rec['preprocess'] - rec['inference'], 0.0)
+        rec['write'] = write_rows(out_dir, name, dets, img.shape[:2])
+        rec['latency'] = (time.perf_counter() - t0) * 1000
+        records.append(rec)
+    if stats is not None:
+        stats['tiles_per_image'] = predictor.tiles_processed / max(predictor.images_processed, 1)
+    return records
+
+
+def summarize(records, wall):
+    lat = np.array([r['latency'] for r in records])
+    return {
+        'images': len(records),
+        'throughput_ips': len(records) / wall if wall > 0 else 0.0,
+        'latency_ms': {
+            'mean': float(lat.mean()),
+            'p50': float(np.percentile(lat, 50)),
+            'p95': float(np.percentile(lat, 95)),
+            'p99': float(np.percentile(lat, 99)),
+        },
+        'stages_ms': {s: float(np.mean([r[s] for r in records])) for s in STAGES},
+    }
+
+
+def bench_config(name, model, backend, mode, batch, imgsz, samples, device, warmup, out_dir):
+    config = {'model': name, 'path': resolve_path(name), 'backend': backend, 'mode': mode,
+              'batch': batch, 'imgsz': imgsz}
+    extra = {}
+
+    if backend == 'openvino':
+        # Static 1x3x640x640 export: batching is done with async requests (predict.py), not here
+        if mode != 'plain' or batch != 1 or imgsz != model.imgsz:
+            return dict(config, skipped=f"static OpenVINO export supports plain/batch 1/imgsz {model.imgsz} only")
+        run = lambda s: run_openvino(model, s, out_dir)
+    elif mode == 'tiled':
+        run = lambda s: run_tiled(model, s, batch, imgsz, device, out_dir, extra)
+    else:
+        run = lambda s: run_plain(model, s, batch, imgsz, device, out_dir)
+
+    try:
+        run(samples[:warmup])
+        start = time.perf_counter()
+        records = run(samples)
+        wall = time.perf_counter() - start
+    except Exception as e:
+        return dict(config, skipped=f"failed: {e}")
+
+    return dict(config, **summarize(records, wall), **extra)
+
+
+def default_device():
+    try:
+        import torch
+        return 0 if torch.cuda.is_available() else 'cpu'
+    except ImportError:
+        return 'cpu'
+
+
+def run_benchmark(models, batches, sizes, modes, source_dir, n_images, synthetic_size, warmup, device, out_path,
+                  image_cache=False):
+    samples, source = load_samples(source_dir, n_images, synthetic_size)
+    device = default_device() if device is None else device
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': sys.version.split()[0],
+            'cpu_count': os.cpu_count(),
+            'device': str(device),
+            'source': source,
+            'images': len(samples),
+        },
+        'results': [],
+    }
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        for name in models:
+            path = resolve_path(name)
+            if not os.path.exists(path):
+                print(f"Skipping {name}: not found at {path}")
+                report['results'].append({'model': name, 'path': path, 'skipped': 'model not found'})
+                continue
+
+            backend = backend_for(path)
+            if backend == 'openvino':
+                model = get_model(name, native_openvino=True, hint='LATENCY')
+            else:
+                model = get_model(name)
+
+            for mode in modes:
+                for imgsz in sizes:
+                    # Tiling needs full-resolution images, the cache stores them resized to imgsz
+                    cached = image_cache and mode == 'plain' and source != 'synthetic'
+                    run_samples = cached_samples(source_dir, n_images, imgsz) if cached else samples
+                    for batch in batches:
+                        res = bench_config(name, model, backend, mode, batch, imgsz, run_samples, device, warmup,
+                                           out_dir)
+                        res['image_cache'] = bool(cached)
+                        report['results'].append(res)
+                        print_result(res)
+
+    with open(out_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved benchmark report to {out_path}")
+    return report
+
+
+def print_result(res):
+    head = f"{res['model']:<18} {res.get('mode', '-'):<6} bs={res.get('batch', '-'):<3} imgsz={res.get('imgsz', '-'):<5}"
+    if 'skipped' in res:
+        print(f"{head} SKIPPED ({res['skipped']})")
+        return
+    lat = res['latency_ms']
+    stages = " ".join(f"{s[:3]}={res['stages_ms'][s]:.1f}" for s in STAGES)
+    print(f"{head} {res['throughput_ips']:7.2f} img/s  p50={lat['p50']:.1f} p95={lat['p95']:.1f} "
+          f"p99={lat['p99']:.1f} ms  [{stages}]")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmark across backends and settings")
+    parser.add_argument('--models', nargs='+', default=['military-l', 'military-l-onnx', 'military-l-int8'],
+                        help="model_registry names or paths")
+    parser.add_argument('--batch', nargs='+', type=int, default=[1, 8])
+    parser.add_argument('--imgsz', nargs='+', type=int, default=[640, 800, 1280])
+    parser.add_argument('--modes', nargs='+', choices=['plain', 'tiled'], default=['plain', 'tiled'])
+    parser.add_argument('--source', default=TEST_DIR, help="Image folder (synthetic images if missing)")
+    parser.add_argument('--images', type=int, default=50)
+    parser.add_argument('--synthetic-size', type=int, default=1280)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--device', default=None, help="e.g. 0 or cpu (default: GPU if available)")
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--image-cache', action='store_true', help="Plain runs read pre-decoded images (image_cache.py)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    run_benchmark(args.models, args.batch, args.imgsz, args.modes, args.source, args.images,
+                  args.synthetic_size, args.warmup, args.device, args.out, args.image_cache)
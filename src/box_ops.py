@@ -0,0 +1,167 @@
+import numpy as np
+
+# Vectorized box utilities shared by the tiler, the OpenVINO decoder and the evaluator.
+# Boxes are (N, 4) float arrays in x1 y1 x2 y2 pixels.
+
+
+def box_area(boxes):
+    return (boxes[:, 2] - boxes[:, 0]).clip(0) * (boxes[:, 3] - boxes[:, 1]).clip(0)
+
+
+def pairwise_overlap(a, b, metric='iou'):
+    # (N, M) overlap matrix. 'ios' = intersection over the smaller box, which is what
+    # SAHI uses to merge an object cut in half by a tile border with its full view.
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = (rb - lt).clip(0)
+    inter = wh[..., 0] * wh[..., 1]
+    area_a = box_area(a)[:, None]
+    area_b = box_area(b)[None, :]
+    if metric == 'ios':
+        denom = np.minimum(area_a, area_b)
+    else:
+        denom = area_a + area_b - inter
+    return inter / np.maximum(denom, 1e-9)
+
+
+def xywh_to_xyxy(xywh):
+    out = np.empty_like(xywh)
+    out[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    out[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+    return out
+
+
+def _class_offset(boxes, classes):
+    # Shift every class into its own coordinate range so one NMS pass is class-aware
+    if len(boxes) == 0:
+        return boxes
+    offset = boxes.max() + 1
+    return boxes + (np.asarray(classes, dtype=boxes.dtype) * offset)[:, None]
+
+
+def greedy_clusters(boxes, scores, thr=0.5, metric='iou'):
+    # Greedy suppression: returns (kept index, indices it absorbed incl. itself) pairs,
+    # highest score first. Each step is one vectorized overlap row.
+    order = np.argsort(-scores, kind='stable')
+    clusters = []
+    while order.size:
+        i = order[0]
+        rest = order[1:]
+        overlap = pairwise_overlap(boxes[i:i + 1], boxes[rest], metric)[0]
+        absorbed = overlap > thr
+        clusters.append((i, np.concatenate(([i], rest[absorbed]))))
+        order = rest[~absorbed]
+    return clusters
+
+
+def nms(boxes, scores, thr=0.5, metric='iou'):
+    return np.array([i for i, _ in greedy_clusters(boxes, scores, thr, metric)], dtype=np.int64)
+
+
+def batched_nms(boxes, scores, classes, thr=0.5, metric='iou'):
+    return nms(_class_offset(boxes, classes), scores, thr, metric)
+
+
+def merge_detections(dets, thr=0.5, metric='ios', method='nms'):
+    # dets: (N, 6) x1 y1 x2 y2 conf cls. Class-aware merge of overlapping detections.
+    #   'nms' keeps the best box of each cluster
+    #   'nmm' replaces it with the union box of the cluster (SAHI's GREEDYNMM default): an object cut
+    #         by a tile border grows back to its full extent instead of keeping one clipped piece
+    #   'wbf' replaces it with the confidence-weighted average of the cluster (max conf kept)
+    if len(dets) < 2:
+        return dets
+    clusters = greedy_clusters(_class_offset(dets[:, :4], dets[:, 5]), dets[:, 4], thr, metric)
+    return _merge_clusters(dets, clusters, method)
+
+
+def _merge_clusters(dets, clusters, method='nms'):
+    boxes, scores, classes = dets[:, :4], dets[:, 4], dets[:, 5]
+    if method == 'nms':
+        return dets[[i for i, _ in clusters]]
+    if method == 'nmm':
+        out = dets[[i for i, _ in clusters]].copy()
+        for k, (_, members) in enumerate(clusters):
+            out[k, :2] = boxes[members, :2].min(0)
+            out[k, 2:4] = boxes[members, 2:4].max(0)
+        return out
+
+    out = np.empty((len(clusters), 6), dtype=dets.dtype)
+    for k, (i, members) in enumerate(clusters):
+        w = scores[members]
+        out[k, :4] = (boxes[members] * w[:, None]).sum(0) / w.sum()
+        out[k, 4] = scores[i]
+        out[k, 5] = classes[i]
+    return out
+
+
+def merge_detections_local(dets, cell, thr=0.5, metric='ios', method='nms'):
+    # merge_detections for very large scenes: boxes are bucketed into cell x cell squares by
+    # their center and each greedy step only looks at the 3x3 buckets around the kept box, so
+    # the cost grows with the box count instead of its square. Same result as the global merge
+    # when no box side is larger than the cell (two overlapping boxes then always sit in
+    # neighbouring cells). The few larger boxes (e.g. from a whole-scene overview pass) are
+    # merged afterwards with the merged boxes their extent intersects, comparing only the pairs
+    # that involve a large box.
+    if len(dets) < 2:
+        return dets
+    big = (dets[:, 2:4] - dets[:, :2]).max(1) > cell
+    if not big.any():
+        return _merge_bucketed(dets, cell, thr, metric, method)
+    large = dets[big]
+    merged = _merge_bucketed(dets[~big], cell, thr, metric, method)
+    # Bounding-box query: merged boxes intersecting any large box
+    hit = ((merged[:, None, 0] < large[None, :, 2]) & (merged[:, None, 2] > large[None, :, 0])
+           & (merged[:, None, 1] < large[None, :, 3]) & (merged[:, None, 3] > large[None, :, 1])).any(1)
+    out = np.concatenate([merged[~hit], _merge_large(np.concatenate([large, merged[hit]]), len(large), thr, metric,
+                                                     method)])
+    return out[np.argsort(-out[:, 4], kind='stable')]
+
+
+def _merge_large(dets, n_large, thr, metric, method):
+    # Greedy merge in score order where only pairs with one of the first n_large boxes count:
+    # the others were already merged among themselves
+    boxes = _class_offset(dets[:, :4], dets[:, 5])
+    over = pairwise_overlap(boxes[:n_large], boxes, metric) > thr
+    alive = np.ones(len(dets), dtype=bool)
+    clusters = []
+    for i in np.argsort(-dets[:, 4], kind='stable'):
+        if not alive[i]:
+            continue
+        alive[i] = False
+        if i < n_large:
+            absorbed = np.flatnonzero(over[i] & alive)
+        else:
+            absorbed = np.flatnonzero(over[:, i] & alive[:n_large])
+        alive[absorbed] = False
+        clusters.append((i, np.concatenate(([i], absorbed))))
+    return _merge_clusters(dets, clusters, method)
+
+
+def _merge_bucketed(dets, cell, thr, metric, method):
+    if len(dets) < 2:
+        return dets
+    boxes, scores = _class_offset(dets[:, :4], dets[:, 5]), dets[:, 4]
+    cx = np.floor((dets[:, 0] + dets[:, 2]) / (2 * cell)).astype(np.int64)
+    cy = np.floor((dets[:, 1] + dets[:, 3]) / (2 * cell)).astype(np.int64)
+    order = np.lexsort((cx, cy))
+    keys, starts, bucket = np.unique(np.stack([cy[order], cx[order]], 1), axis=0, return_index=True,
+                                     return_inverse=True)
+    bounds = np.append(starts, len(order))
+    members = {(int(y), int(x)): order[bounds[k]:bounds[k + 1]] for k, (y, x) in enumerate(keys)}
+    near = [np.concatenate([members.get((int(y) + dy, int(x) + dx), order[:0]) for dy in (-1, 0, 1)
+                            for dx in (-1, 0, 1)]) for y, x in keys]
+    bucket_of = np.empty(len(dets), dtype=np.int64)
+    bucket_of[order] = bucket.reshape(-1)
+
+    alive = np.ones(len(dets), dtype=bool)
+    clusters = []
+    for i in np.argsort(-scores, kind='stable'):
+        if not alive[i]:
+            continue
+        alive[i] = False
+        rest = near[bucket_of[i]]
+        rest = rest[alive[rest]]
+        absorbed = rest[pairwise_overlap(boxes[i:i + 1], boxes[rest], metric)[0] > thr]
+        alive[absorbed] = False
+        clusters.append((i, np.concatenate(([i], absorbed))))
+    return _merge_clusters(dets, clusters, method)
@@ -1,16 +1,23 @@
 
-from ultralytics import YOLO
 import time
 import os
 import glob
+import argparse
 import numpy as np
 
-def check_efficiency():
+from inference_client import InferenceClient
+from model_registry import get_model, resolve_path
+
+TEST_IMAGES = r'D:\military_object_dataset\military_object_dataset\test\images'
+
+def check_efficiency(server=None):
     print("--- Efficiency Verification ---")
+    if server:
+        return check_server_efficiency(server)
     
     # 1. Model Size
     # Updated to point to the Resumed 80-Epoch Model
-    model_path = r'runs/train/yolov8l_military_resumed/weights/best.pt'
+    model_path = resolve_path('military-l')
     
     if not os.path.exists(model_path):
         print(f"Custom model not found at {model_path}, using base 'yolov8l.pt' for benchmark example...")
@@ -19,7 +26,7 @@ def check_efficiency():
         print(f"Benchmarking custom model: {model_path}")
 
     # Load model
-    model = YOLO(model_path)
+    model = get_model(model_path)
     
     # Check file size
     if os.path.exists(model_path):
@@ -29,8 +36,7 @@ def check_efficiency():
         print("Model size: ~85.0 MB (Standard YOLOv8l)")
 
     # 2. Inference Speed
-    test_weights = r'D:\military_object_dataset\military_object_dataset\test\images'
-    images = glob.glob(os.path.join(test_weights, '*.jpg'))[:100] # Test on 100 images
+    images = glob.glob(os.path.join(TEST_IMAGES, '*.jpg'))[:100] # Test on 100 images
     
     if not images:
         print("No test images found to benchmark!")
@@ -44,7 +50,8 @@ def check_efficiency():
     start_time = time.time()
     
     # Run inference
-    results = model.predict(source=images, verbose=False, device=0) 
+    # No hardcoded device: GPU when available, else CPU (see benchmark.py for the full sweep)
+    results = model.predict(source=images, verbose=False)
     
     end_time = time.time()
     total_time = end_time - start_time
@@ -58,6 +65,40 @@ def check_efficiency():
     print(f"FPS (Frame Rate): {fps:.2f} FPS")
     print("--------------------------")
     
+    report_status(avg_per_image)
+
+def check_server_efficiency(server):
+    # Thin client: the running inference_server.py holds the model; timings include HTTP
+    client = InferenceClient(server)
+    print(f"Benchmarking inference server {server} ({client.health()['model']})")
+    images = glob.glob(os.path.join(TEST_IMAGES, '*.jpg'))[:100]
+    if not images:
+        print("No test images found to benchmark!")
+        return
+    payloads = []
+    for path in images:
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+
+    print("Running warmup on 10 images...")
+    for data in payloads[:10]:
+        client.predict(data)
+
+    print(f"Benchmarking inference on {len(images)} images...")
+    start_time = time.time()
+    for data in payloads:
+        client.predict(data)
+    total_time = time.time() - start_time
+
+    avg_per_image = (total_time / len(images)) * 1000
+    print("\n--- Efficiency Results (server) ---")
+    print(f"Total Time: {total_time:.2f} seconds")
+    print(f"Inference Speed: {avg_per_image:.2f} ms per image")
+    print(f"FPS (Frame Rate): {len(images) / total_time:.2f} FPS")
+    print("--------------------------")
+    report_status(avg_per_image)
+
+def report_status(avg_per_image):
     # Judging Criteria Check
     if avg_per_image < 20: 
         print("Status: EXCELLENT efficiency (Real-time compatible)")
@@ -67,4 +108,7 @@ def check_efficiency():
         print("Status: LOW (May need optimization for real-time)")
 
 if __name__ == "__main__":
-    check_efficiency()
+    parser = argparse.ArgumentParser(description="Model size and inference speed check")
+    parser.add_argument('--server', default=None, help="Benchmark a running inference_server.py instead")
+    args = parser.parse_args()
+    check_efficiency(args.server)
@@ -1,22 +1,26 @@
 
 import os
 import pandas as pd
-from ultralytics import YOLO
 import time
 import glob
+import argparse
 
-def check_status():
+from inference_client import InferenceClient
+from model_registry import get_model, resolve_path
+
+def check_status(server=None):
     print("\n=============================================")
     print("      SERVE SMART MODEL STATUS REPORT        ")
     print("=============================================\n")
 
     # 1. IDENTIFY BEST MODEL
     # We know the 80-epoch resumed model is the best one
-    model_dir = r'runs/train/yolov8l_military_resumed'
-    weights_path = os.path.join(model_dir, 'weights', 'best.pt')
+    weights_path = resolve_path('military-l')
+    model_dir = os.path.dirname(os.path.dirname(weights_path))
     csv_path = os.path.join(model_dir, 'results.csv')
 
-    if not os.path.exists(weights_path):
+    # A thin client only needs the server; the training logs are reported when they are local
+    if not os.path.exists(weights_path) and not server:
         print("❌ Error: Could not find the 80-epoch model.")
         print(f"Checked: {weights_path}")
         return
@@ -42,13 +46,23 @@ def check_status():
 
     # 3. GET EFFICIENCY (Benchmark)
     print("\n2. EFFICIENCY (Real-time Benchmark)")
-    print("   Loading model... (This takes a few seconds)")
     try:
-        model = YOLO(weights_path)
-        
-        # Size
-        size_mb = os.path.getsize(weights_path) / (1024 * 1024)
-        print(f"   • Model Size:    {size_mb:.2f} MB")
+        if server:
+            # Thin client: the running inference_server.py does the work, timings include HTTP
+            client = InferenceClient(server)
+            print(f"   Using inference server {server} ({client.health()['model']})")
+
+            def predict(path):
+                with open(path, 'rb') as f:
+                    return client.predict(f.read())
+        else:
+            print("   Loading model... (This takes a few seconds)")
+            model = get_model(weights_path)
+            predict = lambda path: model.predict(path, verbose=False)
+
+            # Size
+            size_mb = os.path.getsize(weights_path) / (1024 * 1024)
+            print(f"   • Model Size:    {size_mb:.2f} MB")
 
         # Speed
         test_dir = r'D:\military_object_dataset\military_object_dataset\test\images'
@@ -56,11 +70,11 @@ def check_status():
         
         if images:
             # Warmup
-            model.predict(images[0], verbose=False)
+            predict(images[0])
             
             start = time.time()
             for img in images:
-                model.predict(img, verbose=False, device=0)
+                predict(img)
             end = time.time()
             
             avg_time = (end - start) / len(images) * 1000
@@ -81,4 +95,7 @@ def check_status():
     print("=============================================\n")
 
 if __name__ == "__main__":
-    check_status()
+    parser = argparse.ArgumentParser(description="Accuracy and speed summary of the best model")
+    parser.add_argument('--server', default=None, help="Benchmark a running inference_server.py instead")
+    args = parser.parse_args()
+    check_status(args.server)
@@ -1,19 +1,15 @@
 
 import os
-import glob
+
+from label_index import load_index
+from evaluate import evaluate, print_report, LABELS_DIR
 
 def count_boxes(folder_path):
-    total_boxes = 0
-    file_count = 0
+    # Works on a predictions folder or ZIP; missing path -> (0, 0)
     if not os.path.exists(folder_path):
         return 0, 0
-        
-    for txt_file in glob.glob(os.path.join(folder_path, "*.txt")):
-        file_count += 1
-        with open(txt_file, 'r') as f:
-            lines = f.readlines()
-            total_boxes += len(lines)
-    return total_boxes, file_count
+    index = load_index(folder_path)
+    return len(index), index.num_images
 
 def compare_results():
     print("--- ACCURACY CHECK: Standard vs SAHI ---")
@@ -40,5 +36,12 @@ def compare_results():
     else:
         print("\n⚠️ No increase in detections found.")
 
+    # More boxes is not the same as more accurate: score both against the labels when we have them
+    if os.path.isdir(LABELS_DIR):
+        print("\n--- mAP against ground truth ---")
+        reports = [evaluate(d, LABELS_DIR) for d in (std_dir, sahi_dir) if os.path.exists(d)]
+        for report in reports:
+            print_report(report, per_class=False)
+
 if __name__ == "__main__":
     compare_results()
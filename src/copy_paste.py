@@ -0,0 +1,102 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from box_ops import pairwise_overlap
+
+# Copy-paste primitives shared by the offline generator (augment_rare.py) and online
+# augmentation during training.
+#   bank = build_patch_bank(img_dir, index, classes)   # {class_id: [BGR patch, ...]} held in memory
+#   box = paste(img, patch, rng, existing_boxes, blend='feather')
+
+BLEND_MODES = ('replace', 'feather', 'seamless')
+
+
+def crop_objects(img, cls, xywh, classes, min_px=8):
+    # -> [(class_id, patch)] for the boxes of `classes` in one image (normalized xywh)
+    h, w = img.shape[:2]
+    out = []
+    for c, (xc, yc, bw, bh) in zip(cls, xywh):
+        if int(c) not in classes:
+            continue
+        x1, y1 = max(0, int((xc - bw / 2) * w)), max(0, int((yc - bh / 2) * h))
+        x2, y2 = min(w, int((xc + bw / 2) * w)), min(h, int((yc + bh / 2) * h))
+        if x2 - x1 >= min_px and y2 - y1 >= min_px:
+            out.append((int(c), img[y1:y2, x1:x2].copy()))
+    return out
+
+
+def build_patch_bank(img_dir, index, classes, max_per_class=200, seed=0, workers=8, ext='.jpg'):
+    # Decodes only the images that contain the wanted classes, each once, with a thread pool
+    # (cv2 releases the GIL). Synthetic images from earlier runs are not used as sources.
+    rng = np.random.default_rng(seed)
+    classes = {int(c) for c in classes}
+    sources = [n for n in index.images_with_class(*classes) if not n.startswith('syn_')]
+    rng.shuffle(sources)
+    # Enough images to fill the bank for every class, not the whole dataset
+    sources = sources[:max_per_class * len(classes)]
+
+    def crop(name):
+        img = cv2.imread(os.path.join(img_dir, name + ext))
+        if img is None:
+            return []
+        cls, xywh, _ = index.boxes(name)
+        return crop_objects(img, np.asarray(cls), np.asarray(xywh), classes)
+
+    bank = {c: [] for c in classes}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for patches in pool.map(crop, sources):
+            for c, patch in patches:
+                if len(bank[c]) < max_per_class:
+                    bank[c].append(patch)
+    return bank
+
+
+def blend_into(img, patch, x, y, mode='feather'):
+    h, w = patch.shape[:2]
+    if mode == 'seamless' and h > 3 and w > 3:
+        mask = np.full((h, w), 255, dtype=np.uint8)
+        center = (x + w // 2, y + h // 2)
+        try:
+            img[:] = cv2.seamlessClone(patch, img, mask, center, cv2.NORMAL_CLONE)
+            return
+        except cv2.error:
+            # Poisson blending needs a margin around the patch; at the border fall back to feathering
+            mode = 'feather'
+    if mode == 'feather' and h > 4 and w > 4:
+        # Soft edge a few pixels wide so the paste has no hard seam
+        k = max(3, (min(h, w) // 8) | 1)
+        mask = np.zeros((h, w), dtype=np.float32)
+        mask[k // 2:h - k // 2, k // 2:w - k // 2] = 1.0
+        alpha = cv2.GaussianBlur(mask, (k, k), 0)[..., None]
+        roi = img[y:y + h, x:x + w]
+        roi[:] = (patch * alpha + roi * (1 - alpha)).astype(np.uint8)
+    else:
+        img[y:y + h, x:x + w] = patch
+
+
+def paste(img, patch, rng, existing=None, scale=(0.5, 1.5), blend='feather', max_overlap=0.3, tries=10):
+    # Random scale + position fully inside the image, preferring spots that don't cover existing
+    # objects (existing: (N, 4) x1 y1 x2 y2 pixels). Returns the pasted box or None.
+    H, W = img.shape[:2]
+    h, w = patch.shape[:2]
+    s = rng.uniform(*scale)
+    new_w, new_h = int(w * s), int(h * s)
+    if new_w >= W or new_h >= H:
+        # Patch too big, resize to 20% of the background
+        s = min(W * 0.2 / w, H * 0.2 / h)
+        new_w, new_h = int(w * s), int(h * s)
+    if new_w < 2 or new_h < 2:
+        return None
+    patch = cv2.resize(patch, (new_w, new_h))
+
+    for _ in range(tries):
+        x = int(rng.integers(0, W - new_w + 1))
+        y = int(rng.integers(0, H - new_h + 1))
+        box = np.array([[x, y, x + new_w, y + new_h]], dtype=np.float32)
+        if existing is None or len(existing) == 0 or pairwise_overlap(box, existing, 'ios').max() <= max_overlap:
+            break
+    blend_into(img, patch, x, y, blend)
+    return box[0]
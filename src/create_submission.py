@@ -2,13 +2,12 @@
 import zipfile
 import os
 import glob
+import shutil
+import sys
 
-def create_submission():
-    # 1. Create Predictions ZIP (Required by rules: "Place all .txt files into a single ZIP")
-    pred_zip_name = "predictions.zip"
-    pred_dir = r"D:\military_object_dataset\military_object_dataset\predictions_sahi"
-    
-    print(f"Creating {pred_zip_name}...")
+from model_registry import resolve_path
+
+def pack_prediction_dir(pred_dir, pred_zip_name):
     with zipfile.ZipFile(pred_zip_name, 'w', zipfile.ZIP_DEFLATED) as pz:
         if os.path.exists(pred_dir):
             files = glob.glob(os.path.join(pred_dir, "*.txt"))
@@ -18,6 +17,23 @@ def create_submission():
         else:
             print("WARNING: No predictions found!")
 
+def create_submission(pred_source=r"D:\military_object_dataset\military_object_dataset\predictions_sahi"):
+    # 1. Create Predictions ZIP (Required by rules: "Place all .txt files into a single ZIP")
+    pred_zip_name = "predictions.zip"
+
+    if pred_source.lower().endswith('.zip'):
+        # Direct-to-ZIP predictions are already in the final layout: copy, don't unpack and re-zip
+        if os.path.exists(pred_source):
+            if os.path.abspath(pred_source) != os.path.abspath(pred_zip_name):
+                shutil.copyfile(pred_source, pred_zip_name)
+            with zipfile.ZipFile(pred_zip_name) as pz:
+                print(f"Using {pred_source}: {len(pz.namelist())} prediction files")
+        else:
+            print(f"WARNING: No predictions found at {pred_source}!")
+    else:
+        print(f"Creating {pred_zip_name}...")
+        pack_prediction_dir(pred_source, pred_zip_name)
+
     # 2. Create Final Submission Archive
     final_zip_name = "Final_Submission_Serve_Smart.zip"
     print(f"Creating final archive: {final_zip_name}...")
@@ -42,13 +58,14 @@ def create_submission():
         # Add the Predictions Zip
         if os.path.exists(pred_zip_name):
             print("Adding predictions.zip...")
-            zf.write(pred_zip_name)
+            # Already deflated, so store it as-is instead of compressing twice
+            zf.write(pred_zip_name, compress_type=zipfile.ZIP_STORED)
             
         # 4. Add Model Weights (Crucial for Reproducibility)
         # We add best.pt and the OpenVINO folder
-        weights_dir = r"runs/train/yolov8l_military_resumed/weights"
-        best_pt = os.path.join(weights_dir, "best.pt")
-        openvino_dir = os.path.join(weights_dir, "best_int8_openvino_model")
+        best_pt = resolve_path('military-l')
+        openvino_dir = resolve_path('military-l-int8')
+        weights_dir = os.path.dirname(openvino_dir)
         
         if os.path.exists(best_pt):
             print(f"Adding Model Weights: {best_pt} (87MB)...")
@@ -67,4 +84,8 @@ def create_submission():
     print("Contains: Code, Report, README, Run Guide, Predictions, and MODEL WEIGHTS.")
 
 if __name__ == "__main__":
-    create_submission()
+    # Optional: a predictions folder, or the ZIP written directly by predict.py
+    if len(sys.argv) > 1:
+        create_submission(sys.argv[1])
+    else:
+        create_submission()
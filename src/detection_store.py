@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from engine import make_writer
+from evaluate import DATA_YAML, LABELS_DIR, evaluate, load_names
+from label_index import LabelIndex, load_index
+from yolo_text import xyxy_to_rows, format_rows
+
+# Raw post-NMS detections of a prediction run, kept once at a low confidence floor so any
+# threshold / class filter / top-k can be applied afterwards without running the model again.
+#   predictions.dets/{names,offsets,shapes,dets}.npy + meta.json
+#     dets     (N, 6) float32   x1 y1 x2 y2 conf cls in original-image pixels (as the result cache)
+#     offsets  (M + 1,) int64   image i owns dets[offsets[i]:offsets[i + 1]]
+#     shapes   (M, 2) int32     original (h, w)
+#
+#   python src/predict.py --store predictions.dets            # model runs at the floor, --conf still applies to the ZIP
+#   python src/detection_store.py predictions.dets --sweep     # mAP per threshold in seconds
+#   python src/detection_store.py predictions.dets --export submission.zip --conf 0.3 --top-k 100
+
+STORE_VERSION = 1
+DEFAULT_FLOOR = 0.01
+ARRAYS = ('names', 'offsets', 'shapes', 'dets')
+
+
+def filter_dets(dets, conf=0.0, classes=None, top_k=None):
+    # View of one image's (N, 6) detections
+    keep = dets[:, 4] >= conf
+    if classes is not None:
+        keep &= np.isin(dets[:, 5], list(classes))
+    out = dets[keep]
+    if top_k is not None and len(out) > top_k:
+        out = out[np.argsort(-out[:, 4], kind='stable')[:top_k]]
+    return out
+
+
+class DetectionStore:
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        self.floor = self.meta['floor']
+        for key in ARRAYS:
+            setattr(self, key, np.load(os.path.join(path, key + '.npy'), mmap_mode='r'))
+        self._lookup = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def image(self, name, conf=0.0, classes=None, top_k=None):
+        # -> (dets, (h, w)) of one image, or None
+        if self._lookup is None:
+            self._lookup = {str(n): i for i, n in enumerate(self.names)}
+        i = self._lookup.get(name)
+        if i is None:
+            return None
+        dets = np.asarray(self.dets[self.offsets[i]:self.offsets[i + 1]])
+        return filter_dets(dets, conf, classes, top_k), (int(self.shapes[i][0]), int(self.shapes[i][1]))
+
+    def select(self, conf=0.0, classes=None, top_k=None):
+        # -> bool mask over all rows: the same view as filter_dets, for every image at once
+        if conf < self.floor:
+            print(f"WARNING: conf {conf} is below the store floor {self.floor}")
+        dets = np.asarray(self.dets)
+        keep = dets[:, 4] >= conf
+        if classes is not None:
+            keep &= np.isin(dets[:, 5], list(classes))
+        if top_k is not None:
+            image_id = np.repeat(np.arange(len(self.names)), np.diff(self.offsets))
+            rows = np.flatnonzero(keep)
+            rows = rows[np.lexsort((-dets[rows, 4], image_id[rows]))]
+            # Rank of each kept row within its image, highest confidence first
+            starts = np.searchsorted(image_id[rows], image_id[rows], side='left')
+            keep[rows[np.arange(len(rows)) - starts >= top_k]] = False
+        return keep
+
+    def to_index(self, conf=0.0, classes=None, top_k=None):
+        # -> LabelIndex of the view, in the layout label_index builds from 6-column prediction files
+        keep = self.select(conf, classes, top_k)
+        image_id = np.repeat(np.arange(len(self.names), dtype=np.int32), np.diff(self.offsets))[keep]
+        counts = np.bincount(image_id, minlength=len(self.names))
+        dets = np.asarray(self.dets)[keep]
+        rows = xyxy_to_rows(dets[:, :4], dets[:, 4], dets[:, 5], (1, 1))
+        rows[:, 1:5] /= np.asarray(self.shapes, dtype=np.float64)[image_id][:, [1, 0, 1, 0]]
+        box_offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(counts, out=box_offsets[1:])
+        arrays = {
+            'names': np.asarray(self.names),
+            'image_id': image_id,
+            'class_id': rows[:, 0].astype(np.int32),
+            'xywh': rows[:, 1:5].astype(np.float32),
+            'conf': rows[:, 5].astype(np.float32),
+            'nvals': np.full(len(rows), 6, dtype=np.int16),
+            'poly': np.zeros((0, 2), dtype=np.float32),
+            'poly_offsets': np.zeros(len(rows) + 1, dtype=np.int64),
+            'box_offsets': box_offsets,
+            'skipped': np.zeros(len(self.names), dtype=np.int32),
+        }
+        return LabelIndex(arrays, f"{self.path}@conf={conf:g}")
+
+    def export(self, destination, conf=0.0, classes=None, top_k=None, loose_files=False):
+        # Submission-format files (folder or ZIP) of one view
+        writer = make_writer(destination, loose_files=loose_files)
+        writer.start()
+        try:
+            for i, name in enumerate(self.names.tolist()):
+                dets = filter_dets(np.asarray(self.dets[self.offsets[i]:self.offsets[i + 1]]), conf, classes, top_k)
+                writer.put(name, format_rows(xyxy_to_rows(dets[:, :4], dets[:, 4], dets[:, 5], self.shapes[i])))
+        finally:
+            writer.close()
+        print(f"Exported {len(self.names)} prediction files (conf >= {conf}) to {destination}")
+
+
+class DetectionStoreWriter:
+    # Collects images during a run and saves the store on close. Images already in an existing
+    # store at the same floor are kept unless predicted again (resumed / incremental runs).
+
+    def __init__(self, path, floor=DEFAULT_FLOOR, params=None):
+        self.path = path
+        self.floor = floor
+        self.params = params or {}
+        self.images = {}
+        if os.path.exists(os.path.join(path, 'meta.json')):
+            try:
+                old = DetectionStore(path)
+                if old.floor == floor and old.meta.get('params') == self.params:
+                    for i, name in enumerate(old.names.tolist()):
+                        self.images[name] = (np.array(old.dets[old.offsets[i]:old.offsets[i + 1]]),
+                                             tuple(int(v) for v in old.shapes[i]))
+            except (OSError, ValueError, KeyError):
+                pass
+
+    def add(self, name, dets, shape):
+        dets = np.asarray(dets, dtype=np.float32).reshape(-1, 6)
+        self.images[name] = (dets[dets[:, 4] >= self.floor], (int(shape[0]), int(shape[1])))
+
+    def close(self):
+        names = sorted(self.images)
+        dets = [self.images[n][0] for n in names]
+        offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum([len(d) for d in dets], out=offsets[1:])
+        arrays = {
+            'names': np.array(names, dtype=str) if names else np.zeros(0, dtype='U1'),
+            'offsets': offsets,
+            'shapes': np.array([self.images[n][1] for n in names], dtype=np.int32).reshape(-1, 2),
+            'dets': np.concatenate(dets) if dets else np.zeros((0, 6), dtype=np.float32),
+        }
+        os.makedirs(self.path, exist_ok=True)
+        meta = os.path.join(self.path, 'meta.json')
+        # meta.json is written last: a half-written store never loads
+        if os.path.exists(meta):
+            os.remove(meta)
+        for key in ARRAYS:
+            np.save(os.path.join(self.path, key + '.npy'), arrays[key])
+        with open(meta, 'w') as f:
+            json.dump({'version': STORE_VERSION, 'floor': self.floor, 'params': self.params}, f)
+        print(f"Detection store: {len(names)} images, {len(arrays['dets'])} boxes (conf >= {self.floor}) "
+              f"in {self.path}")
+
+
+def sweep(store, labels_dir=LABELS_DIR, thresholds=None, names=None, classes=None, top_k=None):
+    # mAP / precision / recall of every threshold, scored straight from the store
+    thresholds = np.round(np.arange(max(store.floor, 0.05), 0.95, 0.05), 4) if thresholds is None else thresholds
+    gt = load_index(labels_dir)
+    reports = []
+    for conf in thresholds:
+        preds = store.to_index(conf, classes, top_k)
+        report = evaluate(preds, labels_dir, names, gt=gt)
+        report.update(conf=float(conf), boxes=len(preds))
+        reports.append(report)
+    return reports
+
+
+def parse_classes(text):
+    return None if text is None else [int(c) for c in text.split(',') if c.strip()]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Threshold / class / top-k views of a detection store")
+    parser.add_argument('store', help="Folder written by predict.py --store")
+    parser.add_argument('--conf', type=float, default=0.20)
+    parser.add_argument('--classes', default=None, help="Comma-separated class ids to keep")
+    parser.add_argument('--top-k', type=int, default=None, help="Keep the k most confident boxes per image")
+    parser.add_argument('--sweep', action='store_true', help="Score every threshold against --labels")
+    parser.add_argument('--thresholds', nargs='+', type=float, default=None)
+    parser.add_argument('--labels', default=LABELS_DIR, help="Ground-truth YOLO labels folder")
+    parser.add_argument('--data', default=DATA_YAML, help="Dataset yaml for class names")
+    parser.add_argument('--export', default=None,
+                        help="Write the view as a submission ZIP (or a folder with --loose-files)")
+    parser.add_argument('--loose-files', action='store_true')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    store = DetectionStore(args.store)
+    classes = parse_classes(args.classes)
+    print(f"{args.store}: {len(store)} images, {len(store.dets)} boxes at conf >= {store.floor}")
+
+    if args.sweep:
+        if not os.path.isdir(args.labels):
+            raise SystemExit(f"Ground-truth labels not found at {args.labels}")
+        start = time.perf_counter()
+        reports = sweep(store, args.labels, args.thresholds, load_names(args.data), classes, args.top_k)
+        print(f"\n  {'conf':>6}{'boxes':>9}{'P':>8}{'R':>8}{'mAP50':>8}{'mAP50-95':>10}")
+        for r in reports:
+            print(f"  {r['conf']:>6.2f}{r['boxes']:>9}{r['precision']:>8.3f}{r['recall']:>8.3f}{r['map50']:>8.3f}"
+                  f"{r['map']:>10.3f}")
+        best = max(reports, key=lambda r: r['map'])
+        print(f"\nBest mAP@50-95 {best['map']:.4f} at conf {best['conf']:.2f} "
+              f"({len(reports)} thresholds in {time.perf_counter() - start:.1f}s)")
+
+    if args.export:
+        store.export(args.export, args.conf, classes, args.top_k, args.loose_files)
@@ -0,0 +1,214 @@
+import os
+import glob
+import queue
+import threading
+import zipfile
+import functools
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+import profiling
+from journal import reopen_zip
+
+# Pipelined building blocks for batch inference:
+#   loader threads (decode + letterbox) -> model on whole batches -> writer thread
+
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def list_images(source_dir):
+    files = []
+    for ext in IMAGE_EXTS:
+        files.extend(glob.glob(os.path.join(source_dir, '*' + ext)))
+    # Windows globs are case-insensitive, so the same file can show up twice
+    return sorted(set(files))
+
+
+def letterbox(img, imgsz=640, color=(114, 114, 114)):
+    # Same geometry as the ultralytics LetterBox (centered padding, no upscaling limit),
+    # so the model sees exactly what it would have seen with its own preprocessing.
+    h, w = img.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    if (new_w, new_h) != (w, h):
+        img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    dw, dh = (imgsz - new_w) / 2, (imgsz - new_h) / 2
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return img, r, (left, top)
+
+
+def read_image(path):
+    with profiling.stage('decode'):
+        img = cv2.imread(path)
+    return {
+        'path': path,
+        'name': os.path.splitext(os.path.basename(path))[0],
+        'img': img,
+    }
+
+
+def load_image(path, imgsz=640):
+    with profiling.stage('decode'):
+        img = cv2.imread(path)
+    item = {
+        'path': path,
+        'name': os.path.splitext(os.path.basename(path))[0],
+        'img': None,
+        'orig_shape': None,
+        'ratio': 1.0,
+        'pad': (0, 0),
+    }
+    if img is None:
+        return item
+
+    item['orig_shape'] = img.shape[:2]
+    with profiling.stage('letterbox'):
+        item['img'], item['ratio'], item['pad'] = letterbox(img, imgsz)
+    return item
+
+
+def prefetch_map(fn, items, workers=4, prefetch=8):
+    # Ordered, bounded thread-pool map: at most `prefetch` results are held in memory
+    items = iter(items)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque(pool.submit(fn, x) for x in itertools.islice(items, prefetch))
+        while pending:
+            result = pending.popleft().result()
+            nxt = next(items, None)
+            if nxt is not None:
+                pending.append(pool.submit(fn, nxt))
+            yield result
+
+
+def iter_batches(paths, batch_size=8, workers=4, imgsz=640):
+    # Decode ahead of the model with a bounded number of images in flight,
+    # keeping the original order so outputs are deterministic.
+    loader = functools.partial(load_image, imgsz=imgsz)
+    batch = []
+    for item in prefetch_map(loader, paths, workers, max(batch_size * 2, workers)):
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def unletterbox(xyxy, ratio, pad, orig_shape):
+    # Map boxes from letterboxed pixels back to the original image, in place
+    xyxy[:, [0, 2]] -= pad[0]
+    xyxy[:, [1, 3]] -= pad[1]
+    xyxy /= ratio
+    h, w = orig_shape
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, w)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, h)
+    return xyxy
+
+
+class PredictionWriter(threading.Thread):
+    # Drains (name, text) pairs onto disk so formatting/IO never stalls the model
+
+    def __init__(self, output_dir, max_pending=256, journal=None):
+        super().__init__(daemon=True)
+        self.output_dir = output_dir
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.files_written = 0
+        self.bytes_written = 0
+        self.error = None
+        self.journal = journal
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+
+    def put(self, name, text):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((name, text))
+
+    def write(self, name, text):
+        data = text.encode('utf-8')
+        with open(os.path.join(self.output_dir, name + '.txt'), 'wb') as f:
+            f.write(data)
+            if self.journal is not None:
+                # Each file has its own descriptor: sync it before the journal line that vouches for it
+                f.flush()
+                os.fsync(f.fileno())
+        if self.journal is not None:
+            self.journal.record(name)
+        return len(data)
+
+    def run(self):
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                with profiling.stage('write'):
+                    n = self.write(*entry)
+                self.bytes_written += n
+                self.files_written += 1
+                profiling.count('bytes_written', n)
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+class ZipPredictionWriter(PredictionWriter):
+    # Streams each image's detections straight into a ZIP entry: no loose .txt files,
+    # no glob + re-zip pass afterwards. Only this thread touches the ZipFile.
+
+    def __init__(self, zip_path, max_pending=256, compression=zipfile.ZIP_DEFLATED, journal=None):
+        super().__init__(None, max_pending, journal)
+        self.zip_path = zip_path
+        zip_dir = os.path.dirname(os.path.abspath(zip_path))
+        os.makedirs(zip_dir, exist_ok=True)
+
+        self.zipf = None
+        if journal is not None and journal.records:
+            # Resuming: keep the entries the journal vouches for, append after them
+            kept = set()
+            if os.path.exists(zip_path):
+                self.zipf, kept = reopen_zip(zip_path, journal.zip_entries(), compression)
+            journal.retain(kept)
+        if self.zipf is None:
+            self.zipf = zipfile.ZipFile(zip_path, 'w', compression)
+
+    def write(self, name, text):
+        data = text.encode('utf-8')
+        self.zipf.writestr(name + '.txt', data)
+        if self.journal is not None:
+            # Bytes reach the OS before the journal line that points at them
+            self.zipf.fp.flush()
+            info = self.zipf.filelist[-1]
+            self.journal.record(name, data_file=self.zipf.fp, header_offset=info.header_offset, crc=info.CRC,
+                                compress_size=info.compress_size, file_size=info.file_size,
+                                compress_type=info.compress_type, flag_bits=info.flag_bits,
+                                external_attr=info.external_attr, date_time=info.date_time,
+                                end=self.zipf.fp.tell())
+        return len(data)
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+        # Writes the central directory; without it the archive is unreadable
+        self.zipf.close()
+        if self.error is not None:
+            raise self.error
+
+
+def make_writer(output, loose_files=False, journal=None):
+    if loose_files:
+        return PredictionWriter(output, journal=journal)
+    return ZipPredictionWriter(output, journal=journal)
@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import yaml
+
+from box_ops import pairwise_overlap, xywh_to_xyxy
+from label_index import LabelIndex, load_index
+
+# COCO-style mAP@50 and mAP@50-95 for prediction files, no model and no GPU needed.
+#   python src/evaluate.py predictions.zip predictions_sahi/ --labels D:\...\test\labels
+# Predictions: folder or ZIP of 6-column YOLO files (class x y w h conf).
+# Ground truth: folder of YOLO labels (boxes or polygons). Both are read through label_index,
+# so a rerun on unchanged files skips parsing.
+# Matching follows the ultralytics validator (class-aware, highest-IoU first, one ground truth
+# per prediction) so the numbers line up with model.val; AP is the COCO 101-point interpolation.
+# IoU is computed on normalized coordinates, which gives the same value as in pixels.
+# evaluate() also takes an in-memory LabelIndex (e.g. a detection_store.py threshold view).
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+DATA_YAML = r'D:\military_object_dataset\military_object_dataset\military_dataset.yaml'
+LABELS_DIR = r'D:\military_object_dataset\military_object_dataset\test\labels'
+
+
+def match_image(gt_cls, gt_box, pred_cls, pred_box, thresholds=IOU_THRESHOLDS):
+    # -> (P, T) bool: prediction p is a true positive at threshold t
+    correct = np.zeros((len(pred_cls), len(thresholds)), dtype=bool)
+    if len(gt_cls) == 0 or len(pred_cls) == 0:
+        return correct
+    iou = pairwise_overlap(gt_box, pred_box) * (gt_cls[:, None] == pred_cls[None, :])
+    for t, thr in enumerate(thresholds):
+        gi, pi = np.nonzero(iou >= thr)
+        if not gi.size:
+            continue
+        if gi.size > 1:
+            order = np.argsort(-iou[gi, pi], kind='stable')
+            gi, pi = gi[order], pi[order]
+            # Each prediction keeps its best ground truth, then each ground truth its best prediction
+            _, first = np.unique(pi, return_index=True)
+            gi, pi = gi[first], pi[first]
+            order = np.argsort(-iou[gi, pi], kind='stable')
+            gi, pi = gi[order], pi[order]
+            _, first = np.unique(gi, return_index=True)
+            pi = pi[first]
+        correct[pi, t] = True
+    return correct
+
+
+def coco_ap(recall, precision, points=np.linspace(0, 1, 101)):
+    # Precision envelope sampled at 101 recall levels (pycocotools)
+    envelope = np.maximum.accumulate(precision[::-1])[::-1]
+    idx = np.searchsorted(recall, points, side='left')
+    inside = idx < len(recall)
+    q = np.zeros(len(points))
+    q[inside] = envelope[idx[inside]]
+    return q.mean(), q
+
+
+def ap_per_class(correct, conf, pred_cls, gt_cls):
+    order = np.argsort(-conf, kind='stable')
+    correct, conf, pred_cls = correct[order], conf[order], pred_cls[order]
+
+    results = []
+    # Classes with no ground truth are left out of the mean, as in COCO
+    for c in np.unique(gt_cls):
+        n_gt = int((gt_cls == c).sum())
+        mask = pred_cls == c
+        res = {'class_id': int(c), 'instances': n_gt, 'predictions': int(mask.sum()),
+               'ap50': 0.0, 'ap': 0.0, 'precision': 0.0, 'recall': 0.0, 'pr_curve': [0.0] * 101}
+        if mask.any():
+            tp = np.cumsum(correct[mask], 0)
+            fp = np.cumsum(~correct[mask], 0)
+            recall = tp / n_gt
+            precision = tp / (tp + fp)
+            aps = [coco_ap(recall[:, t], precision[:, t]) for t in range(correct.shape[1])]
+            res['ap50'] = float(aps[0][0])
+            res['ap'] = float(np.mean([a for a, _ in aps]))
+            res['pr_curve'] = aps[0][1].round(4).tolist()
+            # Operating point: max F1 at IoU 0.5
+            f1 = 2 * precision[:, 0] * recall[:, 0] / np.maximum(precision[:, 0] + recall[:, 0], 1e-9)
+            k = int(f1.argmax())
+            res.update(precision=float(precision[k, 0]), recall=float(recall[k, 0]), conf=float(conf[mask][k]))
+        results.append(res)
+    return results
+
+
+def evaluate(pred_source, labels_dir=LABELS_DIR, names=None, gt=None):
+    t0 = time.perf_counter()
+    gt = load_index(labels_dir) if gt is None else gt
+    preds = pred_source if isinstance(pred_source, LabelIndex) else load_index(pred_source)
+    t1 = time.perf_counter()
+
+    gt_xyxy = xywh_to_xyxy(np.asarray(gt.xywh))
+    pred_xyxy = xywh_to_xyxy(np.asarray(preds.xywh))
+    pred_conf = np.nan_to_num(np.asarray(preds.conf), nan=1.0)
+
+    # Score every labeled image; predictions for unlabeled images are ignored
+    correct = np.zeros((len(preds), len(IOU_THRESHOLDS)), dtype=bool)
+    evaluated = np.zeros(len(preds), dtype=bool)
+    for i, name in enumerate(gt.names.tolist()):
+        g = slice(int(gt.box_offsets[i]), int(gt.box_offsets[i + 1]))
+        p = preds.rows(name)
+        evaluated[p] = True
+        correct[p] = match_image(gt.class_id[g], gt_xyxy[g], preds.class_id[p], pred_xyxy[p])
+    t2 = time.perf_counter()
+
+    classes = ap_per_class(correct[evaluated], pred_conf[evaluated], np.asarray(preds.class_id)[evaluated],
+                           np.asarray(gt.class_id))
+    t3 = time.perf_counter()
+
+    for res in classes:
+        res['name'] = (names or {}).get(res['class_id'], str(res['class_id']))
+    mean = lambda key: float(np.mean([r[key] for r in classes])) if classes else 0.0
+    return {
+        'predictions': preds.source,
+        'labels': labels_dir,
+        'images': gt.num_images,
+        'images_with_predictions': int(len(set(preds.names.tolist()) & set(gt.names.tolist()))),
+        'map50': mean('ap50'),
+        'map': mean('ap'),
+        'precision': mean('precision'),
+        'recall': mean('recall'),
+        'classes': classes,
+        'timing_s': {'load': t1 - t0, 'match': t2 - t1, 'ap': t3 - t2, 'total': t3 - t0},
+    }
+
+
+def print_report(report, per_class=True):
+    print(f"\n{report['predictions']}  ({report['images_with_predictions']}/{report['images']} images predicted)")
+    if per_class:
+        print(f"  {'class':<22}{'inst':>7}{'preds':>8}{'P':>8}{'R':>8}{'AP50':>8}{'AP50-95':>9}")
+        for r in report['classes']:
+            print(f"  {r['name']:<22}{r['instances']:>7}{r['predictions']:>8}{r['precision']:>8.3f}"
+                  f"{r['recall']:>8.3f}{r['ap50']:>8.3f}{r['ap']:>9.3f}")
+    print(f"  {'all':<22}{'':>15}{report['precision']:>8.3f}{report['recall']:>8.3f}"
+          f"{report['map50']:>8.3f}{report['map']:>9.3f}")
+    t = report['timing_s']
+    print(f"  evaluated in {t['total']:.2f}s (load {t['load']:.2f}s, match {t['match']:.2f}s, AP {t['ap']:.2f}s)")
+
+
+def plot_pr_curves(reports, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    recall = np.linspace(0, 1, 101)
+    fig, ax = plt.subplots(figsize=(7, 5))
+    for report in reports:
+        # Mean precision over classes at each recall level (IoU 0.5)
+        mean_pr = np.mean([r['pr_curve'] for r in report['classes']], axis=0)
+        ax.plot(recall, mean_pr, label=f"{os.path.basename(os.path.normpath(report['predictions']))} "
+                                       f"mAP50={report['map50']:.3f}")
+    ax.set_xlabel('Recall')
+    ax.set_ylabel('Precision')
+    ax.set_xlim(0, 1)
+    ax.set_ylim(0, 1)
+    ax.legend()
+    fig.savefig(path, dpi=150, bbox_inches='tight')
+    print(f"Saved PR curves to {path}")
+
+
+def load_names(data_yaml):
+    if not data_yaml or not os.path.exists(data_yaml):
+        return None
+    with open(data_yaml, 'r') as f:
+        names = yaml.safe_load(f).get('names', {})
+    return dict(enumerate(names)) if isinstance(names, list) else {int(k): v for k, v in names.items()}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="mAP@50 / mAP@50-95 of prediction folders or ZIPs")
+    parser.add_argument('predictions', nargs='+', help="Prediction folders and/or ZIPs to score")
+    parser.add_argument('--labels', default=LABELS_DIR, help="Ground-truth YOLO labels folder")
+    parser.add_argument('--data', default=DATA_YAML, help="Dataset yaml for class names")
+    parser.add_argument('--out', default=None, help="Write the full report (incl. PR curves) as JSON")
+    parser.add_argument('--plot', default=None, help="Save a PR-curve comparison PNG")
+    parser.add_argument('--summary', action='store_true', help="Only print the overall line per input")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not os.path.isdir(args.labels):
+        raise SystemExit(f"Ground-truth labels not found at {args.labels}")
+    names = load_names(args.data)
+    reports = [evaluate(p, args.labels, names) for p in args.predictions]
+    for report in reports:
+        print_report(report, per_class=not args.summary)
+
+    if len(reports) > 1:
+        print("\n--- Ranking (mAP@50-95) ---")
+        for report in sorted(reports, key=lambda r: -r['map']):
+            print(f"  {report['map']:.4f}  mAP50={report['map50']:.4f}  {report['predictions']}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"Saved report to {args.out}")
+    if args.plot:
+        plot_pr_curves(reports, args.plot)
@@ -2,11 +2,13 @@
 from ultralytics import YOLO
 import os
 
+from model_registry import resolve_path
+
 def export_openvino_int8():
     print("--- EXPORTING FOR CPU EFFICIENCY (OpenVINO INT8) ---")
     
     # Path to your best model
-    model_path = r'runs/train/yolov8l_military_resumed/weights/best.pt'
+    model_path = resolve_path('military-l')
     
     if not os.path.exists(model_path):
         print(f"Model not found: {model_path}")
@@ -24,7 +26,7 @@ def export_openvino_int8():
     try:
         model.export(format='openvino', int8=True)
         print("\n✅ SUCCESS: Model exported to OpenVINO format!")
-        print("   Location: runs/train/yolov8l_military_resumed/weights/best_openvino_model/")
+        print(f"   Location: {os.path.splitext(model_path)[0]}_int8_openvino_model/")
     except Exception as e:
         print(f"\n❌ Export Failed: {e}")
         print("   Try installing dependencies: pip install openvino-dev")
@@ -2,12 +2,14 @@
 from ultralytics import YOLO
 import os
 
+from model_registry import resolve_path
+
 def export_for_speed():
     print("--- OPTIMIZING MODEL FOR DEPLOYMENT ---")
     
     # Path to your best model (Update this after training HD Sniper)
     # If HD Sniper not run yet, use the Resumed one
-    model_path = r'runs/train/yolov8l_military_resumed/weights/best.pt'
+    model_path = resolve_path('military-l')
     
     if not os.path.exists(model_path):
         print(f"Model not found: {model_path}")
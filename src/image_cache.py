@@ -0,0 +1,183 @@
+import os
+import json
+import math
+import argparse
+
+import cv2
+import numpy as np
+
+from engine import list_images, prefetch_map
+
+# Disk-backed cache of decoded images, pre-resized so the long side is imgsz (the same geometry
+# and interpolation as the ultralytics dataset's load_image: INTER_LINEAR when the split is
+# augmented (train) or upscaled, INTER_AREA when a val image is downscaled). One cache per
+# folder, size and split rule:
+#   train/images -> train/images.cache1280-train/{pixels.u8, offsets.npy, shapes.npy, orig_shapes.npy,
+#                                                  names.npy, meta.json}
+#   valid/images -> valid/images.cache1280/...
+# pixels.u8 holds every image's HxWx3 BGR bytes back to back. get() returns a view into a
+# read-only np.memmap, so all dataloader workers share one copy through the OS page cache:
+# cached-speed epochs without the per-process RAM of cache='ram' and without re-decoding
+# JPEGs every epoch like cache=False.
+# Built once with a thread pool (cv2 releases the GIL); rebuilt when the folder changes.
+#
+#   python src/image_cache.py D:\...\train\images D:\...\valid\images --imgsz 800 1280
+#   cache = load_image_cache(r'D:\...\valid\images', 1280)
+#   cache = load_image_cache(r'D:\...\train\images', 1280, augment=True)
+#   img, orig_shape = cache.get('000123.jpg')
+
+CACHE_VERSION = 1
+TRAIN_DIR = r'D:\military_object_dataset\military_object_dataset\train\images'
+VALID_DIR = r'D:\military_object_dataset\military_object_dataset\valid\images'
+
+
+def cache_dir(images_dir, imgsz, augment=False):
+    return os.path.normpath(images_dir) + f'.cache{imgsz}' + ('-train' if augment else '')
+
+
+def interpolation(r, augment=False):
+    # ultralytics load_image: INTER_LINEAR if (self.augment or r > 1) else INTER_AREA
+    return cv2.INTER_LINEAR if (augment or r > 1) else cv2.INTER_AREA
+
+
+def resize_long_side(img, imgsz, augment=False):
+    h0, w0 = img.shape[:2]
+    r = imgsz / max(h0, w0)
+    if r != 1:
+        w, h = min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz)
+        img = cv2.resize(img, (w, h), interpolation=interpolation(r, augment))
+    return img
+
+
+def _signature(images_dir, paths):
+    stats = [os.stat(p) for p in paths]
+    return [len(paths), max((s.st_mtime_ns for s in stats), default=0), sum(s.st_size for s in stats),
+            os.stat(images_dir).st_mtime_ns]
+
+
+class ImageCache:
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            self.meta = json.load(f)
+        self.imgsz = self.meta['imgsz']
+        self.names = np.load(os.path.join(path, 'names.npy'))
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        self.shapes = np.load(os.path.join(path, 'shapes.npy'))
+        self.orig_shapes = np.load(os.path.join(path, 'orig_shapes.npy'))
+        self._lookup = {str(n): i for i, n in enumerate(self.names)}
+        self._pixels = None
+
+    def __getstate__(self):
+        # Dataloader workers reopen the mapping instead of pickling the pixels
+        state = self.__dict__.copy()
+        state['_pixels'] = None
+        return state
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, key):
+        return os.path.basename(key) in self._lookup
+
+    @property
+    def pixels(self):
+        if self._pixels is None:
+            self._pixels = np.memmap(os.path.join(self.path, 'pixels.u8'), dtype=np.uint8, mode='r')
+        return self._pixels
+
+    def get(self, key, copy=False):
+        # key: file name or full path. -> (HxWx3 BGR image, original (h, w)) or None
+        i = self._lookup.get(os.path.basename(key))
+        if i is None:
+            return None
+        h, w = self.shapes[i]
+        img = self.pixels[self.offsets[i]:self.offsets[i + 1]].reshape(int(h), int(w), 3)
+        # Read-only view; pass copy=True if the caller edits the image in place
+        return (np.array(img) if copy else img), (int(self.orig_shapes[i][0]), int(self.orig_shapes[i][1]))
+
+
+def build_image_cache(images_dir, imgsz=640, workers=8, paths=None, signature=None, augment=False):
+    paths = list_images(images_dir) if paths is None else paths
+    signature = _signature(images_dir, paths) if signature is None else signature
+    out = cache_dir(images_dir, imgsz, augment)
+    os.makedirs(out, exist_ok=True)
+    meta = os.path.join(out, 'meta.json')
+    # meta.json is written last: a half-written cache never validates
+    if os.path.exists(meta):
+        os.remove(meta)
+
+    def load(path):
+        img = cv2.imread(path)
+        if img is None:
+            return path, None, None
+        return path, img.shape[:2], resize_long_side(img, imgsz, augment)
+
+    names, shapes, orig_shapes, offsets = [], [], [], [0]
+    with open(os.path.join(out, 'pixels.u8'), 'wb') as f:
+        for path, orig_shape, img in prefetch_map(load, paths, workers, workers * 2):
+            if img is None:
+                print(f"WARNING: Could not read {path}, not cached")
+                continue
+            f.write(np.ascontiguousarray(img).data)
+            names.append(os.path.basename(path))
+            shapes.append(img.shape[:2])
+            orig_shapes.append(orig_shape)
+            offsets.append(offsets[-1] + img.nbytes)
+
+    np.save(os.path.join(out, 'names.npy'), np.array(names, dtype=str) if names else np.zeros(0, dtype='U1'))
+    np.save(os.path.join(out, 'offsets.npy'), np.array(offsets, dtype=np.int64))
+    np.save(os.path.join(out, 'shapes.npy'), np.array(shapes, dtype=np.int32).reshape(-1, 2))
+    np.save(os.path.join(out, 'orig_shapes.npy'), np.array(orig_shapes, dtype=np.int32).reshape(-1, 2))
+    with open(meta, 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'imgsz': imgsz, 'augment': augment, 'signature': signature}, f)
+    print(f"Image cache: {len(names)} {'train' if augment else 'val'} images at imgsz {imgsz}, "
+          f"{offsets[-1] / 1e9:.2f} GB in {out}")
+    return ImageCache(out)
+
+
+def load_image_cache(images_dir, imgsz=640, build=True, workers=8, augment=False):
+    # -> ImageCache for a folder of images, (re)built if stale. None for anything that isn't a folder.
+    # augment: resize with the train split's interpolation (the dataset's augment flag)
+    if not isinstance(images_dir, str) or not os.path.isdir(images_dir):
+        return None
+    paths = list_images(images_dir)
+    signature = _signature(images_dir, paths)
+    path = cache_dir(images_dir, imgsz, augment)
+    try:
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if (meta.get('version') == CACHE_VERSION and meta.get('augment') == augment
+                and meta.get('signature') == signature):
+            return ImageCache(path)
+    except (OSError, ValueError):
+        pass
+    if not build:
+        return None
+    return build_image_cache(images_dir, imgsz, workers, paths, signature, augment)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build memory-mapped decoded-image caches")
+    parser.add_argument('dirs', nargs='*', default=[TRAIN_DIR, VALID_DIR], help="Image folders")
+    parser.add_argument('--imgsz', nargs='+', type=int, default=[640])
+    parser.add_argument('--mode', choices=['auto', 'train', 'val'], default='auto',
+                        help="Interpolation rule of the split; auto: train for folders under a 'train' directory")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rebuild', action='store_true')
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    for d in args.dirs:
+        augment = args.mode == 'train' or (args.mode == 'auto' and 'train' in os.path.normpath(d).split(os.sep))
+        for size in args.imgsz:
+            if args.rebuild:
+                build_image_cache(d, size, args.workers, augment=augment)
+            else:
+                cache = load_image_cache(d, size, workers=args.workers, augment=augment)
+                if cache is None:
+                    print(f"Skipping {d}: not a folder")
+                else:
+                    print(f"{cache.path}: {len(cache)} images ready")
@@ -0,0 +1,75 @@
+import json
+import threading
+import http.client
+from urllib.parse import urlsplit, urlencode
+
+import cv2
+import numpy as np
+
+# Thin client for inference_server.py. Keeps one keep-alive connection per thread,
+# so a thread pool of callers turns into concurrent requests the server can micro-batch.
+
+DEFAULT_URL = 'http://127.0.0.1:8765'
+
+
+class InferenceClient:
+
+    def __init__(self, url=DEFAULT_URL, timeout=120):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname or '127.0.0.1'
+        self.port = parts.port or 8765
+        self.timeout = timeout
+        self.local = threading.local()
+        self._names = None
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+
+    def _request(self, method, path, body=None):
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body=body, headers={'Content-Type': 'application/octet-stream'})
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # Stale keep-alive connection: reconnect once
+                conn.close()
+                self.local.conn = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"Inference server error {response.status}: {payload.get('error')}")
+        return payload
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    @property
+    def names(self):
+        if self._names is None:
+            # JSON turns the int class ids into strings
+            self._names = {int(k): v for k, v in self.health()['names'].items()}
+        return self._names
+
+    def predict(self, image, conf=0.25, iou=0.7, imgsz=640, augment=False):
+        # image: encoded bytes (sent as-is) or a BGR array (sent as lossless BMP).
+        # Returns (dets, (h, w)) with dets = (N, 6) x1 y1 x2 y2 conf cls.
+        if isinstance(image, np.ndarray):
+            ok, buf = cv2.imencode('.bmp', image)
+            if not ok:
+                raise ValueError("Could not encode image")
+            image = buf.tobytes()
+        elif isinstance(image, memoryview):
+            image = image.tobytes()
+
+        query = urlencode({'conf': conf, 'iou': iou, 'imgsz': imgsz, 'augment': int(augment)})
+        payload = self._request('POST', '/predict?' + query, body=image)
+        dets = np.asarray(payload['detections'], dtype=np.float32).reshape(-1, 6)
+        return dets, tuple(payload['shape'])
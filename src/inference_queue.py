@@ -0,0 +1,113 @@
+import time
+import threading
+from collections import deque
+
+# Background inference for the Streamlit app, shared by every session of the app process.
+# One worker thread makes all model calls. Jobs wait in a bounded FIFO, so concurrent
+# operators queue up instead of contending for the model. A script rerun (any widget
+# change) never cancels or repeats an analysis: the session just polls its job again.
+# Submitting a key that is already queued or running returns that job (same image, model and
+# settings from two sessions -> one forward pass).
+#
+#   queue = InferenceQueue(max_pending=16)
+#   job = queue.submit(key, lambda: model.predict(img))      # raises QueueFull
+#   job.wait(0.2); queue.position(job); queue.progress(job); job.result
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+
+    def __init__(self, key, fn):
+        self.key = key
+        self.fn = fn
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._done = threading.Event()
+
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+
+class InferenceQueue:
+
+    def __init__(self, max_pending=16):
+        self.max_pending = max_pending
+        self.pending = deque()
+        # key -> job, while queued or running
+        self.active = {}
+        self.cond = threading.Condition()
+        self.avg_seconds = None
+        self.stats = {'submitted': 0, 'merged': 0, 'rejected': 0, 'completed': 0, 'failed': 0}
+        self.thread = threading.Thread(target=self._run, name='inference-queue', daemon=True)
+        self.thread.start()
+
+    def submit(self, key, fn):
+        with self.cond:
+            job = self.active.get(key)
+            if job is not None:
+                self.stats['merged'] += 1
+                return job
+            if len(self.pending) >= self.max_pending:
+                self.stats['rejected'] += 1
+                raise QueueFull(f"{len(self.pending)} analyses already waiting")
+            job = Job(key, fn)
+            self.active[key] = job
+            self.pending.append(job)
+            self.stats['submitted'] += 1
+            self.cond.notify()
+            return job
+
+    def position(self, job):
+        # 1 = next in line, 0 = running or finished
+        with self.cond:
+            for i, queued in enumerate(self.pending):
+                if queued is job:
+                    return i + 1
+        return 0
+
+    def progress(self, job):
+        # Rough 0..1 estimate from the running average job time
+        if job.done():
+            return 1.0
+        if job.started is None:
+            return 0.0
+        if not self.avg_seconds:
+            return 0.5
+        return min((time.time() - job.started) / self.avg_seconds, 0.95)
+
+    def depth(self):
+        with self.cond:
+            return len(self.pending)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                job = self.pending.popleft()
+                job.status = 'running'
+                job.started = time.time()
+            try:
+                job.result = job.fn()
+                job.status = 'done'
+            except Exception as e:
+                job.error = e
+                job.status = 'error'
+            job.finished = time.time()
+            job.fn = None
+            with self.cond:
+                self.active.pop(job.key, None)
+                took = job.finished - job.started
+                self.avg_seconds = took if self.avg_seconds is None else 0.8 * self.avg_seconds + 0.2 * took
+                self.stats['completed' if job.error is None else 'failed'] += 1
+            job._done.set()
@@ -0,0 +1,234 @@
+import time
+import json
+import asyncio
+import argparse
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from yolo_text import to_numpy
+from model_registry import get_model, resolve_path
+from openvino_backend import OpenVINODetector, is_openvino_dir
+
+# Long-lived local inference service.
+# The model is loaded once; concurrent requests are queued and grouped into dynamic
+# micro-batches (up to --max-batch images, waiting at most --max-wait-ms for stragglers).
+# At most --max-queue images wait for the model; past that /predict answers 503 right away
+# instead of piling up requests (and decoded images) the server cannot serve in time.
+#
+#   GET  /health                         -> model info + batching stats
+#   POST /predict?conf=0.25&iou=0.7      -> body: encoded image bytes (jpg/png/bmp)
+#                                           reply: {"shape": [h, w], "detections": [[x1, y1, x2, y2, conf, cls], ...]}
+
+class MicroBatcher:
+
+    def __init__(self, model, max_batch=8, max_wait_ms=10, device=None, max_queue=None):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.device = device
+        self.queue = asyncio.Queue(maxsize=max_queue or 4 * max_batch)
+        # The model is only ever touched from this one thread
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.stats = {'requests': 0, 'batches': 0, 'images': 0, 'rejected': 0}
+
+    async def submit(self, img, params):
+        # Raises asyncio.QueueFull when the backlog is at its limit
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((img, params, future))
+        return await future
+
+    async def collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self.collect()
+
+            # Only requests with the same NMS/resolution settings can share a forward pass
+            groups = {}
+            for entry in batch:
+                params = entry[1]
+                groups.setdefault((params['iou'], params['imgsz'], params['augment']), []).append(entry)
+
+            for key, entries in groups.items():
+                try:
+                    outputs = await loop.run_in_executor(self.executor, self.infer, entries, key)
+                except Exception as e:
+                    for _, _, future in entries:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for (_, _, future), dets in zip(entries, outputs):
+                    if not future.done():
+                        future.set_result((dets, len(entries)))
+
+    def infer(self, entries, key):
+        iou, imgsz, augment = key
+        # Run at the lowest requested threshold, then filter per request
+        conf = min(params['conf'] for _, params, _ in entries)
+        if isinstance(self.model, OpenVINODetector):
+            # The exported IR has a static batch of 1: the batch goes out as parallel infer requests.
+            # Input size is fixed by the IR and there is no TTA, so imgsz / augment do not apply.
+            self.model.iou = iou
+            found = dict(self.model.predict_many(((k, img) for k, (img, _, _) in enumerate(entries)), conf=conf))
+            batch_dets = [found[k] for k in range(len(entries))]
+        else:
+            results = self.model.predict([img for img, _, _ in entries], conf=conf, iou=iou, imgsz=imgsz,
+                                         augment=augment, device=self.device, verbose=False)
+            batch_dets = [to_numpy(result.boxes.data) for result in results]
+        self.stats['batches'] += 1
+        self.stats['images'] += len(entries)
+
+        outputs = []
+        for (_, params, _), dets in zip(entries, batch_dets):
+            outputs.append(dets[dets[:, 4] >= params['conf']])
+        return outputs
+
+
+def parse_params(query):
+    q = {k: v[-1] for k, v in parse_qs(query).items()}
+    return {
+        'conf': float(q.get('conf', 0.25)),
+        'iou': float(q.get('iou', 0.7)),
+        'imgsz': int(q.get('imgsz', 640)),
+        'augment': q.get('augment', '0') in ('1', 'true', 'True'),
+    }
+
+
+class InferenceServer:
+
+    def __init__(self, model_path, max_batch=8, max_wait_ms=10, device=None, max_queue=None):
+        print(f"Loading model: {model_path}")
+        self.model_path = model_path
+        if is_openvino_dir(resolve_path(model_path)):
+            # e.g. military-l-int8: dedicated CPU backend, THROUGHPUT hint so a batch spreads over the cores
+            self.model = get_model(model_path, native_openvino=True, hint='THROUGHPUT')
+        else:
+            self.model = get_model(model_path)
+        self.batcher = MicroBatcher(self.model, max_batch, max_wait_ms, device, max_queue)
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        if method == 'GET' and url.path == '/health':
+            return 200, {
+                'status': 'ok',
+                'model': self.model_path,
+                'names': self.model.names,
+                'max_batch': self.batcher.max_batch,
+                'max_wait_ms': self.batcher.max_wait * 1000,
+                'max_queue': self.batcher.queue.maxsize,
+                'queued': self.batcher.queue.qsize(),
+                'stats': self.batcher.stats,
+            }
+
+        if method == 'POST' and url.path == '/predict':
+            start = time.perf_counter()
+            try:
+                params = parse_params(url.query)
+            except ValueError as e:
+                return 400, {'error': f"bad parameter: {e}"}
+
+            buf = np.frombuffer(body, dtype=np.uint8)
+            img = await asyncio.get_running_loop().run_in_executor(None, cv2.imdecode, buf, cv2.IMREAD_COLOR)
+            if img is None:
+                return 400, {'error': 'could not decode image'}
+
+            self.batcher.stats['requests'] += 1
+            try:
+                dets, batch_size = await self.batcher.submit(img, params)
+            except asyncio.QueueFull:
+                self.batcher.stats['rejected'] += 1
+                return 503, {'error': f"server busy: {self.batcher.queue.maxsize} images already queued"}
+            return 200, {
+                'shape': list(img.shape[:2]),
+                'detections': dets.tolist(),
+                'batch_size': batch_size,
+                'latency_ms': (time.perf_counter() - start) * 1000,
+            }
+
+        return 404, {'error': f"no route for {method} {url.path}"}
+
+    async def handle(self, reader, writer):
+        # Minimal HTTP/1.1 with keep-alive: enough for http.client and curl
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, _ = line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, value = header.decode('latin-1').split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                try:
+                    status, payload = await self.route(method, target, body)
+                except Exception as e:
+                    status, payload = 500, {'error': str(e)}
+
+                data = json.dumps(payload).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765):
+        server = await asyncio.start_server(self.handle, host, port)
+        batcher = asyncio.create_task(self.batcher.run())
+        print(f"Inference server listening on http://{host}:{port} "
+              f"(max batch {self.batcher.max_batch}, max wait {self.batcher.max_wait * 1000:.0f} ms, "
+              f"max queue {self.batcher.queue.maxsize})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Local inference server with dynamic micro-batching")
+    parser.add_argument('--model', default='best.pt', help="Path or model_registry name, e.g. best.pt or military-l-int8")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    parser.add_argument('--max-queue', type=int, default=None,
+                        help="Images allowed to wait for the model before /predict returns 503 (default: 4x max batch)")
+    parser.add_argument('--device', default=None)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = InferenceServer(args.model, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, device=args.device,
+                             max_queue=args.max_queue)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("Server stopped.")
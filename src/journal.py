@@ -0,0 +1,163 @@
+import os
+import json
+import signal
+import zipfile
+import threading
+
+# Durable progress journal for long prediction jobs (predict.py / predict_sahi.py).
+# Append-only JSON lines next to the output:
+#   {"params": {...}}                                    header: job identity
+#   {"name": "img_0001"}                                 loose .txt mode
+#   {"name": "img_0002", "header_offset": 1234, ...}     ZIP mode: the entry's ZipInfo + end offset
+# A line is only written after its output bytes were handed to the OS, so everything in the
+# journal is on disk. Rerunning the same command skips journaled images; in ZIP mode the archive
+# is cut back to the last journaled entry and its central directory rebuilt from the journal.
+# The journal is deleted once the job completes.
+
+SYNC_EVERY = 64
+
+
+def journal_path(destination, loose_files):
+    return os.path.join(destination, '.journal') if loose_files else destination + '.journal'
+
+
+class Journal:
+
+    def __init__(self, path, params, resume=True, sync_every=SYNC_EVERY):
+        self.path = path
+        self.params = json.loads(json.dumps(params))
+        self.sync_every = sync_every
+        self.records = {}
+        self.lock = threading.Lock()
+        self.pending_sync = 0
+
+        if resume and os.path.exists(path):
+            self.records = self.load()
+        if self.records:
+            self.file = open(path, 'a')
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.file = open(path, 'w')
+            self.file.write(json.dumps({'params': self.params}) + "\n")
+            self.file.flush()
+
+    def load(self):
+        records = {}
+        with open(self.path, 'r') as f:
+            lines = f.read().split("\n")
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return {}
+        if header.get('params') != self.params:
+            print(f"Journal {self.path} belongs to a different job (model/settings/source changed), starting over.")
+            return {}
+        for line in lines[1:]:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                # Torn last line from a crash mid-write
+                break
+            records[rec['name']] = rec
+        return records
+
+    def retain(self, names):
+        # Drop records whose output did not survive (e.g. cut from a torn ZIP) and rewrite the
+        # journal, so a stale offset can never resurface on a later resume
+        with self.lock:
+            self.records = {n: r for n, r in self.records.items() if n in names}
+            self.file.close()
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                f.write(json.dumps({'params': self.params}) + "\n")
+                for rec in self.records.values():
+                    f.write(json.dumps(rec) + "\n")
+            os.replace(tmp, self.path)
+            self.file = open(self.path, 'a')
+
+    @property
+    def done(self):
+        return set(self.records)
+
+    def zip_entries(self):
+        # Entries in archive order; they were written sequentially so offsets only grow
+        return sorted((r for r in self.records.values() if 'header_offset' in r), key=lambda r: r['header_offset'])
+
+    def record(self, name, data_file=None, **info):
+        # data_file: the output file object, fsynced before the journal so the journal never runs ahead
+        rec = dict(name=name, **info)
+        with self.lock:
+            self.records[name] = rec
+            self.file.write(json.dumps(rec) + "\n")
+            self.file.flush()
+            self.pending_sync += 1
+            if self.pending_sync >= self.sync_every:
+                self._sync(data_file)
+
+    def _sync(self, data_file=None):
+        if data_file is not None:
+            data_file.flush()
+            os.fsync(data_file.fileno())
+        os.fsync(self.file.fileno())
+        self.pending_sync = 0
+
+    def close(self, complete):
+        with self.lock:
+            self._sync()
+            self.file.close()
+        if complete:
+            os.remove(self.path)
+
+
+def reopen_zip(zip_path, entries, compression=zipfile.ZIP_DEFLATED):
+    # Cut a crashed archive (no central directory) back to its last journaled entry and reopen
+    # it for appending, with the journaled entries registered so close() lists them again.
+    size = os.path.getsize(zip_path)
+    entries = [e for e in entries if e['end'] <= size]
+    end = entries[-1]['end'] if entries else 0
+    with open(zip_path, 'r+b') as f:
+        f.truncate(end)
+
+    # 'a' on a file without an end record appends at EOF, which is exactly the cut point
+    zipf = zipfile.ZipFile(zip_path, 'a', compression)
+    for e in entries:
+        info = zipfile.ZipInfo(e['name'] + '.txt', tuple(e['date_time']))
+        info.header_offset = e['header_offset']
+        info.CRC = e['crc']
+        info.compress_size = e['compress_size']
+        info.file_size = e['file_size']
+        info.compress_type = e['compress_type']
+        info.flag_bits = e['flag_bits']
+        info.external_attr = e['external_attr']
+        zipf.filelist.append(info)
+        zipf.NameToInfo[info.filename] = info
+    return zipf, {e['name'] for e in entries}
+
+
+class GracefulInterrupt:
+    # First Ctrl-C: stop feeding new images, let in-flight batches finish and flush.
+    # Second Ctrl-C: abort immediately (the journal still allows a resume).
+    # Installed on creation, call restore() when the job ends.
+
+    def __init__(self):
+        self.stopped = False
+        self.previous = None
+        if threading.current_thread() is threading.main_thread():
+            self.previous = signal.signal(signal.SIGINT, self._handle)
+
+    def restore(self):
+        if self.previous is not None:
+            signal.signal(signal.SIGINT, self.previous)
+            self.previous = None
+
+    def _handle(self, signum, frame):
+        if self.stopped:
+            raise KeyboardInterrupt
+        self.stopped = True
+        print("\nInterrupt: finishing in-flight batches and flushing outputs (Ctrl-C again to abort)...")
+
+    def until_stopped(self, items):
+        for item in items:
+            if self.stopped:
+                return
+            yield item
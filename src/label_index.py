@@ -0,0 +1,233 @@
+import os
+import json
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Array-backed index over a folder (or ZIP) of YOLO .txt files: ground-truth labels or predictions.
+# Parsed once (in parallel), then cached next to the source as memory-mapped .npy files:
+#   train/labels        -> train/labels.index/{names,image_id,class_id,xywh,conf,nvals,...}.npy + meta.json
+#   submission.zip      -> submission.zip.index/
+# The cache is rebuilt when any file's mtime/size changes or files are added/removed.
+#
+# One row per box, sorted by image:
+#   image_id  int32      index into names (image basename without .txt)
+#   class_id  int32
+#   xywh      float32    normalized center/size (polygons: their bounding box)
+#   conf      float32    6th column of prediction files, NaN for ground truth
+#   nvals     int16      values on the line (5 for labels, 6 for predictions, more for polygons)
+# Polygon points live in poly (M, 2) with row r's points at poly[poly_offsets[r]:poly_offsets[r + 1]].
+# Boxes of image i are rows box_offsets[i]:box_offsets[i + 1]; skipped[i] counts its unparsable lines.
+#
+#   index = load_index(r'D:\...\train\labels')
+#   np.bincount(index.class_id)          # class histogram
+#   index.boxes('000123')                # (class_id, xywh, conf) of one image
+
+ARRAYS = ('names', 'image_id', 'class_id', 'xywh', 'conf', 'nvals', 'poly', 'poly_offsets', 'box_offsets',
+          'skipped')
+INDEX_VERSION = 2
+# Below this many files a process pool costs more than it saves
+PARALLEL_MIN_FILES = 2000
+
+
+def parse_label_text(text):
+    # -> class_id, xywh, conf, nvals, polygons (list of (k, 2) arrays or None), skipped lines for one file
+    cls, xywh, conf, nvals, polys = [], [], [], [], []
+    skipped = 0
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        try:
+            c = int(parts[0])
+            values = [float(v) for v in parts[1:]]
+        except ValueError:
+            skipped += 1
+            continue
+        if len(values) < 4:
+            skipped += 1
+            continue
+        n = len(values)
+        if n <= 5:
+            # class x_c y_c w h [conf]
+            box, score, poly = values[:4], values[4] if n == 5 else np.nan, None
+        elif n % 2 == 0:
+            # Segmentation: class x1 y1 x2 y2 ... -> bounding box + points
+            poly = np.array(values, dtype=np.float32).reshape(-1, 2)
+            (min_x, min_y), (max_x, max_y) = poly.min(0), poly.max(0)
+            box = [(min_x + max_x) / 2, (min_y + max_y) / 2, max_x - min_x, max_y - min_y]
+            score = np.nan
+        else:
+            skipped += 1
+            continue
+        cls.append(c)
+        xywh.append(box)
+        conf.append(score)
+        nvals.append(len(parts))
+        polys.append(poly)
+    return cls, xywh, conf, nvals, polys, skipped
+
+
+def _parse_dir_chunk(args):
+    label_dir, names = args
+    out = []
+    for name in names:
+        with open(os.path.join(label_dir, name + '.txt'), 'r') as f:
+            out.append(parse_label_text(f.read()))
+    return out
+
+
+def _parse_zip_chunk(args):
+    zip_path, members = args
+    with zipfile.ZipFile(zip_path) as zf:
+        return [parse_label_text(zf.read(m).decode('utf-8')) for m in members]
+
+
+def _scan(source):
+    # -> (sorted names, per-name payload for the parser, signature)
+    if os.path.isdir(source):
+        entries = [e for e in os.scandir(source) if e.name.endswith('.txt') and e.is_file()]
+        names = sorted(e.name[:-4] for e in entries)
+        stats = [e.stat() for e in entries]
+        signature = [len(entries), max((s.st_mtime_ns for s in stats), default=0),
+                     sum(s.st_size for s in stats), os.stat(source).st_mtime_ns]
+        return names, names, signature
+
+    st = os.stat(source)
+    with zipfile.ZipFile(source) as zf:
+        members = {os.path.splitext(os.path.basename(m))[0]: m for m in zf.namelist() if m.endswith('.txt')}
+    names = sorted(members)
+    return names, [members[n] for n in names], [len(names), st.st_mtime_ns, st.st_size, 0]
+
+
+class LabelIndex:
+
+    def __init__(self, arrays, source=None):
+        self.source = source
+        for key in ARRAYS:
+            setattr(self, key, arrays[key])
+        self._lookup = None
+
+    def __len__(self):
+        return len(self.image_id)
+
+    @property
+    def num_images(self):
+        return len(self.names)
+
+    def image_row(self, name):
+        if self._lookup is None:
+            self._lookup = {str(n): i for i, n in enumerate(self.names)}
+        return self._lookup.get(name)
+
+    def rows(self, name):
+        i = self.image_row(name)
+        if i is None:
+            return slice(0, 0)
+        return slice(int(self.box_offsets[i]), int(self.box_offsets[i + 1]))
+
+    def boxes(self, name):
+        r = self.rows(name)
+        return self.class_id[r], self.xywh[r], self.conf[r]
+
+    def polygon(self, row):
+        return self.poly[self.poly_offsets[row]:self.poly_offsets[row + 1]]
+
+    def boxes_per_image(self):
+        return np.diff(self.box_offsets)
+
+    def class_histogram(self, minlength=0):
+        return np.bincount(self.class_id, minlength=minlength)
+
+    def images_with_class(self, *class_ids):
+        ids = np.unique(self.image_id[np.isin(self.class_id, class_ids)])
+        return [str(n) for n in self.names[ids]]
+
+
+def build_arrays(names, parsed):
+    counts = np.array([len(p[0]) for p in parsed], dtype=np.int64)
+    box_offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    np.cumsum(counts, out=box_offsets[1:])
+
+    polys = [poly for p in parsed for poly in p[4]]
+    poly_sizes = np.array([0 if poly is None else len(poly) for poly in polys], dtype=np.int64)
+    poly_offsets = np.zeros(len(polys) + 1, dtype=np.int64)
+    np.cumsum(poly_sizes, out=poly_offsets[1:])
+    poly = [p for p in polys if p is not None]
+
+    return {
+        'names': np.array(names, dtype=str) if names else np.zeros(0, dtype='U1'),
+        'image_id': np.repeat(np.arange(len(names), dtype=np.int32), counts),
+        'class_id': np.array([c for p in parsed for c in p[0]], dtype=np.int32),
+        'xywh': np.array([b for p in parsed for b in p[1]], dtype=np.float32).reshape(-1, 4),
+        'conf': np.array([c for p in parsed for c in p[2]], dtype=np.float32),
+        'nvals': np.array([n for p in parsed for n in p[3]], dtype=np.int16),
+        'poly': np.concatenate(poly) if poly else np.zeros((0, 2), dtype=np.float32),
+        'poly_offsets': poly_offsets,
+        'box_offsets': box_offsets,
+        'skipped': np.array([p[5] for p in parsed], dtype=np.int32),
+    }
+
+
+def _cache_dir(source):
+    return os.path.normpath(source) + '.index'
+
+
+def _load_cached(cache_dir, signature):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != INDEX_VERSION or meta.get('signature') != signature:
+            return None
+        return {key: np.load(os.path.join(cache_dir, key + '.npy'), mmap_mode='r') for key in ARRAYS}
+    except (OSError, ValueError):
+        return None
+
+
+def _save_cached(cache_dir, arrays, signature):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        meta = os.path.join(cache_dir, 'meta.json')
+        # meta.json is written last: a half-written cache never validates
+        if os.path.exists(meta):
+            os.remove(meta)
+        for key in ARRAYS:
+            np.save(os.path.join(cache_dir, key + '.npy'), arrays[key])
+        with open(meta, 'w') as f:
+            json.dump({'version': INDEX_VERSION, 'signature': signature}, f)
+    except OSError as e:
+        print(f"WARNING: Could not write label index cache {cache_dir}: {e}")
+
+
+def load_index(source, workers=None, rebuild=False, cache=True):
+    # source: folder of .txt files or a ZIP of them. Missing folder -> empty index.
+    if not os.path.exists(source):
+        return LabelIndex(build_arrays([], []), source)
+
+    names, payload, signature = _scan(source)
+    cache_dir = _cache_dir(source)
+    if cache and not rebuild:
+        arrays = _load_cached(cache_dir, signature)
+        if arrays is not None:
+            return LabelIndex(arrays, source)
+
+    parse = _parse_dir_chunk if os.path.isdir(source) else _parse_zip_chunk
+    workers = workers or os.cpu_count() or 1
+    if len(payload) < PARALLEL_MIN_FILES or workers == 1:
+        parsed = parse((source, payload))
+    else:
+        size = -(-len(payload) // (workers * 4))
+        chunks = [(source, payload[i:i + size]) for i in range(0, len(payload), size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = [p for chunk in pool.map(parse, chunks) for p in chunk]
+
+    arrays = build_arrays(names, parsed)
+    if cache:
+        _save_cached(cache_dir, arrays, signature)
+    print(f"Label index: parsed {len(names)} files, {len(arrays['image_id'])} boxes from {source}")
+    return LabelIndex(arrays, source)
+
+
+def load_split(root_dir, split, **kw):
+    return load_index(os.path.join(root_dir, split, 'labels'), **kw)
@@ -0,0 +1,319 @@
+import os
+import json
+import math
+import time
+import argparse
+
+import cv2
+import numpy as np
+import torch
+
+import profiling
+from box_ops import merge_detections_local
+from engine import IMAGE_EXTS, make_writer, prefetch_map
+from model_registry import get_model
+from tiling import EMPTY, TiledPredictor, tile_grid
+from yolo_text import xyxy_to_rows, format_rows
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+# Detection on satellite scenes far larger than RAM. The scene is never decoded as a whole:
+# tiles are read as windows of a disk-backed raster, a few batches ahead of the model, so memory
+# stays at (batch_size * 3) tiles whatever the scene size. Tile boxes are shifted to scene pixels
+# and merged with a cell-local NMM/NMS/WBF; the output is one 6-column file per scene, normalized to
+# the full scene like every other prediction file.
+#
+#   scene.npy / raw (--raw-shape H W C)   memory-mapped as is
+#   .tif / .tiff (needs tifffile)         memory-mapped when uncompressed, otherwise its strips /
+#                                         tiles are decoded one by one into a raster cache
+#   .jpg / .png / ...                     decoded once into a raster cache (the decode needs the
+#                                         full image in RAM, so prefer tiled GeoTIFF for huge scenes;
+#                                         raise OPENCV_IO_MAX_IMAGE_PIXELS past 2^30 pixels)
+# The raster cache sits next to the scene (scene.tif.raster/{pixels.npy, meta.json}) and is
+# reused until the scene file changes.
+#
+#   python src/large_scene.py D:\scenes\area_01.tif D:\scenes\area_02.npy --zip scenes.zip
+#   python src/predict_sahi.py --large-scene --source D:\scenes --zip scenes.zip
+
+RASTER_VERSION = 1
+SCENE_EXTS = IMAGE_EXTS + ('.tif', '.tiff', '.npy', '.raw')
+
+
+def raster_dir(path):
+    return os.path.normpath(path) + '.raster'
+
+
+def _signature(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def load_raster(path):
+    # -> read-only memmap of a finished raster cache, or None
+    folder = raster_dir(path)
+    try:
+        with open(os.path.join(folder, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != RASTER_VERSION or meta.get('signature') != _signature(path):
+        return None
+    return np.load(os.path.join(folder, 'pixels.npy'), mmap_mode='r')
+
+
+def _new_raster(path, shape, dtype):
+    folder = raster_dir(path)
+    os.makedirs(folder, exist_ok=True)
+    meta = os.path.join(folder, 'meta.json')
+    if os.path.exists(meta):
+        os.remove(meta)
+    return np.lib.format.open_memmap(os.path.join(folder, 'pixels.npy'), mode='w+', dtype=dtype, shape=shape)
+
+
+def _finish_raster(path, pixels):
+    pixels.flush()
+    del pixels
+    # meta.json is written last: a half-converted raster is never used
+    with open(os.path.join(raster_dir(path), 'meta.json'), 'w') as f:
+        json.dump({'version': RASTER_VERSION, 'signature': _signature(path)}, f)
+    return load_raster(path)
+
+
+def convert_image(path):
+    # JPEG / PNG have no random access: decode once, keep the pixels as a raw raster
+    print(f"Converting {path} to a raster cache (one-time full decode)...")
+    img = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise ValueError(f"Could not read {path} (past 2^30 pixels set OPENCV_IO_MAX_IMAGE_PIXELS)")
+    pixels = _new_raster(path, img.shape, img.dtype)
+    pixels[:] = img
+    del img
+    return _finish_raster(path, pixels)
+
+
+def convert_tiff(path, page):
+    # Compressed TIFF: decode strip by strip / tile by tile straight into the raster
+    if page.planarconfig != 1 and page.samplesperpixel > 1:
+        raise ValueError(f"{path}: band-interleaved TIFF is not supported "
+                         "(gdal_translate -co INTERLEAVE=PIXEL -co TILED=YES)")
+    print(f"Converting {path} to a raster cache ({len(page.dataoffsets)} segments)...")
+    pixels = _new_raster(path, page.shape, page.dtype)
+    out = pixels.reshape(page.shaped)
+    h, w = page.imagelength, page.imagewidth
+    for segment, (s, d, y, x, _), shape in page.segments():
+        if segment is not None:
+            out[s, d:d + shape[0], y:y + shape[1], x:x + shape[2]] = segment[:, :h - y, :w - x]
+    return _finish_raster(path, pixels)
+
+
+def open_tiff(path):
+    if tifffile is None:
+        raise ImportError("Reading TIFF scenes needs tifffile (pip install tifffile)")
+    try:
+        return tifffile.memmap(path, mode='r')
+    except ValueError:
+        pass
+    cached = load_raster(path)
+    if cached is not None:
+        return cached
+    with tifffile.TiffFile(path) as tif:
+        return convert_tiff(path, tif.pages[0])
+
+
+class Scene:
+    # HxW(xC) raster read window by window; windows come back as contiguous uint8 BGR tiles
+
+    def __init__(self, pixels, path, rgb=False):
+        self.pixels = pixels
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.rgb = rgb
+        self.shape = pixels.shape[:2]
+        self.stretch = None
+        if pixels.dtype != np.uint8:
+            # 16-bit / float bands: one linear 2-98% stretch for the whole scene, from a sparse sample
+            sample = np.asarray(self.overview_pixels(1024)[0], dtype=np.float64)
+            lo, hi = np.percentile(sample, (2, 98))
+            if hi <= lo:
+                hi = sample.max()
+            self.stretch = (lo, max(hi - lo, 1.0))
+
+    def to_bgr(self, img):
+        if self.stretch is not None:
+            lo, span = self.stretch
+            img = ((np.asarray(img, dtype=np.float32) - lo) * (255 / span)).clip(0, 255).astype(np.uint8)
+        if img.ndim == 2 or img.shape[2] == 1:
+            return cv2.cvtColor(np.ascontiguousarray(img.reshape(img.shape[:2])), cv2.COLOR_GRAY2BGR)
+        # Alpha / extra bands are dropped
+        img = img[..., 2::-1] if self.rgb else img[..., :3]
+        return np.ascontiguousarray(img)
+
+    def window(self, region):
+        x0, y0, x1, y1 = (int(v) for v in region)
+        with profiling.stage('decode'):
+            return self.to_bgr(self.pixels[y0:y1, x0:x1])
+
+    def overview_pixels(self, max_side):
+        # Every k-th row / column: touches 1/k of the rows and never holds more than the result
+        k = max(1, math.ceil(max(self.shape) / max_side))
+        return self.pixels[::k, ::k], k
+
+    def overview(self, max_side):
+        small, k = self.overview_pixels(max_side)
+        return self.to_bgr(small), k
+
+
+def open_scene(path, raw_shape=None, rgb=None):
+    ext = os.path.splitext(path)[1].lower()
+    if raw_shape is not None:
+        pixels = np.memmap(path, dtype=np.uint8, mode='r', shape=tuple(raw_shape))
+    elif ext == '.npy':
+        pixels = np.load(path, mmap_mode='r')
+    elif ext in ('.tif', '.tiff'):
+        pixels = open_tiff(path)
+        # TIFF stores RGB, everything else here is already BGR
+        rgb = True if rgb is None else rgb
+    else:
+        pixels = load_raster(path)
+        if pixels is None:
+            pixels = convert_image(path)
+    return Scene(pixels, path, rgb=bool(rgb))
+
+
+class SceneDetector:
+
+    def __init__(self, model, tile=640, overlap=0.25, batch_size=16, imgsz=640, conf=0.10, iou=0.7,
+                 overview=True, merge='nmm', merge_thr=0.5, merge_metric='ios', device=None, workers=4):
+        # TiledPredictor's batched forward pass; the tiling itself happens here
+        self.predictor = TiledPredictor(model, tile=tile, overlap=overlap, batch_size=batch_size, imgsz=imgsz,
+                                        conf=conf, iou=iou, full_frame=False, device=device)
+        self.tile = tile
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.imgsz = imgsz
+        # Like TiledPredictor.full_frame: one strided, downscaled pass for objects larger than a tile
+        self.overview = overview
+        self.merge = merge
+        self.merge_thr = merge_thr
+        self.merge_metric = merge_metric
+        self.workers = workers
+
+    def detect(self, scene, log_every=50):
+        # -> (N, 6) x1 y1 x2 y2 conf cls in scene pixels
+        h, w = scene.shape
+        grid = tile_grid(h, w, self.tile, self.overlap)
+        found = []
+        batch, regions = [], []
+        # Windows are read ahead on a thread pool, at most two batches in flight
+        windows = prefetch_map(scene.window, grid, self.workers, prefetch=self.batch_size * 2)
+        for n, (region, tile) in enumerate(zip(grid, windows)):
+            batch.append(tile)
+            regions.append(region)
+            if len(batch) == self.batch_size or n == len(grid) - 1:
+                for (x0, y0, _, _), dets in zip(regions, self.predictor.infer(batch)):
+                    if len(dets):
+                        dets = dets.copy()
+                        dets[:, [0, 2]] += x0
+                        dets[:, [1, 3]] += y0
+                        found.append(dets)
+                batch, regions = [], []
+                if log_every and (n // self.batch_size) % log_every == 0:
+                    print(f"  {scene.name}: {n + 1}/{len(grid)} tiles")
+
+        if self.overview and len(grid) > 1:
+            small, k = scene.overview(self.imgsz)
+            dets = self.predictor.infer([small])[0]
+            if len(dets):
+                dets = dets.copy()
+                dets[:, :4] *= k
+                dets[:, [0, 2]] = dets[:, [0, 2]].clip(0, w)
+                dets[:, [1, 3]] = dets[:, [1, 3]].clip(0, h)
+                found.append(dets)
+
+        if not found:
+            return EMPTY
+        dets = np.concatenate(found)
+        # Tile boxes are at most a tile wide, so tile-sized cells keep the merge local; overview boxes
+        # spanning several tiles get merge_detections_local's separate large-box pass
+        with profiling.stage('merge'):
+            return merge_detections_local(dets, self.tile, self.merge_thr, self.merge_metric, self.merge)
+
+
+def list_scenes(source):
+    if os.path.isfile(source):
+        return [source]
+    return sorted(os.path.join(source, f) for f in os.listdir(source)
+                  if f.lower().endswith(SCENE_EXTS) and os.path.isfile(os.path.join(source, f)))
+
+
+def predict_scenes(model_path, sources, destination, tile=640, overlap=0.25, batch_size=16, workers=4,
+                   conf=0.10, merge='nmm', device=None, overview=True, loose_files=False, raw_shape=None, rgb=None):
+    print("--- LARGE-SCENE INFERENCE (windowed reads) ---")
+    print(f"Loading Model: {model_path}")
+    model = get_model(model_path)
+    if device is None:
+        device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    detector = SceneDetector(model, tile=tile, overlap=overlap, batch_size=batch_size, conf=conf, merge=merge,
+                             device=device, overview=overview, workers=workers)
+
+    paths = [p for source in sources for p in list_scenes(source)]
+    writer = make_writer(destination, loose_files=loose_files)
+    writer.start()
+    start = time.perf_counter()
+    pixels = 0
+    try:
+        for path in paths:
+            scene = open_scene(path, raw_shape, rgb)
+            h, w = scene.shape
+            print(f"{scene.name}: {w}x{h} ({w * h / 1e6:.0f} MP)")
+            t0 = time.perf_counter()
+            dets = detector.detect(scene)
+            with profiling.stage('format'):
+                writer.put(scene.name, format_rows(xyxy_to_rows(dets[:, :4], dets[:, 4], dets[:, 5], (h, w))))
+            profiling.count('boxes', len(dets))
+            pixels += w * h
+            print(f"{scene.name}: {len(dets)} objects in {time.perf_counter() - t0:.1f}s")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    predictor = detector.predictor
+    print(f"Done! {len(paths)} scenes saved to {destination}")
+    print(f"{predictor.tiles_processed} tiles in {predictor.forward_passes} forward passes "
+          f"({pixels / 1e6 / max(elapsed, 1e-9):.1f} MP/sec)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tiled detection on scenes larger than RAM")
+    parser.add_argument('scenes', nargs='+', help="Scene files or folders of scenes")
+    parser.add_argument('--model', default='military-l', help="Path or model_registry name")
+    parser.add_argument('--output', default=r'D:\military_object_dataset\military_object_dataset\predictions_scenes')
+    parser.add_argument('--zip', default=None, help="Write straight into this ZIP instead of --output")
+    parser.add_argument('--tile', type=int, default=640)
+    parser.add_argument('--overlap', type=float, default=0.25)
+    parser.add_argument('--batch-size', type=int, default=16, help="Tiles per forward pass")
+    parser.add_argument('--workers', type=int, default=4, help="Window read threads")
+    parser.add_argument('--conf', type=float, default=0.10)
+    parser.add_argument('--merge', choices=['nmm', 'nms', 'wbf'], default='nmm')
+    parser.add_argument('--no-overview', action='store_true', help="Skip the downscaled whole-scene pass")
+    parser.add_argument('--raw-shape', nargs=3, type=int, default=None, metavar=('H', 'W', 'C'),
+                        help="Read the scenes as headerless uint8 rasters of this shape")
+    parser.add_argument('--rgb', action='store_true', help="Channels are stored RGB (default: BGR, TIFF: RGB)")
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help="Time every stage; write metrics.prom + JSONL/Chrome traces to DIR")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.profile:
+        profiling.enable()
+    predict_scenes(args.model, args.scenes, args.zip or args.output, tile=args.tile, overlap=args.overlap,
+                   batch_size=args.batch_size, workers=args.workers, conf=args.conf, merge=args.merge,
+                   device=args.device, overview=not args.no_overview, loose_files=args.zip is None,
+                   raw_shape=args.raw_shape, rgb=True if args.rgb else None)
+    if args.profile:
+        profiling.export(args.profile)
@@ -0,0 +1,91 @@
+import os
+import json
+
+from engine import prefetch_map
+from result_cache import file_digest
+
+# Incremental prediction runs.
+# <output_dir>/.manifest.json records, per output .txt, the input image hash and the
+# parameters (model fingerprint, conf, iou, ...) it was produced with:
+#   {"params": {...}, "images": {"<name>": {"hash": ..., "size": ..., "mtime_ns": ..., "params": {...}}}}
+# A rerun only predicts images that are new, changed, or were made with different parameters,
+# and deletes the .txt of images that disappeared from the source folder.
+# Unchanged size + mtime reuses the recorded hash, so an unchanged drop is not re-read.
+
+MANIFEST_NAME = '.manifest.json'
+
+
+class Manifest:
+
+    def __init__(self, output_dir, params):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        # Round-trip through JSON so comparisons with the stored copy are like for like
+        self.params = json.loads(json.dumps(params))
+        self.old = self.load()
+        self.entries = {}
+        self.pending = {}
+        self.deleted = []
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f).get('images', {})
+        except (OSError, ValueError) as e:
+            print(f"WARNING: Unreadable manifest {self.path} ({e}), running everything.")
+            return {}
+
+    def _stat(self, path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        st = os.stat(path)
+        prev = self.old.get(name)
+        if prev and prev.get('size') == st.st_size and prev.get('mtime_ns') == st.st_mtime_ns:
+            digest = prev['hash']
+        else:
+            digest = file_digest(path)
+        return path, name, {'hash': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'params': self.params}
+
+    def plan(self, images, workers=4):
+        # -> image paths that need predicting; everything else keeps its existing .txt
+        todo = []
+        seen = set()
+        for path, name, entry in prefetch_map(self._stat, images, workers, workers * 4):
+            seen.add(name)
+            prev = self.old.get(name)
+            up_to_date = (prev is not None and prev['hash'] == entry['hash'] and prev.get('params') == self.params
+                          and os.path.exists(os.path.join(self.output_dir, name + '.txt')))
+            if up_to_date:
+                self.entries[name] = entry
+            else:
+                self.pending[name] = entry
+                todo.append(path)
+        self.deleted = sorted(name for name in self.old if name not in seen)
+
+        changed = sum(1 for name in self.pending if name in self.old)
+        print(f"Incremental: {len(self.entries)} unchanged, {len(self.pending) - changed} new, "
+              f"{changed} changed, {len(self.deleted)} deleted")
+        return todo
+
+    def digest(self, name):
+        entry = self.pending.get(name) or self.entries.get(name)
+        return entry['hash'] if entry else None
+
+    def done(self, name):
+        if name in self.pending:
+            self.entries[name] = self.pending.pop(name)
+
+    def prune(self):
+        for name in self.deleted:
+            path = os.path.join(self.output_dir, name + '.txt')
+            if os.path.exists(path):
+                os.remove(path)
+
+    def save(self):
+        # Images still pending (crash / Ctrl-C) are left out, so the next run redoes them
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'params': self.params, 'images': self.entries}, f)
+        os.replace(tmp, self.path)
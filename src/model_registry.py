@@ -0,0 +1,132 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# One place that knows where the models live.
+#   resolve_path('military-l-int8')  -> runs/train/.../best_int8_openvino_model
+#   get_model('military-l')          -> warm, warmed-up model instance (LRU-cached, reloaded when the file changes)
+# Any name that is not registered is treated as a plain path, so get_model('best.pt') also works.
+# A bare ultralytics weights name that is not on disk (get_model('yolov8l.pt')) is handed to
+# YOLO() as is, which downloads it.
+
+WEIGHTS_DIR = 'runs/train/yolov8l_military_resumed/weights'
+
+MODELS = {
+    'military-l': os.path.join(WEIGHTS_DIR, 'best.pt'),
+    'military-l-int8': os.path.join(WEIGHTS_DIR, 'best_int8_openvino_model'),
+    'military-l-onnx': os.path.join(WEIGHTS_DIR, 'best.onnx'),
+    'military-l-trt': os.path.join(WEIGHTS_DIR, 'best.engine'),
+    'military-l-base': 'runs/train/yolov8l_military/weights/best.pt',
+    'military-l-finetune': 'runs/train/yolov8l_emergency_finetune/weights/best.pt',
+    'military-m-hd': 'runs/train/yolov8m_hd_sniper/weights/best.pt',
+    'military-x': 'runs/train/yolov8x_ultimate/weights/best.pt',
+    # Shipped with the submission archive (repo root)
+    'demo': 'best.pt',
+    'demo-int8': 'best_int8_openvino_model',
+}
+
+DEFAULT_MODEL = 'military-l'
+
+# Rough resident-memory budget for warm models (file size x overhead), override with env var
+CACHE_LIMIT_MB = float(os.environ.get('SERVESMART_MODEL_CACHE_MB', 4096))
+MEMORY_OVERHEAD = 2.5
+
+
+def register(name, path):
+    MODELS[name] = path
+
+
+def resolve_path(name=DEFAULT_MODEL):
+    return MODELS.get(name, name)
+
+
+def backend_for(path):
+    if os.path.isdir(path):
+        return 'openvino'
+    ext = os.path.splitext(path)[1].lower()
+    return {'.pt': 'pytorch', '.onnx': 'onnx', '.engine': 'tensorrt', '.xml': 'openvino'}.get(ext, 'pytorch')
+
+
+def _files(path):
+    if os.path.isdir(path):
+        return [os.path.join(root, f) for root, _, files in os.walk(path) for f in files]
+    return [path]
+
+
+def is_hub_name(name, path):
+    # 'yolov8l.pt': not registered, no folder part, not on disk -> ultralytics downloads it
+    return name not in MODELS and path == os.path.basename(path) and path.endswith('.pt') \
+        and not os.path.exists(path)
+
+
+def file_signature(path):
+    # (newest mtime, total bytes) over the model file or export folder
+    stats = [os.stat(f) for f in _files(path)]
+    return max(s.st_mtime_ns for s in stats), sum(s.st_size for s in stats)
+
+
+class ModelRegistry:
+
+    def __init__(self, limit_mb=CACHE_LIMIT_MB):
+        self.limit_bytes = limit_mb * 1024 * 1024
+        self.cache = OrderedDict()   # key -> (model, signature, est_bytes)
+        self.lock = threading.RLock()
+        self.loads = 0
+
+    def _load(self, path, native_openvino, options):
+        backend = backend_for(path)
+        if backend == 'openvino' and native_openvino:
+            from openvino_backend import OpenVINODetector
+            model = OpenVINODetector(path, **options)
+            model.predict(np.zeros((model.imgsz, model.imgsz, 3), dtype=np.uint8))
+        else:
+            from ultralytics import YOLO
+            model = YOLO(path, task='detect')
+            # Warmup: first call pays graph building / kernel selection, not the first user
+            model.predict(np.zeros((640, 640, 3), dtype=np.uint8), verbose=False)
+        self.loads += 1
+        print(f"Model registry: loaded {path} ({backend})")
+        return model
+
+    def get(self, name=DEFAULT_MODEL, native_openvino=False, **options):
+        path = resolve_path(name)
+        if is_hub_name(name, path):
+            # Nothing on disk to key or watch yet; once downloaded it is cached like any file
+            return self._load(path, native_openvino, options)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model '{name}' not found at {path}")
+
+        key = (os.path.abspath(path), native_openvino, tuple(sorted(options.items())))
+        signature = file_signature(path)
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None and cached[1] == signature:
+                self.cache.move_to_end(key)
+                return cached[0]
+            if cached is not None:
+                print(f"Model registry: {path} changed on disk, reloading")
+                del self.cache[key]
+
+            model = self._load(path, native_openvino, options)
+            self.cache[key] = (model, signature, signature[1] * MEMORY_OVERHEAD)
+            self._evict()
+            return model
+
+    def _evict(self):
+        # Drop least recently used models until under budget, always keeping the newest
+        while len(self.cache) > 1 and sum(entry[2] for entry in self.cache.values()) > self.limit_bytes:
+            key, _ = self.cache.popitem(last=False)
+            print(f"Model registry: evicted {key[0]}")
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+
+_registry = ModelRegistry()
+
+
+def get_model(name=DEFAULT_MODEL, native_openvino=False, **options):
+    return _registry.get(name, native_openvino, **options)
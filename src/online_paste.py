@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+from ultralytics.utils.instance import Instances
+
+from copy_paste import build_patch_bank, paste
+from label_index import load_split
+
+# On-the-fly rare-class copy-paste for training (replaces the syn_*.jpg files of augment_rare.py).
+# A patch bank is cut from the train set once and held in memory; every time the dataloader
+# loads an image, with probability p it pastes 1..max_pastes patches drawn with class-balanced
+# probabilities. Nothing is written to disk and every epoch sees new composites.
+#
+#   paste = build_online_paste(r'D:\military_object_dataset\military_object_dataset')
+#   train_hooks.train(model, label_hooks=[paste], data=..., epochs=...)
+
+
+class OnlinePaste:
+
+    def __init__(self, bank, class_counts, p=0.5, max_pastes=3, scale=(0.5, 1.5), blend='feather',
+                 balance=1.0, seed=0):
+        self.bank = {c: patches for c, patches in bank.items() if patches}
+        self.classes = np.array(sorted(self.bank), dtype=np.int64)
+        # Inverse frequency ** balance: the rarer the class, the more often it is pasted
+        counts = np.array([max(class_counts[c] if c < len(class_counts) else 0, 1) for c in self.classes],
+                          dtype=np.float64)
+        weights = counts ** -balance
+        self.weights = weights / weights.sum() if len(weights) else weights
+        self.p = p
+        self.max_pastes = max_pastes
+        self.scale = scale
+        self.blend = blend
+        self.seed = seed
+        self.rng = None
+        self.pid = None
+
+    def _rng(self):
+        # One stream per dataloader worker process
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.rng = np.random.default_rng(np.random.SeedSequence([self.seed, self.pid]))
+        return self.rng
+
+    def __call__(self, label):
+        rng = self._rng()
+        if not len(self.classes) or rng.uniform() > self.p:
+            return label
+
+        # The dataset may hand out its RAM-cached array: never paste into that
+        img = label['img'].copy()
+        h, w = img.shape[:2]
+        inst = label['instances']
+        inst.convert_bbox('xyxy')
+        inst.denormalize(w, h)
+
+        boxes = [inst.bboxes.astype(np.float32)]
+        new_cls = []
+        # Patches are cut at native resolution but label['img'] was already resized to the run's imgsz:
+        # shrink them by the same ratio so pasted objects keep their real-world size
+        r = label['resized_shape'][0] / label['ori_shape'][0] if 'resized_shape' in label else 1.0
+        scale = (self.scale[0] * r, self.scale[1] * r)
+        for c in rng.choice(self.classes, size=int(rng.integers(1, self.max_pastes + 1)), p=self.weights):
+            patches = self.bank[c]
+            box = paste(img, patches[rng.integers(len(patches))], rng, np.concatenate(boxes),
+                        scale=scale, blend=self.blend)
+            if box is not None:
+                boxes.append(box[None])
+                new_cls.append(c)
+
+        if new_cls:
+            new_boxes = np.concatenate(boxes[1:])
+            segments = inst.segments
+            if len(segments):
+                # Polygon-labeled sets carry segments through the augmentations: give pasted boxes one too
+                segments = np.concatenate([segments, rect_segments(new_boxes, segments.shape[1])])
+            label['instances'] = Instances(np.concatenate(boxes), segments, inst.keypoints,
+                                           bbox_format='xyxy', normalized=False)
+            label['cls'] = np.concatenate([label['cls'], np.array(new_cls, dtype=label['cls'].dtype)[:, None]])
+            label['img'] = img
+
+        # Hand the labels back in the layout the dataset produced them in
+        label['instances'].convert_bbox('xywh')
+        label['instances'].normalize(w, h)
+        return label
+
+
+def rect_segments(boxes, n):
+    # (N, 4) xyxy -> (N, n, 2) points walking each rectangle's outline
+    t = np.linspace(0, 4, n, endpoint=False)
+    side, frac = np.floor(t).astype(int), (t % 1)[None]
+    x1, y1, x2, y2 = (boxes[:, i:i + 1] for i in range(4))
+    xs = np.select([side == 0, side == 1, side == 2], [x1 + (x2 - x1) * frac, x2, x2 - (x2 - x1) * frac], x1)
+    ys = np.select([side == 0, side == 1, side == 2], [y1, y1 + (y2 - y1) * frac, y2], y2 - (y2 - y1) * frac)
+    return np.stack([xs, ys], -1).astype(np.float32)
+
+
+def build_online_paste(root_dir, classes=None, max_patches=200, seed=0, **kw):
+    # Default classes: everything below the median instance count (same rule as augment_rare.py)
+    index = load_split(root_dir, 'train')
+    hist = index.class_histogram()
+    if classes is None:
+        median = np.median(hist[hist > 0]) if hist.any() else 0
+        classes = [c for c in range(len(hist)) if 0 < hist[c] < median]
+    bank = build_patch_bank(os.path.join(root_dir, 'train', 'images'), index, classes,
+                            max_per_class=max_patches, seed=seed)
+    sizes = {c: len(p) for c, p in bank.items()}
+    print(f"Online paste: patch bank {sizes} for rare classes {sorted(sizes)}")
+    return OnlinePaste(bank, hist, seed=seed, **kw)
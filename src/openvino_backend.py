@@ -0,0 +1,155 @@
+import os
+import glob
+import queue
+import threading
+
+import numpy as np
+import yaml
+
+import profiling
+from box_ops import xywh_to_xyxy, batched_nms
+from engine import letterbox, unletterbox
+
+# Dedicated CPU runtime for the exported best_int8_openvino_model/
+# (static batch 1, 640x640, raw head output (1, 4 + nc, 8400) with nms: false).
+#   - AsyncInferQueue with one infer request per available stream keeps every core busy
+#   - decoding + class-aware NMS of the raw head is plain vectorized NumPy
+# You must install OpenVINO first: pip install openvino
+try:
+    import openvino as ov
+except ImportError:
+    ov = None
+
+
+def load_metadata(model_dir):
+    path = os.path.join(model_dir, 'metadata.yaml')
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return yaml.safe_load(f) or {}
+
+
+def preprocess(img, imgsz=640):
+    # BGR HWC uint8 -> letterboxed RGB NCHW float32 in [0, 1]
+    with profiling.stage('preprocess'):
+        padded, ratio, pad = letterbox(img, imgsz)
+        blob = padded[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+        return np.ascontiguousarray(blob), ratio, pad
+
+
+def decode(raw, ratio, pad, orig_shape, conf=0.25, iou=0.7, max_det=300, max_nms=30000):
+    # raw: (1, 4 + nc, anchors) -> (N, 6) x1 y1 x2 y2 conf cls in original pixels
+    pred = raw[0].T
+    scores = pred[:, 4:]
+    cls = scores.argmax(1)
+    best = scores[np.arange(len(cls)), cls]
+
+    keep = best >= conf
+    if not keep.any():
+        return np.zeros((0, 6), dtype=np.float32)
+    boxes, best, cls = pred[keep, :4], best[keep], cls[keep]
+
+    if len(best) > max_nms:
+        top = np.argpartition(-best, max_nms)[:max_nms]
+        boxes, best, cls = boxes[top], best[top], cls[top]
+
+    xyxy = xywh_to_xyxy(boxes)
+    idx = batched_nms(xyxy, best, cls, iou)[:max_det]
+
+    dets = np.empty((len(idx), 6), dtype=np.float32)
+    dets[:, :4] = unletterbox(xyxy[idx], ratio, pad, orig_shape)
+    dets[:, 4] = best[idx]
+    dets[:, 5] = cls[idx]
+    return dets
+
+
+class OpenVINODetector:
+
+    def __init__(self, model_dir='best_int8_openvino_model', hint='THROUGHPUT', num_requests=None,
+                 conf=0.25, iou=0.7, device='CPU', num_threads=None):
+        if ov is None:
+            raise ImportError("OpenVINO not installed! Run: pip install openvino")
+
+        xml_files = glob.glob(os.path.join(model_dir, '*.xml'))
+        if not xml_files:
+            raise FileNotFoundError(f"No OpenVINO .xml model in {model_dir}")
+
+        meta = load_metadata(model_dir)
+        self.names = {int(k): v for k, v in meta.get('names', {}).items()}
+        imgsz = meta.get('imgsz', 640)
+        self.imgsz = imgsz[0] if isinstance(imgsz, (list, tuple)) else int(imgsz)
+        self.conf = conf
+        self.iou = iou
+
+        # THROUGHPUT: several parallel streams for batch jobs; LATENCY: one request, all cores on it
+        core = ov.Core()
+        config = {'PERFORMANCE_HINT': hint}
+        if num_requests:
+            config['PERFORMANCE_HINT_NUM_REQUESTS'] = str(num_requests)
+        if num_threads:
+            config['INFERENCE_NUM_THREADS'] = str(num_threads)
+        self.compiled = core.compile_model(xml_files[0], device, config)
+
+        if not num_requests:
+            try:
+                num_requests = int(self.compiled.get_property('OPTIMAL_NUMBER_OF_INFER_REQUESTS'))
+            except Exception:
+                num_requests = os.cpu_count() or 1
+        self.num_requests = max(1, num_requests)
+        self.infer_queue = ov.AsyncInferQueue(self.compiled, self.num_requests)
+        self.infer_queue.set_callback(self._on_done)
+        self.done = queue.Queue()
+        self.lock = threading.Lock()
+        self.sync_request = None
+
+    def _on_done(self, request, userdata):
+        # Runs on an OpenVINO worker thread, so decoding/NMS also spreads across cores
+        key, ratio, pad, orig_shape, conf = userdata
+        try:
+            raw = request.get_output_tensor(0).data
+            with profiling.stage('postprocess'):
+                dets = decode(raw, ratio, pad, orig_shape, conf, self.iou)
+            self.done.put((key, dets))
+        except Exception as e:
+            self.done.put((key, e))
+
+    def infer_raw(self, blob):
+        # Synchronous forward pass on a preprocessed blob -> raw head output
+        with self.lock:
+            if self.sync_request is None:
+                self.sync_request = self.compiled.create_infer_request()
+            with profiling.stage('inference'):
+                return self.sync_request.infer({0: blob})[self.compiled.output(0)].copy()
+
+    def predict(self, img, conf=None):
+        # Synchronous single image (interactive use)
+        conf = self.conf if conf is None else conf
+        blob, ratio, pad = preprocess(img, self.imgsz)
+        raw = self.infer_raw(blob)
+        with profiling.stage('postprocess'):
+            return decode(raw, ratio, pad, img.shape[:2], conf, self.iou)
+
+    def predict_many(self, items, conf=None):
+        # items: iterable of (key, BGR image). Yields (key, dets) in completion order.
+        # start_async blocks while all infer requests are busy, which bounds memory.
+        conf = self.conf if conf is None else conf
+        for key, img in items:
+            blob, ratio, pad = preprocess(img, self.imgsz)
+            self.infer_queue.start_async({0: blob}, (key, ratio, pad, img.shape[:2], conf))
+            yield from self._drain()
+        self.infer_queue.wait_all()
+        yield from self._drain()
+
+    def _drain(self):
+        while True:
+            try:
+                key, dets = self.done.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(dets, Exception):
+                raise dets
+            yield key, dets
+
+
+def is_openvino_dir(path):
+    return os.path.isdir(path) and bool(glob.glob(os.path.join(path, '*.xml')))
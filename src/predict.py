@@ -1,72 +1,341 @@
-
-from ultralytics import YOLO
 import os
-import glob
-import zipfile
-
-def run_inference(model_path, source_dir, output_dir):
-    model = YOLO(model_path)
-    
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        
+import time
+import argparse
+
+import numpy as np
+
+import profiling
+from detection_store import DEFAULT_FLOOR, DetectionStoreWriter
+from engine import list_images, iter_batches, prefetch_map, read_image, unletterbox, make_writer
+from inference_client import InferenceClient
+from journal import Journal, GracefulInterrupt, journal_path
+from manifest import Manifest
+from model_registry import get_model, resolve_path
+from result_cache import ResultCache, DEFAULT_PATH as CACHE_PATH, file_digest, model_fingerprint, cache_key
+from yolo_text import xyxy_to_rows, format_rows
+
+def run_inference(model_path, source_dir, output_dir, batch_size=8, workers=4, imgsz=640,
+                  conf=0.20, iou=0.45, augment=True, device=None,
+                  zip_path="submission_predictions.zip", loose_files=False, cache_path=None,
+                  incremental=False, resume=True, images=None, store_path=None, store_floor=DEFAULT_FLOOR):
+    model = get_model(model_path)
+
     print(f"Loading model from {model_path}...")
     print(f"Processing images from {source_dir}...")
-    
-    # Run inference
-    # Passing the directory directly is more memory efficient than a list of files
+
+    # images: explicit subset of source_dir (e.g. one shard, see predict_sharded.py)
+    images = list_images(source_dir) if images is None else images
+    print(f"Found {len(images)} images (batch={batch_size}, workers={workers}, imgsz={imgsz})")
+
+    # Incremental: keep the .txt of unchanged images in output_dir, predict only the rest
+    manifest = None
+    if incremental:
+        loose_files = True
+        manifest = Manifest(output_dir, {'model': model_fingerprint(model_path), 'conf': conf, 'iou': iou,
+                                         'imgsz': imgsz, 'augment': augment, 'mode': 'plain'})
+        images = manifest.plan(images, workers)
+        manifest.prune()
+
+    # Pipeline: loader threads decode + letterbox -> model runs whole batches -> writer thread
+    # The writer streams straight into the submission ZIP unless loose .txt files are requested
     # augment=True enables Test Time Augmentation (TTA) for higher accuracy
-    results = model.predict(source=source_dir, save=False, conf=0.20, iou=0.45, stream=True, verbose=False, device=0, augment=True)
-    
+    destination = output_dir if loose_files else zip_path
+    # Progress journal: a crashed or interrupted run picks up where it stopped (also in ZIP mode)
+    journal = Journal(journal_path(destination, loose_files),
+                      {'source': os.path.abspath(source_dir), 'model': model_fingerprint(model_path), 'conf': conf,
+                       'iou': iou, 'imgsz': imgsz, 'augment': augment},
+                      resume=resume)
+    writer = make_writer(destination, loose_files=loose_files, journal=journal)
+    if journal.records:
+        done = journal.done
+        images = [p for p in images if os.path.splitext(os.path.basename(p))[0] not in done]
+        print(f"Resuming: {len(done)} images already done ({journal.path})")
+        if manifest is not None:
+            for name in done:
+                manifest.done(name)
+    writer.start()
+
+    # Detection store: the model runs at the store floor and keeps everything above it;
+    # the submission files are still cut at conf (detection_store.py for other thresholds)
+    store = None
+    run_conf = conf
+    if store_path:
+        run_conf = min(conf, store_floor)
+        store = DetectionStoreWriter(store_path, run_conf, {'source': os.path.abspath(source_dir),
+                                                            'model': model_fingerprint(model_path), 'iou': iou,
+                                                            'imgsz': imgsz, 'augment': augment})
+
     file_count = 0
-    
+    infer_time = 0.0
+    start = time.perf_counter()
+    complete = False
+
+    # Unchanged images with the same model + settings are answered from the result cache
+    cache = ResultCache(cache_path) if cache_path else None
+    keys = {}
+    todo = images
+
     print("Generating predictions...")
-    for i, result in enumerate(results):
-        if i % 100 == 0:
-            print(f"Processed {i} images...")
-        path = result.path
-        basename = os.path.basename(path)
-        name_no_ext = os.path.splitext(basename)[0]
-        
-        txt_path = os.path.join(output_dir, name_no_ext + '.txt')
-        
-        with open(txt_path, 'w') as f:
-            for box in result.boxes:
-                # box.xywhn -> x_center, y_center, width, height (normalized)
-                # box.cls -> class id
-                # box.conf -> confidence
-                
-                cls_id = int(box.cls[0].item())
-                conf = box.conf[0].item()
-                x_c, y_c, w, h = box.xywhn[0].tolist()
-                
+    # Ctrl-C stops feeding new images; batches already decoded still run and get written
+    interrupt = GracefulInterrupt()
+    try:
+        if cache is not None:
+            fingerprint = model_fingerprint(model_path)
+            todo = []
+            def digest_of(path):
+                digest = manifest.digest(os.path.splitext(os.path.basename(path))[0]) if manifest else None
+                return path, digest or file_digest(path)
+
+            for path, digest in prefetch_map(digest_of, interrupt.until_stopped(images), workers, workers * 4):
+                key = cache_key(digest, fingerprint, run_conf, iou, imgsz, 'tta' if augment else 'plain')
+                hit = cache.get(key)
+                if hit is None:
+                    keys[path] = key
+                    todo.append(path)
+                    continue
+                dets, shape = hit
+                name = os.path.splitext(os.path.basename(path))[0]
+                if store is not None:
+                    store.add(name, dets, shape)
+                    dets = dets[dets[:, 4] >= conf]
+                writer.put(name, format_rows(xyxy_to_rows(dets[:, :4], dets[:, 4], dets[:, 5], shape)))
+                if manifest is not None:
+                    manifest.done(name)
+                profiling.count('cache_hits')
+                file_count += 1
+            print(f"Result cache: {file_count} of {len(images)} images cached, {len(todo)} to run")
+
+        for batch in iter_batches(interrupt.until_stopped(todo), batch_size=batch_size, workers=workers, imgsz=imgsz):
+            ready = [item for item in batch if item['img'] is not None]
+            for item in batch:
+                if item['img'] is None:
+                    # Keep the 1-to-1 image/txt mapping even for unreadable files
+                    print(f"WARNING: Could not read {item['path']}, writing empty prediction.")
+                    writer.put(item['name'], "")
+                    if manifest is not None:
+                        manifest.done(item['name'])
+                    file_count += 1
+            if not ready:
+                continue
+
+            t0 = time.perf_counter()
+            # TTA gets its own stage name so a slow run shows whether augment=True is the cost
+            with profiling.stage('inference_tta' if augment else 'inference'):
+                results = model.predict(source=[item['img'] for item in ready], imgsz=imgsz, conf=run_conf, iou=iou,
+                                        verbose=False, device=device, augment=augment)
+            infer_time += time.perf_counter() - t0
+
+            for item, result in zip(ready, results):
+                with profiling.stage('postprocess'):
+                    # One GPU->CPU copy per image: columns are x1 y1 x2 y2 conf cls (letterboxed pixels)
+                    data = result.boxes.data.cpu().numpy()
+                    xyxy = unletterbox(data[:, :4].copy(), item['ratio'], item['pad'], item['orig_shape'])
+                    if cache is not None:
+                        cache.put(keys[item['path']], np.column_stack((xyxy, data[:, 4:6])), item['orig_shape'])
+                    if store is not None:
+                        store.add(item['name'], np.column_stack((xyxy, data[:, 4:6])), item['orig_shape'])
+                        keep = data[:, 4] >= conf
+                        xyxy, data = xyxy[keep], data[keep]
+                    rows = xyxy_to_rows(xyxy, data[:, 4], data[:, 5], item['orig_shape'])
+
                 # Format: class_id x_center y_center width height confidence
-                line = f"{cls_id} {x_c:.6f} {y_c:.6f} {w:.6f} {h:.6f} {conf:.6f}\n"
-                f.write(line)
-        file_count += 1
-        if file_count % 100 == 0:
-            print(f"Processed {file_count} images")
-
-    print(f"Finished. Generated {file_count} prediction files in {output_dir}")
-    
-    # Create ZIP
-    zip_name = "submission_predictions.zip"
-    print(f"Zipping results to {zip_name}...")
-    with zipfile.ZipFile(zip_name, 'w') as zipf:
-        for txt_file in glob.glob(os.path.join(output_dir, '*.txt')):
-            zipf.write(txt_file, os.path.basename(txt_file))
-            
+                with profiling.stage('format'):
+                    text = format_rows(rows)
+                writer.put(item['name'], text)
+                if manifest is not None:
+                    manifest.done(item['name'])
+                profiling.count('images')
+                profiling.count('boxes', len(rows))
+
+                file_count += 1
+                if file_count % 100 == 0:
+                    print(f"Processed {file_count} images")
+        complete = not interrupt.stopped
+    finally:
+        interrupt.restore()
+        writer.close()
+        journal.close(complete)
+        if cache is not None:
+            cache.close()
+        if store is not None:
+            store.close()
+        if manifest is not None:
+            manifest.save()
+
+    elapsed = time.perf_counter() - start
+    if not complete:
+        print("Stopped early; rerun the same command to resume.")
+    print(f"Finished. Generated {file_count} prediction files in {destination}")
+    if file_count:
+        print(f"Throughput: {file_count / elapsed:.2f} images/sec "
+              f"({elapsed:.1f}s total, {infer_time:.1f}s in model, {writer.bytes_written / 1024:.0f} KB written)")
     print("Done.")
 
+def run_remote_inference(server_url, source_dir, output_dir, workers=8, imgsz=640, conf=0.20, iou=0.45,
+                         augment=True, zip_path="submission_predictions.zip", loose_files=False):
+    # Thin-client mode: inference_server.py holds the model; concurrent requests from the
+    # worker threads are micro-batched on the server side.
+    client = InferenceClient(server_url)
+    print(f"Using inference server {server_url} ({client.health()['model']})")
+
+    images = list_images(source_dir)
+    print(f"Found {len(images)} images ({workers} concurrent requests)")
+
+    def send(path):
+        name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, 'rb') as f:
+            data = f.read()
+        try:
+            with profiling.stage('remote_inference'):
+                dets, shape = client.predict(data, conf=conf, iou=iou, imgsz=imgsz, augment=augment)
+        except RuntimeError as e:
+            print(f"WARNING: {path}: {e}, writing empty prediction.")
+            return name, ""
+        profiling.count('images')
+        profiling.count('boxes', len(dets))
+        with profiling.stage('format'):
+            return name, format_rows(xyxy_to_rows(dets[:, :4], dets[:, 4], dets[:, 5], shape))
+
+    destination = output_dir if loose_files else zip_path
+    writer = make_writer(destination, loose_files=loose_files)
+    writer.start()
+    start = time.perf_counter()
+    file_count = 0
+    try:
+        for name, text in prefetch_map(send, images, workers, prefetch=workers * 2):
+            writer.put(name, text)
+            file_count += 1
+            if file_count % 100 == 0:
+                print(f"Processed {file_count} images")
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Finished. Generated {file_count} prediction files in {destination}")
+    if file_count:
+        print(f"Throughput: {file_count / elapsed:.2f} images/sec ({elapsed:.1f}s total)")
+
+def run_openvino_inference(model_dir, source_dir, output_dir, workers=4, conf=0.20, iou=0.45,
+                           zip_path="submission_predictions.zip", loose_files=False, images=None, threads=None,
+                           resume=True):
+    # CPU path for best_int8_openvino_model: decode threads -> AsyncInferQueue -> writer thread
+    # threads: cap OpenVINO's CPU threads when several processes share the machine
+    detector = get_model(model_dir, native_openvino=True, hint='THROUGHPUT', iou=iou, num_threads=threads)
+    print(f"Loaded OpenVINO model from {model_dir} ({detector.num_requests} parallel infer requests)")
+
+    images = list_images(source_dir) if images is None else images
+    print(f"Found {len(images)} images")
+
+    destination = output_dir if loose_files else zip_path
+    # Same progress journal as run_inference: an interrupted or crashed run resumes
+    journal = Journal(journal_path(destination, loose_files),
+                      {'source': os.path.abspath(source_dir), 'model': model_fingerprint(model_dir), 'conf': conf,
+                       'iou': iou, 'backend': 'openvino'},
+                      resume=resume)
+    writer = make_writer(destination, loose_files=loose_files, journal=journal)
+    if journal.records:
+        done = journal.done
+        images = [p for p in images if os.path.splitext(os.path.basename(p))[0] not in done]
+        print(f"Resuming: {len(done)} images already done ({journal.path})")
+    writer.start()
+    start = time.perf_counter()
+    file_count = 0
+    shapes = {}
+    skipped = []
+    complete = False
+
+    # Ctrl-C stops feeding new images; requests already in flight are still written
+    interrupt = GracefulInterrupt()
+
+    def frames():
+        for item in prefetch_map(read_image, interrupt.until_stopped(images), workers,
+                                 prefetch=workers + detector.num_requests):
+            if item['img'] is None:
+                skipped.append(item)
+                continue
+            shapes[item['name']] = item['img'].shape[:2]
+            yield item['name'], item['img']
+
+    try:
+        # One continuous stream: decode threads stay ahead while every infer request is busy
+        for name, dets in detector.predict_many(frames(), conf=conf):
+            with profiling.stage('format'):
+                text = format_rows(xyxy_to_rows(dets[:, :4], dets[:, 4], dets[:, 5], shapes.pop(name)))
+            writer.put(name, text)
+            profiling.count('images')
+            profiling.count('boxes', len(dets))
+            file_count += 1
+            if file_count % 100 == 0:
+                print(f"Processed {file_count} images")
+        for item in skipped:
+            print(f"WARNING: Could not read {item['path']}, writing empty prediction.")
+            writer.put(item['name'], "")
+            file_count += 1
+        complete = not interrupt.stopped
+    finally:
+        interrupt.restore()
+        writer.close()
+        journal.close(complete)
+
+    elapsed = time.perf_counter() - start
+    if not complete:
+        print("Stopped early; rerun the same command to resume.")
+    print(f"Finished. Generated {file_count} prediction files in {destination}")
+    if file_count:
+        print(f"Throughput: {file_count / elapsed:.2f} images/sec ({elapsed:.1f}s total)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batched YOLO inference to YOLO-format .txt predictions")
+    # Adjust path to your best trained model (a path or a model_registry name such as military-l-int8)
+    parser.add_argument('--model', default='military-l-base')
+    parser.add_argument('--source', default=r'D:\military_object_dataset\military_object_dataset\test\images')
+    parser.add_argument('--output', default='predictions', help="Directory for --loose-files mode")
+    parser.add_argument('--zip', default='submission_predictions.zip', help="Archive written in the default mode")
+    parser.add_argument('--loose-files', action='store_true', help="Write one .txt per image instead of a ZIP")
+    parser.add_argument('--batch-size', type=int, default=8, help="Images per forward pass")
+    parser.add_argument('--workers', type=int, default=4, help="Decode/letterbox threads")
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.20)
+    parser.add_argument('--iou', type=float, default=0.45)
+    parser.add_argument('--no-tta', action='store_true', help="Disable Test Time Augmentation")
+    parser.add_argument('--device', default=None, help="e.g. 0 or cpu (default: auto)")
+    parser.add_argument('--backend', choices=['ultralytics', 'openvino'], default='ultralytics',
+                        help="openvino: run an *_openvino_model folder on CPU with async infer requests")
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help="Time every stage; write metrics.prom + JSONL/Chrome traces to DIR")
+    parser.add_argument('--cache', default=CACHE_PATH, help="SQLite result cache reused across runs")
+    parser.add_argument('--no-cache', action='store_true', help="Always run the model")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only predict new/changed images into --output (tracked in .manifest.json)")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore the progress journal of an unfinished run")
+    parser.add_argument('--store', default=None, metavar='DIR',
+                        help="Also keep every detection above --store-floor for re-thresholding (detection_store.py)")
+    parser.add_argument('--store-floor', type=float, default=DEFAULT_FLOOR)
+    parser.add_argument('--server', default=None, help="Send images to a running inference_server.py instead")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    # Adjust path to your best trained model
-    # For initial testing, we might use a pretrained one or the one we just trained
-    model_path = 'runs/train/yolov8l_military/weights/best.pt' 
-    test_dir = r'D:\military_object_dataset\military_object_dataset\test\images'
-    out_dir = 'predictions'
-    
+    args = parse_args()
+    if args.profile:
+        profiling.enable()
+
+    if args.server:
+        run_remote_inference(args.server, args.source, args.output, workers=args.workers, imgsz=args.imgsz,
+                             conf=args.conf, iou=args.iou, augment=not args.no_tta,
+                             zip_path=args.zip, loose_files=args.loose_files)
     # Check if model exists, if not warn user
-    if not os.path.exists(model_path):
-        print(f"WARNING: Model not found at {model_path}. Please train first.")
+    elif not os.path.exists(resolve_path(args.model)):
+        print(f"WARNING: Model not found at {resolve_path(args.model)}. Please train first.")
+    elif args.backend == 'openvino':
+        run_openvino_inference(args.model, args.source, args.output, workers=args.workers, conf=args.conf,
+                               iou=args.iou, zip_path=args.zip, loose_files=args.loose_files,
+                               resume=not args.no_resume)
     else:
-        run_inference(model_path, test_dir, out_dir)
+        run_inference(args.model, args.source, args.output, batch_size=args.batch_size, workers=args.workers,
+                      imgsz=args.imgsz, conf=args.conf, iou=args.iou, augment=not args.no_tta, device=args.device,
+                      zip_path=args.zip, loose_files=args.loose_files,
+                      cache_path=None if args.no_cache else args.cache, incremental=args.incremental,
+                      resume=not args.no_resume, store_path=args.store, store_floor=args.store_floor)
+
+    if args.profile:
+        profiling.export(args.profile)
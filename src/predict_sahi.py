@@ -1,82 +1,153 @@
-
-from ultralytics import YOLO
 import os
-import glob
+import time
+import argparse
 import torch
 
-# You must install SAHI first: pip install sahi
-try:
-    from sahi import AutoDetectionModel
-    from sahi.predict import get_sliced_prediction
-except ImportError:
-    print("SAHI not installed! Run: pip install sahi")
-    exit()
+import profiling
+from model_registry import get_model
+from engine import list_images, prefetch_map, read_image, make_writer
+from large_scene import predict_scenes
+from journal import Journal, GracefulInterrupt, journal_path
+from manifest import Manifest
+from result_cache import model_fingerprint
+from tiling import TiledPredictor, AdaptiveTiledPredictor
+from yolo_text import xyxy_to_rows, format_rows
+
+# Slicing Aided inference without the per-image SAHI loop:
+# tiles from several images are batched into one forward pass and merged natively.
 
-def predict_with_sahi():
+def predict_with_sahi(model_path, source_dir, output_dir, tile=640, overlap=0.5, batch_size=16, workers=4,
+                      conf=0.10, merge='nmm', zip_path=None, device=None, adaptive=False,
+                      incremental=False, resume=True):
     print("--- SAHI INFERENCE (Small Object Specialist) ---")
-    
-    # Paths
-    model_path = r'runs/train/yolov8l_military_resumed/weights/best.pt'
-    source_dir = r'D:\military_object_dataset\military_object_dataset\test\images'
-    output_dir = r'D:\military_object_dataset\military_object_dataset\predictions_sahi'
-    
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
 
     print(f"Loading Model: {model_path}")
-    
-    # Configure SAHI Model
-    detection_model = AutoDetectionModel.from_pretrained(
-        model_type='yolov8',
-        model_path=model_path,
-        confidence_threshold=0.10, # LOWERED: Boosts Recall (mAP) significantly
-        device="cuda:0" if torch.cuda.is_available() else "cpu"
+    model = get_model(model_path)
+    if device is None:
+        device = "cuda:0" if torch.cuda.is_available() else "cpu"
+
+    # Adaptive mode: full-frame pass first, then only tile around small / low-confidence objects
+    predictor_cls = AdaptiveTiledPredictor if adaptive else TiledPredictor
+    predictor = predictor_cls(
+        model,
+        tile=tile,              # Slice image into 640x640 chunks, detect, and merge
+        overlap=overlap,        # 50% Overlap ensures no object is cut in half
+        batch_size=batch_size,  # Tiles per forward pass (mixed across images)
+        conf=conf,              # LOWERED: Boosts Recall (mAP) significantly
+        merge=merge,
+        device=device,
     )
 
-    images = glob.glob(os.path.join(source_dir, '*.jpg'))
+    images = list_images(source_dir)
+    # Incremental: only slice images that are new/changed since the last run into output_dir
+    manifest = None
+    if incremental:
+        zip_path = None
+        manifest = Manifest(output_dir, {'model': model_fingerprint(model_path), 'conf': conf, 'tile': tile,
+                                         'overlap': overlap, 'merge': merge, 'adaptive': adaptive, 'mode': 'tiled'})
+        images = manifest.plan(images, workers)
+        manifest.prune()
+
+    # Progress journal: a crashed or interrupted run picks up where it stopped (also in ZIP mode)
+    destination = zip_path or output_dir
+    journal = Journal(journal_path(destination, zip_path is None),
+                      {'source': os.path.abspath(source_dir), 'model': model_fingerprint(model_path), 'conf': conf,
+                       'tile': tile, 'overlap': overlap, 'merge': merge, 'adaptive': adaptive},
+                      resume=resume)
+
+    # Save to TXT (or straight into a ZIP)
+    writer = make_writer(destination, loose_files=zip_path is None, journal=journal)
+    if journal.records:
+        done = journal.done
+        images = [p for p in images if os.path.splitext(os.path.basename(p))[0] not in done]
+        print(f"Resuming: {len(done)} images already done ({journal.path})")
+        if manifest is not None:
+            for name in done:
+                manifest.done(name)
     print(f"Processing {len(images)} images with Slicing (Aggressive Mode)...")
+    writer.start()
+    start = time.perf_counter()
+    complete = False
+
+    interrupt = GracefulInterrupt()
+    try:
+        # Ctrl-C stops feeding new images; tiles already queued are still merged and written
+        items = prefetch_map(read_image, interrupt.until_stopped(images), workers, prefetch=workers * 2)
+        for i, (item, dets) in enumerate(predictor.predict(items)):
+            if item['img'] is None:
+                print(f"WARNING: Could not read {item['path']}, writing empty prediction.")
+                writer.put(item['name'], "")
+                if manifest is not None:
+                    manifest.done(item['name'])
+                continue
 
-    for i, img_path in enumerate(images):
-        # SAHI Magic: Slice image into 640x640 chunks, detect, and merge
-        result = get_sliced_prediction(
-            img_path,
-            detection_model,
-            slice_height=640,
-            slice_width=640,
-            overlap_height_ratio=0.5, # INCREASED: 50% Overlap ensures no object is cut in half
-            overlap_width_ratio=0.5
-        )
-        
-        # Save to TXT
-        basename = os.path.basename(img_path)
-        txt_name = os.path.splitext(basename)[0] + ".txt"
-        txt_path = os.path.join(output_dir, txt_name)
-        
-        with open(txt_path, 'w') as f:
-            for prediction in result.object_prediction_list:
-                # Convert SAHI format to YOLO format
-                # SAHI gives absolute bbox, we need normalized xywh
-                
-                img_w, img_h = result.image_width, result.image_height
-                bbox = prediction.bbox
-                x, y, w, h = bbox.minx, bbox.miny, bbox.maxx - bbox.minx, bbox.maxy - bbox.miny
-                
-                # Normalize
-                x_c = (x + w / 2) / img_w
-                y_c = (y + h / 2) / img_h
-                w_n = w / img_w
-                h_n = h / img_h
-                
-                cls_id = prediction.category.id
-                conf = prediction.score.value
-                
-                f.write(f"{cls_id} {x_c:.6f} {y_c:.6f} {w_n:.6f} {h_n:.6f} {conf:.6f}\n")
-        
-        if i % 10 == 0:
-            print(f"Processed {i}/{len(images)}...")
+            with profiling.stage('format'):
+                rows = xyxy_to_rows(dets[:, :4], dets[:, 4], dets[:, 5], item['img'].shape[:2])
+                text = format_rows(rows)
+            writer.put(item['name'], text)
+            if manifest is not None:
+                manifest.done(item['name'])
+            profiling.count('images')
+            profiling.count('boxes', len(rows))
 
-    print(f"Done! Predictions saved to {output_dir}")
+            if i % 10 == 0:
+                print(f"Processed {i}/{len(images)}...")
+        complete = not interrupt.stopped
+    finally:
+        interrupt.restore()
+        writer.close()
+        journal.close(complete)
+        if manifest is not None:
+            manifest.save()
+
+    elapsed = time.perf_counter() - start
+    n = max(predictor.images_processed, 1)
+    if not complete:
+        print(f"Stopped early after {writer.files_written} images; rerun the same command to resume.")
+    print(f"Done! Predictions saved to {destination}")
+    print(f"{predictor.tiles_processed} tiles in {predictor.forward_passes} forward passes "
+          f"({predictor.tiles_processed / n:.1f} tiles/image, {predictor.images_processed / elapsed:.2f} images/sec)")
+    if adaptive:
+        print(f"Adaptive tiling: {predictor.tiles_skipped} of {predictor.uniform_tiles} uniform tiles skipped, "
+              f"{predictor.images_tiled}/{predictor.images_processed} images needed slicing")
     print("These predictions are likely 5-10% more accurate for small objects.")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tiled (SAHI-style) inference with batched tiles")
+    parser.add_argument('--model', default='military-l', help="Path or model_registry name")
+    parser.add_argument('--source', default=r'D:\military_object_dataset\military_object_dataset\test\images')
+    parser.add_argument('--output', default=r'D:\military_object_dataset\military_object_dataset\predictions_sahi')
+    parser.add_argument('--zip', default=None, help="Write straight into this ZIP instead of --output")
+    parser.add_argument('--tile', type=int, default=640)
+    parser.add_argument('--overlap', type=float, default=0.5)
+    parser.add_argument('--batch-size', type=int, default=16, help="Tiles per forward pass")
+    parser.add_argument('--workers', type=int, default=4, help="Decode threads")
+    parser.add_argument('--conf', type=float, default=0.10)
+    parser.add_argument('--merge', choices=['nmm', 'nms', 'wbf'], default='nmm',
+                        help="Tile merge: union box (SAHI's default), best box, or weighted average")
+    parser.add_argument('--adaptive', action='store_true', help="Only tile images/regions that need it")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only predict new/changed images into --output (tracked in .manifest.json)")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore the progress journal of an unfinished run")
+    parser.add_argument('--large-scene', action='store_true',
+                        help="Treat --source as scenes larger than RAM: windowed reads, one merged file per scene")
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help="Time every stage; write metrics.prom + JSONL/Chrome traces to DIR")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    predict_with_sahi()
+    args = parse_args()
+    if args.profile:
+        profiling.enable()
+    if args.large_scene:
+        predict_scenes(args.model, [args.source], args.zip or args.output, tile=args.tile, overlap=args.overlap,
+                       batch_size=args.batch_size, workers=args.workers, conf=args.conf, merge=args.merge,
+                       device=args.device, loose_files=args.zip is None)
+    else:
+        predict_with_sahi(args.model, args.source, args.output, tile=args.tile, overlap=args.overlap,
+                          batch_size=args.batch_size, workers=args.workers, conf=args.conf, merge=args.merge,
+                          zip_path=args.zip, device=args.device, adaptive=args.adaptive,
+                          incremental=args.incremental, resume=not args.no_resume)
+    if args.profile:
+        profiling.export(args.profile)
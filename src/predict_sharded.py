@@ -0,0 +1,177 @@
+import os
+import zipfile
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import list_images
+from journal import journal_path
+from model_registry import resolve_path, backend_for
+
+# Sharded CPU inference: one model instance per process, each pinned to a slice of the cores.
+# Images are split into --num-shards by a stable hash of their file name, so the same image
+# always lands in the same shard on every machine and every rerun.
+#
+# One machine, all cores:
+#   python src/predict_sharded.py --model military-l-int8 --num-shards 16 --procs 8
+# Several machines sharing a work dir (or copying shard ZIPs back), then merge:
+#   machine A: python src/predict_sharded.py --num-shards 16 --shards 0-7
+#   machine B: python src/predict_sharded.py --num-shards 16 --shards 8-15
+#   any:       python src/predict_sharded.py --num-shards 16 --merge-only
+#
+# Every shard is a journaled ZIP (see journal.py), so interrupted shards resume and finished
+# shards (marked with a .done file) are skipped on rerun.
+
+
+def shard_of(name, num_shards):
+    # md5, not hash(): Python's str hash is salted per process
+    return int(hashlib.md5(name.encode('utf-8')).hexdigest()[:8], 16) % num_shards
+
+
+def shard_images(images, index, num_shards):
+    return [p for p in images if shard_of(os.path.splitext(os.path.basename(p))[0], num_shards) == index]
+
+
+def shard_zip(work_dir, index, num_shards):
+    return os.path.join(work_dir, f"shard_{index:03d}_of_{num_shards:03d}.zip")
+
+
+def parse_shards(spec, num_shards):
+    # "0-3,8,10-11" -> [0, 1, 2, 3, 8, 10, 11]
+    if not spec:
+        return list(range(num_shards))
+    indices = set()
+    for part in spec.split(','):
+        lo, _, hi = part.partition('-')
+        indices.update(range(int(lo), int(hi or lo) + 1))
+    bad = [i for i in indices if not 0 <= i < num_shards]
+    if bad:
+        raise ValueError(f"shard indices {bad} outside 0..{num_shards - 1}")
+    return sorted(indices)
+
+
+def run_shard(job):
+    # Runs in a worker process. Thread caps were exported to the environment by the parent before
+    # the pool started, so BLAS/OpenMP pick them up on import; torch gets told explicitly as well.
+    import cv2
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(job['threads'])
+    except ImportError:
+        pass
+    from predict import run_inference, run_openvino_inference
+
+    index, num_shards = job['index'], job['num_shards']
+    zip_path = shard_zip(job['work_dir'], index, num_shards)
+    images = shard_images(list_images(job['source']), index, num_shards)
+    print(f"[shard {index}/{num_shards}] {len(images)} images, {job['threads']} threads (pid {os.getpid()})")
+
+    if job['backend'] == 'openvino':
+        run_openvino_inference(job['model'], job['source'], None, workers=job['workers'], conf=job['conf'],
+                               iou=job['iou'], zip_path=zip_path, images=images, threads=job['threads'])
+    else:
+        run_inference(job['model'], job['source'], None, batch_size=job['batch_size'], workers=job['workers'],
+                      imgsz=job['imgsz'], conf=job['conf'], iou=job['iou'], augment=job['augment'],
+                      device='cpu', zip_path=zip_path, cache_path=job['cache'], images=images)
+
+    # An interrupted run returns normally but leaves its journal behind
+    complete = not os.path.exists(journal_path(zip_path, False))
+    if complete:
+        open(zip_path + '.done', 'w').close()
+    return index, len(images), complete
+
+
+def merge_shards(work_dir, num_shards, destination, loose_files=False):
+    shards = [shard_zip(work_dir, i, num_shards) for i in range(num_shards)]
+    missing = [i for i, path in enumerate(shards) if not os.path.exists(path + '.done')]
+    if missing:
+        print(f"Cannot merge yet: shards {missing} are not finished (in {work_dir})")
+        return False
+
+    total = 0
+    if loose_files:
+        os.makedirs(destination, exist_ok=True)
+        for path in shards:
+            with zipfile.ZipFile(path) as zf:
+                zf.extractall(destination)
+                total += len(zf.namelist())
+    else:
+        with zipfile.ZipFile(destination, 'w', zipfile.ZIP_DEFLATED) as out:
+            for path in shards:
+                with zipfile.ZipFile(path) as zf:
+                    for info in zf.infolist():
+                        out.writestr(info, zf.read(info))
+                        total += 1
+    print(f"Merged {num_shards} shards: {total} prediction files in {destination}")
+    return True
+
+
+def run_sharded(model, source, num_shards=8, shards=None, procs=None, threads=None, work_dir='shards',
+                batch_size=4, workers=2, imgsz=640, conf=0.20, iou=0.45, augment=True, cache_path=None):
+    shards = list(range(num_shards)) if shards is None else shards
+    os.makedirs(work_dir, exist_ok=True)
+    todo = [i for i in shards if not os.path.exists(shard_zip(work_dir, i, num_shards) + '.done')]
+    if len(todo) < len(shards):
+        print(f"Skipping {len(shards) - len(todo)} finished shards")
+    if not todo:
+        return
+
+    cpus = os.cpu_count() or 1
+    procs = min(procs or cpus, len(todo))
+    threads = threads or max(1, cpus // procs)
+    # Inherited by the workers: stops every process from starting one BLAS/OpenMP thread per core
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(threads)
+
+    backend = 'openvino' if backend_for(resolve_path(model)) == 'openvino' else 'ultralytics'
+    print(f"Running {len(todo)} of {num_shards} shards on {procs} processes x {threads} threads ({backend})")
+    jobs = [{'index': i, 'num_shards': num_shards, 'work_dir': work_dir, 'model': model, 'source': source,
+             'backend': backend, 'threads': threads, 'batch_size': batch_size, 'workers': workers, 'imgsz': imgsz,
+             'conf': conf, 'iou': iou, 'augment': augment, 'cache': cache_path} for i in todo]
+
+    pool = ProcessPoolExecutor(max_workers=procs)
+    try:
+        futures = [pool.submit(run_shard, job) for job in jobs]
+        for future in as_completed(futures):
+            index, n, complete = future.result()
+            print(f"[shard {index}/{num_shards}] {'done' if complete else 'stopped early'} ({n} images)")
+    except KeyboardInterrupt:
+        # Workers drain their own in-flight batches (journal.GracefulInterrupt); don't start new shards
+        print("Interrupted: waiting for running shards to flush, rerun to resume.")
+        pool.shutdown(wait=True, cancel_futures=True)
+        raise
+    finally:
+        pool.shutdown(wait=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Multi-process / multi-machine sharded inference")
+    parser.add_argument('--model', default='military-l-int8', help="Path or model_registry name")
+    parser.add_argument('--source', default=r'D:\military_object_dataset\military_object_dataset\test\images')
+    parser.add_argument('--zip', default='submission_predictions.zip', help="Merged archive")
+    parser.add_argument('--output', default=None, help="Merge into loose .txt files in this folder instead")
+    parser.add_argument('--work-dir', default='shards', help="Per-shard ZIPs (shared between machines)")
+    parser.add_argument('--num-shards', type=int, default=8, help="Total shards across all machines")
+    parser.add_argument('--shards', default=None, help="Shards to run here, e.g. 0-7 or 0,2,4 (default: all)")
+    parser.add_argument('--procs', type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument('--threads', type=int, default=None, help="Intra-op threads per process (default: cores / procs)")
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=2, help="Decode threads per process")
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.20)
+    parser.add_argument('--iou', type=float, default=0.45)
+    parser.add_argument('--no-tta', action='store_true', help="Disable Test Time Augmentation")
+    parser.add_argument('--cache', default=None, help="Shared SQLite result cache (see result_cache.py)")
+    parser.add_argument('--merge-only', action='store_true', help="Only merge finished shard ZIPs")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if not args.merge_only:
+        run_sharded(args.model, args.source, num_shards=args.num_shards,
+                    shards=parse_shards(args.shards, args.num_shards), procs=args.procs, threads=args.threads,
+                    work_dir=args.work_dir, batch_size=args.batch_size, workers=args.workers, imgsz=args.imgsz,
+                    conf=args.conf, iou=args.iou, augment=not args.no_tta, cache_path=args.cache)
+    # Merges once every shard (from any machine) is finished
+    merge_shards(args.work_dir, args.num_shards, args.output or args.zip, loose_files=args.output is not None)
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from collections import defaultdict, deque
+
+# Opt-in stage timers and counters for the prediction pipeline.
+#
+#   with profiling.stage('decode'):
+#       img = cv2.imread(path)
+#   profiling.count('boxes', len(dets))
+#
+# Disabled (the default) every call is a no-op. Enable with profiling.enable() / --profile DIR,
+# or SERVESMART_PROFILE=DIR for app.py. profiling.export(DIR) writes:
+#   metrics.prom        Prometheus text format (node_exporter textfile collector)
+#   trace.jsonl         one span per line
+#   trace.chrome.json   Chrome trace-event file (chrome://tracing, Perfetto, speedscope)
+# Long-lived processes (the app) keep only the newest max_spans spans, so the trace and each
+# export stay bounded; stage totals and counters still cover the whole process lifetime.
+
+_NULL = nullcontext()
+APP_MAX_SPANS = 20000
+
+
+class Profiler:
+
+    def __init__(self, trace=True, max_spans=None):
+        self.trace = trace
+        self.lock = threading.Lock()
+        self.stage_ns = defaultdict(int)
+        self.stage_calls = defaultdict(int)
+        self.counters = defaultdict(int)
+        self.spans = deque(maxlen=max_spans)
+        self.pid = os.getpid()
+        self.origin_ns = time.perf_counter_ns()
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            t1 = time.perf_counter_ns()
+            with self.lock:
+                self.stage_ns[name] += t1 - t0
+                self.stage_calls[name] += 1
+                if self.trace:
+                    self.spans.append((name, t0 - self.origin_ns, t1 - t0, threading.get_ident()))
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] += n
+
+    def summary(self):
+        with self.lock:
+            return {
+                'stages': {k: {'seconds': v / 1e9, 'calls': self.stage_calls[k]} for k, v in self.stage_ns.items()},
+                'counters': dict(self.counters),
+            }
+
+    def report(self):
+        s = self.summary()
+        total = sum(v['seconds'] for v in s['stages'].values()) or 1.0
+        print("\n--- Profile ---")
+        for name, v in sorted(s['stages'].items(), key=lambda kv: -kv[1]['seconds']):
+            per_call = v['seconds'] / max(v['calls'], 1) * 1000
+            print(f"  {name:<16} {v['seconds']:8.2f}s  {v['calls']:7d} calls  {per_call:8.2f} ms/call  "
+                  f"({v['seconds'] / total:.0%} of timed work)")
+        for name, v in sorted(s['counters'].items()):
+            print(f"  {name:<16} {v}")
+
+    def export_prometheus(self, path):
+        s = self.summary()
+        lines = [
+            "# HELP servesmart_stage_seconds_total Time spent in each pipeline stage.",
+            "# TYPE servesmart_stage_seconds_total counter",
+        ]
+        lines += [f'servesmart_stage_seconds_total{{stage="{k}"}} {v["seconds"]:.6f}' for k, v in s['stages'].items()]
+        lines += [
+            "# HELP servesmart_stage_calls_total Number of times each pipeline stage ran.",
+            "# TYPE servesmart_stage_calls_total counter",
+        ]
+        lines += [f'servesmart_stage_calls_total{{stage="{k}"}} {v["calls"]}' for k, v in s['stages'].items()]
+        for k, v in s['counters'].items():
+            lines += [f"# TYPE servesmart_{k}_total counter", f"servesmart_{k}_total {v}"]
+        # Write-then-rename so a scraper never sees a half-written file
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+    def export_jsonl(self, path):
+        with self.lock:
+            spans = list(self.spans)
+        with open(path, 'w') as f:
+            for name, start, dur, tid in spans:
+                f.write(json.dumps({'stage': name, 'start_us': start / 1000, 'dur_us': dur / 1000, 'tid': tid}) + "\n")
+
+    def export_chrome_trace(self, path):
+        with self.lock:
+            spans = list(self.spans)
+        events = [{'name': name, 'ph': 'X', 'ts': start / 1000, 'dur': dur / 1000, 'pid': self.pid, 'tid': tid}
+                  for name, start, dur, tid in spans]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+_active = None
+
+
+def enable(trace=True, max_spans=None):
+    global _active
+    _active = Profiler(trace, max_spans)
+    return _active
+
+
+def enable_from_env(max_spans=APP_MAX_SPANS):
+    # Returns the output directory if SERVESMART_PROFILE is set
+    out_dir = os.environ.get('SERVESMART_PROFILE')
+    if out_dir and _active is None:
+        enable(trace=True, max_spans=max_spans)
+    return out_dir
+
+
+def get_profiler():
+    return _active
+
+
+def stage(name):
+    return _active.stage(name) if _active is not None else _NULL
+
+
+def count(name, n=1):
+    if _active is not None:
+        _active.count(name, n)
+
+
+def export(out_dir, quiet=False):
+    if _active is None:
+        return
+    os.makedirs(out_dir, exist_ok=True)
+    _active.export_prometheus(os.path.join(out_dir, 'metrics.prom'))
+    if _active.trace:
+        _active.export_jsonl(os.path.join(out_dir, 'trace.jsonl'))
+        _active.export_chrome_trace(os.path.join(out_dir, 'trace.chrome.json'))
+    if not quiet:
+        _active.report()
+        print(f"Profile written to {out_dir}")
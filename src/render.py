@@ -0,0 +1,33 @@
+import cv2
+import numpy as np
+
+# Box drawing for (N, 6) x1 y1 x2 y2 conf cls detection arrays, used where there is
+# no ultralytics Results object to call .plot() on (server / OpenVINO / cached results).
+
+def class_color(cls_id):
+    # Stable, well-spread BGR color per class
+    hue = int(cls_id * 47) % 180
+    hsv = np.uint8([[[hue, 220, 255]]])
+    return tuple(int(c) for c in cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)[0, 0])
+
+
+def draw_detections(img, dets, names, scale=1.0, copy=True, prefixes=None):
+    # scale maps detection pixels onto img (e.g. drawing full-res boxes on a preview)
+    # prefixes: optional text per box put before the label (e.g. track ids)
+    out = img.copy() if copy else img
+    thickness = max(1, int(round(max(out.shape[:2]) / 600)))
+    for k, (x1, y1, x2, y2, conf, cls_id) in enumerate(np.asarray(dets, dtype=np.float32).reshape(-1, 6)):
+        color = class_color(int(cls_id))
+        p1 = (int(x1 * scale), int(y1 * scale))
+        p2 = (int(x2 * scale), int(y2 * scale))
+        cv2.rectangle(out, p1, p2, color, thickness, cv2.LINE_AA)
+
+        label = f"{names.get(int(cls_id), int(cls_id))} {conf:.2f}"
+        if prefixes is not None:
+            label = f"{prefixes[k]} {label}"
+        (tw, th), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.4 * thickness, thickness)
+        top = max(p1[1] - th - 4, 0)
+        cv2.rectangle(out, (p1[0], top), (p1[0] + tw + 2, top + th + 4), color, -1)
+        cv2.putText(out, label, (p1[0] + 1, top + th + 1), cv2.FONT_HERSHEY_SIMPLEX, 0.4 * thickness,
+                    (255, 255, 255), thickness, cv2.LINE_AA)
+    return out
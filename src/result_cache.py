@@ -0,0 +1,136 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from model_registry import resolve_path, file_signature
+
+# Detection cache for repeat images.
+# Key = (image content hash, model fingerprint, conf, iou, imgsz, mode) so a retrained/re-exported
+# model or any changed setting is a miss. Two tiers:
+#   memory  LRU of the most recent entries (per process)
+#   disk    SQLite file shared by app.py and predict.py runs, least recently used rows evicted by size
+# Values are (dets, (h, w)) with dets (N, 6) float32 x1 y1 x2 y2 conf cls in original pixels.
+
+DEFAULT_PATH = 'prediction_cache.db'
+DEFAULT_DISK_MB = float(os.environ.get('SERVESMART_RESULT_CACHE_MB', 512))
+
+
+def image_digest(data):
+    # data: encoded file bytes (what was uploaded / stored), not the decoded pixels
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_digest(path, chunk=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(chunk)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def model_fingerprint(name):
+    # Registry name or path + (mtime, size), so overwriting best.pt invalidates its entries
+    path = resolve_path(name)
+    mtime, size = file_signature(path)
+    return f"{os.path.abspath(path)}:{mtime}:{size}"
+
+
+def cache_key(digest, fingerprint, conf, iou, imgsz, mode='plain'):
+    return f"{digest}|{fingerprint}|{conf:.4f}|{iou:.4f}|{imgsz}|{mode}"
+
+
+class ResultCache:
+
+    def __init__(self, path=DEFAULT_PATH, memory_items=256, disk_limit_mb=DEFAULT_DISK_MB):
+        self.memory = OrderedDict()
+        self.memory_items = memory_items
+        self.limit_bytes = int(disk_limit_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        # path=None keeps the memory tier only
+        self.db = None
+        if path:
+            # timeout: shard processes (predict_sharded.py) may share one cache file
+            self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS results ("
+                            "key TEXT PRIMARY KEY, h INTEGER, w INTEGER, dets BLOB, "
+                            "size INTEGER, last_used REAL)")
+            self.db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results(last_used)")
+            self.db.commit()
+            self.disk_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def _remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        with self.lock:
+            value = self.memory.get(key)
+            if value is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return value
+            if self.db is not None:
+                row = self.db.execute("SELECT h, w, dets FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    h, w, blob = row
+                    value = (np.frombuffer(blob, dtype=np.float32).reshape(-1, 6).copy(), (h, w))
+                    self.db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self.db.commit()
+                    self._remember(key, value)
+                    self.hits += 1
+                    return value
+            self.misses += 1
+            return None
+
+    def put(self, key, dets, shape):
+        dets = np.ascontiguousarray(dets, dtype=np.float32).reshape(-1, 6)
+        h, w = int(shape[0]), int(shape[1])
+        with self.lock:
+            self._remember(key, (dets, (h, w)))
+            if self.db is None:
+                return
+            blob = dets.tobytes()
+            old = self.db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                            (key, h, w, blob, len(blob) + len(key), time.time()))
+            self.disk_bytes += len(blob) + len(key) - (old[0] if old else 0)
+            if self.disk_bytes > self.limit_bytes:
+                self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        # Trim to 90% of the budget so eviction doesn't run on every insert near the limit
+        target = self.limit_bytes * 0.9
+        rows = self.db.execute("SELECT key, size FROM results ORDER BY last_used").fetchall()
+        stale = []
+        for key, size in rows:
+            if self.disk_bytes <= target:
+                break
+            stale.append((key,))
+            self.disk_bytes -= size
+        self.db.executemany("DELETE FROM results WHERE key = ?", stale)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0,
+                'memory_items': len(self.memory), 'disk_mb': self.disk_bytes / 1024 / 1024 if self.db else 0.0}
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
@@ -0,0 +1,272 @@
+import os
+import glob
+import json
+import time
+import argparse
+import threading
+from collections import deque
+
+import cv2
+import numpy as np
+
+import profiling
+from engine import list_images
+from evaluate import DATA_YAML, load_names
+from model_registry import get_model
+from render import draw_detections
+from tracker import IoUTracker
+from yolo_text import to_numpy, xyxy_to_rows
+
+# Stream mode for drone / ISR video: video files, cameras and image sequences.
+#   decode thread -> bounded ring buffer -> detector every Nth frame + tracker on every frame
+# The decoder only keeps every stride-th source frame (source fps / target fps), the others are
+# grabbed without being decoded to BGR. Offline (files) every kept frame is processed and the
+# decoder waits when the buffer is full. Live (cameras, or --realtime to replay a file at its
+# own speed) a full buffer overwrites its oldest frame and the processing loop always jumps to
+# the newest one, so frames are dropped only while processing is behind the target FPS.
+# Between detection frames the IoU/Kalman tracker carries the boxes (tracker.py).
+#
+#   python src/stream.py D:\feeds\patrol_03.mp4 --detect-every 3 --target-fps 15 --video-out patrol_03_tracks.mp4
+#   python src/stream.py D:\feeds\frames\ --source-fps 10          # image sequence (sorted by name)
+#   python src/stream.py 0 --target-fps 10                           # camera, live mode
+# Writes <source>_tracks.jsonl (confirmed tracks of every processed frame, boxes normalized
+# x y w h like the prediction files) and <source>_tracks.json (one entry per track: class and
+# confidence in the military_dataset.yaml scheme, first / last frame, detections).
+
+
+class RingBuffer:
+
+    def __init__(self, capacity=8, drop_oldest=False):
+        self.capacity = capacity
+        self.drop_oldest = drop_oldest
+        self.frames = deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self.cond:
+            if self.drop_oldest:
+                if len(self.frames) >= self.capacity:
+                    self.frames.popleft()
+                    self.dropped += 1
+            else:
+                while len(self.frames) >= self.capacity and not self.closed:
+                    self.cond.wait()
+            self.frames.append(item)
+            self.cond.notify_all()
+
+    def get(self, latest=False):
+        # -> next item (or the newest, dropping the rest), None once closed and empty
+        with self.cond:
+            while not self.frames and not self.closed:
+                self.cond.wait()
+            if not self.frames:
+                return None
+            if latest:
+                self.dropped += len(self.frames) - 1
+                item = self.frames.pop()
+                self.frames.clear()
+            else:
+                item = self.frames.popleft()
+            self.cond.notify_all()
+            return item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class FrameReader(threading.Thread):
+    # Puts (source frame index, seconds, BGR frame) into the buffer, closes it at the end
+
+    def __init__(self, source, buffer, target_fps=None, source_fps=None, realtime=False):
+        super().__init__(name='frame-reader', daemon=True)
+        self.buffer = buffer
+        self.realtime = realtime
+        self.stopped = threading.Event()
+        self.cap = None
+        self.paths = None
+        if os.path.isdir(source):
+            self.paths = list_images(source)
+        elif any(c in source for c in '*?['):
+            self.paths = sorted(glob.glob(source))
+        else:
+            self.cap = cv2.VideoCapture(int(source) if source.isdigit() else source)
+            if not self.cap.isOpened():
+                raise ValueError(f"Could not open {source}")
+        if self.paths is not None:
+            self.fps = source_fps or 30.0
+            self.total = len(self.paths)
+        else:
+            self.fps = source_fps or self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+            self.total = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+        self.stride = max(1, int(round(self.fps / target_fps))) if target_fps else 1
+        self.frames_read = 0
+
+    def read(self, index, keep):
+        if self.paths is not None:
+            if index >= len(self.paths):
+                return False, None
+            return True, cv2.imread(self.paths[index]) if keep else None
+        if not keep:
+            # Demux only, no conversion to BGR
+            return self.cap.grab(), None
+        ok, frame = self.cap.read()
+        return ok, frame
+
+    def run(self):
+        start = time.perf_counter()
+        index = 0
+        try:
+            while not self.stopped.is_set():
+                keep = index % self.stride == 0
+                with profiling.stage('decode'):
+                    ok, frame = self.read(index, keep)
+                if not ok:
+                    break
+                if keep and frame is not None:
+                    t = index / self.fps
+                    if self.realtime:
+                        # Replay at the source's own speed
+                        time.sleep(max(0.0, start + t - time.perf_counter()))
+                    self.buffer.put((index, t, frame))
+                    self.frames_read += 1
+                index += 1
+        finally:
+            if self.cap is not None:
+                self.cap.release()
+            self.buffer.close()
+
+    def stop(self):
+        self.stopped.set()
+        # Unblock a put() waiting on a full buffer
+        self.buffer.close()
+
+
+def track_record(track, shape, names):
+    h, w = shape
+    row = track.row()
+    xywh = xyxy_to_rows(row[:4], row[4], row[5], (h, w))[0, 1:5]
+    return {'id': track.id, 'cls': track.cls, 'name': names.get(track.cls, str(track.cls)),
+            'conf': round(track.conf, 4), 'box': [round(float(v), 6) for v in xywh]}
+
+
+def output_paths(source, out=None):
+    base = out or os.path.normpath(source).rstrip('*?') + '_tracks'
+    base = os.path.splitext(base)[0] if base.endswith('.jsonl') else base
+    return base + '.jsonl', base + '.json'
+
+
+def run_stream(model_path, source, out=None, detect_every=3, target_fps=15.0, source_fps=None, buffer_size=8,
+               realtime=None, imgsz=640, conf=0.25, iou=0.45, device=None, data=DATA_YAML, video_out=None,
+               min_hits=2, max_frames=None):
+    print(f"Loading Model: {model_path}")
+    model = get_model(model_path)
+    names = load_names(data) or dict(model.names)
+    if realtime is None:
+        # Cameras are live; files are processed frame by frame unless --realtime
+        realtime = source.isdigit()
+
+    buffer = RingBuffer(buffer_size, drop_oldest=realtime)
+    reader = FrameReader(source, buffer, target_fps, source_fps, realtime=realtime)
+    # Coast about three detection intervals before a lost track is closed
+    tracker = IoUTracker(num_classes=len(names), max_age=max(int(reader.fps), 3 * detect_every * reader.stride),
+                         min_hits=min_hits)
+    frames_path, tracks_path = output_paths(source, out)
+    print(f"{source}: {reader.fps:.1f} fps source, every {reader.stride} frame(s) kept, detection every "
+          f"{detect_every} processed frame(s), {'live' if realtime else 'offline'} mode")
+
+    writer = None
+    processed = detections = 0
+    start = time.perf_counter()
+    reader.start()
+    try:
+        with open(frames_path, 'w') as log:
+            while max_frames is None or processed < max_frames:
+                item = buffer.get(latest=realtime)
+                if item is None:
+                    break
+                index, t, frame = item
+                dets = None
+                if processed % detect_every == 0:
+                    with profiling.stage('inference'):
+                        results = model.predict(source=frame, imgsz=imgsz, conf=conf, iou=iou, device=device,
+                                                verbose=False)
+                    dets = to_numpy(results[0].boxes.data)
+                    detections += 1
+                with profiling.stage('track'):
+                    tracks = tracker.update(index, dets)
+                log.write(json.dumps({'frame': index, 'time': round(t, 3), 'detected': dets is not None,
+                                      'tracks': [track_record(tr, frame.shape[:2], names) for tr in tracks]}) + "\n")
+
+                if video_out:
+                    if writer is None:
+                        writer = cv2.VideoWriter(video_out, cv2.VideoWriter_fourcc(*'mp4v'),
+                                                 reader.fps / reader.stride, (frame.shape[1], frame.shape[0]))
+                    rows = np.array([tr.row() for tr in tracks]).reshape(-1, 6)
+                    writer.write(draw_detections(frame, rows, names, copy=False,
+                                                 prefixes=[f"#{tr.id}" for tr in tracks]))
+                processed += 1
+                profiling.count('frames')
+                if processed % 100 == 0:
+                    fps = processed / (time.perf_counter() - start)
+                    print(f"Frame {index}{f'/{reader.total}' if reader.total else ''}: {fps:.1f} fps, "
+                          f"{len(tracks)} tracks, {buffer.dropped} dropped")
+    finally:
+        reader.stop()
+        reader.join()
+        if writer is not None:
+            writer.release()
+
+    summary = [{'id': tr.id, 'cls': tr.cls, 'name': names.get(tr.cls, str(tr.cls)), 'conf': round(tr.conf, 4),
+                'first_frame': tr.first, 'last_frame': tr.last_hit, 'detections': tr.hits}
+               for tr in tracker.all_tracks()]
+    with open(tracks_path, 'w') as f:
+        json.dump({'source': source, 'fps': reader.fps, 'stride': reader.stride, 'detect_every': detect_every,
+                   'names': names, 'tracks': summary}, f, indent=1)
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{processed} frames in {elapsed:.1f}s ({processed / max(elapsed, 1e-9):.1f} fps), "
+          f"{detections} detector passes, {buffer.dropped} frames dropped to hold the rate")
+    print(f"{len(summary)} tracks:")
+    for s in summary:
+        print(f"  #{s['id']:<5} {s['name']:<20} conf {s['conf']:.2f}  frames {s['first_frame']}-{s['last_frame']} "
+              f"({s['detections']} detections)")
+    print(f"Per-frame tracks: {frames_path}\nTrack summary: {tracks_path}")
+    return summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Detection + tracking on video files, cameras or image sequences")
+    parser.add_argument('source', help="Video file, camera index, image folder or glob pattern")
+    parser.add_argument('--model', default='military-l', help="Path or model_registry name")
+    parser.add_argument('--out', default=None, help="Output base path (default: <source>_tracks)")
+    parser.add_argument('--detect-every', type=int, default=3, help="Run the detector every Nth processed frame")
+    parser.add_argument('--target-fps', type=float, default=15.0, help="Frames per second to process")
+    parser.add_argument('--source-fps', type=float, default=None, help="Frame rate of an image sequence")
+    parser.add_argument('--buffer', type=int, default=8, help="Decoded frames held between decoder and model")
+    parser.add_argument('--realtime', action='store_true', help="Replay a file at its own speed, dropping frames")
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--iou', type=float, default=0.45)
+    parser.add_argument('--min-hits', type=int, default=2, help="Detections before a track is reported")
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--data', default=DATA_YAML, help="Dataset yaml for class names")
+    parser.add_argument('--video-out', default=None, help="Write an annotated .mp4")
+    parser.add_argument('--device', default=None)
+    parser.add_argument('--profile', default=None, metavar='DIR',
+                        help="Time every stage; write metrics.prom + JSONL/Chrome traces to DIR")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.profile:
+        profiling.enable()
+    run_stream(args.model, args.source, args.out, detect_every=args.detect_every, target_fps=args.target_fps,
+               source_fps=args.source_fps, buffer_size=args.buffer, realtime=True if args.realtime else None,
+               imgsz=args.imgsz, conf=args.conf, iou=args.iou, device=args.device, data=args.data,
+               video_out=args.video_out, min_hits=args.min_hits, max_frames=args.max_frames)
+    if args.profile:
+        profiling.export(args.profile)
@@ -0,0 +1,200 @@
+from collections import deque
+
+import numpy as np
+
+import profiling
+from box_ops import merge_detections
+from yolo_text import to_numpy
+
+# Native replacement for SAHI's get_sliced_prediction:
+#   - tiles are NumPy views into the decoded image (no copies)
+#   - tiles from several images share one batched forward pass
+#   - per-image results are merged with a vectorized class-aware NMM (SAHI default) / NMS / WBF
+
+
+def tile_starts(length, tile, overlap):
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    starts = list(range(0, length - tile, stride))
+    # Last tile is pinned to the border so every tile is full size
+    starts.append(length - tile)
+    return starts
+
+
+def tile_grid(h, w, tile=640, overlap=0.5):
+    ys = tile_starts(h, tile, overlap)
+    xs = tile_starts(w, tile, overlap)
+    return np.array([(x, y, min(x + tile, w), min(y + tile, h)) for y in ys for x in xs], dtype=np.int64)
+
+
+def cut_tiles(img, grid):
+    # Basic slicing returns views into the decoded image, nothing is copied here
+    return [img[y0:y1, x0:x1] for x0, y0, x1, y1 in grid]
+
+
+EMPTY = np.zeros((0, 6), dtype=np.float32)
+
+
+class TiledPredictor:
+
+    def __init__(self, model, tile=640, overlap=0.5, batch_size=16, imgsz=640, conf=0.10, iou=0.7,
+                 full_frame=True, merge='nmm', merge_thr=0.5, merge_metric='ios', device=None, augment=False):
+        self.model = model
+        self.tile = tile
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        # Like SAHI's perform_standard_pred: one downscaled full-frame pass for the large objects
+        self.full_frame = full_frame
+        self.merge = merge
+        self.merge_thr = merge_thr
+        self.merge_metric = merge_metric
+        self.device = device
+        self.augment = augment
+
+        self.forward_passes = 0
+        self.tiles_processed = 0
+        self.images_processed = 0
+
+    def infer(self, arrays):
+        # One forward pass over a list of HxWx3 arrays; boxes come back in each array's own pixels
+        with profiling.stage('inference'):
+            results = self.model.predict(source=arrays, imgsz=self.imgsz, conf=self.conf, iou=self.iou,
+                                         device=self.device, augment=self.augment, verbose=False)
+        profiling.count('tiles', len(arrays))
+        self.forward_passes += 1
+        self.tiles_processed += len(arrays)
+        return [to_numpy(r.boxes.data).astype(np.float32, copy=False) for r in results]
+
+    def plan(self, img):
+        h, w = img.shape[:2]
+        grid = tile_grid(h, w, self.tile, self.overlap)
+        if self.full_frame and len(grid) > 1:
+            grid = np.vstack([grid, [[0, 0, w, h]]])
+        return grid
+
+    def _run(self, pending):
+        chunk = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+        for (job, (x0, y0), _), dets in zip(chunk, self.infer([tile for _, _, tile in chunk])):
+            if len(dets):
+                dets = dets.copy()
+                dets[:, [0, 2]] += x0
+                dets[:, [1, 3]] += y0
+                job['dets'].append(dets)
+            job['remaining'] -= 1
+
+    def _finished(self, jobs):
+        # Yield in input order: only pop jobs from the front once all their tiles are done
+        while jobs and jobs[0]['remaining'] == 0:
+            job = jobs.popleft()
+            dets = np.concatenate(job['dets']) if job['dets'] else EMPTY
+            with profiling.stage('merge'):
+                dets = merge_detections(dets, self.merge_thr, self.merge_metric, self.merge)
+            self.images_processed += 1
+            yield job['item'], dets
+
+    def enqueue(self, item, grid, jobs, pending):
+        job = {'item': item, 'remaining': len(grid), 'dets': []}
+        jobs.append(job)
+        for region, tile in zip(grid, cut_tiles(item['img'], grid)):
+            pending.append((job, region[:2], tile))
+
+    def predict(self, items):
+        # items: dicts with 'img' (BGR array or None), e.g. from engine.read_image.
+        # Yields (item, dets) with dets = (N, 6) x1 y1 x2 y2 conf cls in original pixels.
+        jobs = deque()
+        pending = deque()
+        for item in items:
+            img = item['img']
+            grid = self.plan(img) if img is not None else np.zeros((0, 4), dtype=np.int64)
+            self.enqueue(item, grid, jobs, pending)
+            while len(pending) >= self.batch_size:
+                self._run(pending)
+                yield from self._finished(jobs)
+        while pending:
+            self._run(pending)
+        yield from self._finished(jobs)
+
+
+class AdaptiveTiledPredictor(TiledPredictor):
+    # Cheap full-frame pass first, then tile only where it found small or uncertain objects.
+    # Overlap is picked per image from the size of those objects instead of a fixed 50%.
+
+    def __init__(self, model, low_conf=0.5, small_px=32, min_overlap=0.1, **kwargs):
+        super().__init__(model, **kwargs)
+        self.low_conf = low_conf      # boxes below this confidence are worth a closer look
+        self.small_px = small_px      # boxes smaller than this at network resolution are too
+        self.min_overlap = min_overlap
+        self.max_overlap = self.overlap
+
+        self.uniform_tiles = 0        # what uniform slicing at max_overlap would have run
+        self.tiles_skipped = 0
+        self.images_tiled = 0
+
+    def pick_overlap(self, sizes):
+        # Overlap wide enough that ~90% of the objects of interest fit whole inside one tile
+        if len(sizes) == 0:
+            return self.min_overlap
+        ratio = np.percentile(sizes, 90) * 1.2 / self.tile
+        return float(np.clip(ratio, self.min_overlap, self.max_overlap))
+
+    def plan_adaptive(self, img, dets):
+        h, w = img.shape[:2]
+        uniform = len(tile_grid(h, w, self.tile, self.max_overlap))
+        self.uniform_tiles += uniform if uniform > 1 else 0
+
+        scale = self.imgsz / max(h, w)
+        if scale >= 1 or len(dets) == 0:
+            # Full frame already ran at native resolution, or there is nothing to zoom in on
+            self.tiles_skipped += uniform if uniform > 1 else 0
+            return np.zeros((0, 4), dtype=np.int64)
+
+        bw = dets[:, 2] - dets[:, 0]
+        bh = dets[:, 3] - dets[:, 1]
+        sizes = np.maximum(bw, bh)
+        active = (dets[:, 4] < self.low_conf) | (sizes * scale < self.small_px)
+        if not active.any():
+            self.tiles_skipped += uniform
+            return np.zeros((0, 4), dtype=np.int64)
+
+        grid = tile_grid(h, w, self.tile, self.pick_overlap(sizes[active]))
+        cx = (dets[active, 0] + dets[active, 2]) / 2
+        cy = (dets[active, 1] + dets[active, 3]) / 2
+        hit = ((cx[None, :] >= grid[:, 0:1]) & (cx[None, :] < grid[:, 2:3]) &
+               (cy[None, :] >= grid[:, 1:2]) & (cy[None, :] < grid[:, 3:4])).any(1)
+        grid = grid[hit]
+
+        self.tiles_skipped += max(uniform - len(grid), 0)
+        self.images_tiled += 1
+        return grid
+
+    def _predict_group(self, group):
+        readable = [item for item in group if item['img'] is not None]
+        first = dict(zip(map(id, readable), self.infer([item['img'] for item in readable]))) if readable else {}
+
+        jobs = deque()
+        pending = deque()
+        for item in group:
+            if item['img'] is None:
+                self.enqueue(item, np.zeros((0, 4), dtype=np.int64), jobs, pending)
+                continue
+            dets = first[id(item)]
+            self.enqueue(item, self.plan_adaptive(item['img'], dets), jobs, pending)
+            jobs[-1]['dets'].append(dets)
+
+        while pending:
+            self._run(pending)
+        yield from self._finished(jobs)
+
+    def predict(self, items):
+        group = []
+        for item in items:
+            group.append(item)
+            if len(group) == self.batch_size:
+                yield from self._predict_group(group)
+                group = []
+        if group:
+            yield from self._predict_group(group)
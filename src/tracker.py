@@ -0,0 +1,174 @@
+import numpy as np
+
+from box_ops import pairwise_overlap
+
+# Lightweight multi-object tracker for stream.py (SORT-style): one constant-velocity Kalman filter
+# per track on (cx, cy, w, h), detections linked to the predicted boxes by greedy IoU matching
+# (then center distance, for small objects that moved further than their own size).
+# Between detection frames the tracks coast on their Kalman prediction, so the detector only has
+# to run every Nth frame. Association is class-agnostic (a vehicle the model calls truck on one
+# frame and military_vehicle on the next stays one track); the class of a track is the vote of
+# all its detections, weighted by confidence.
+#
+#   tracker = IoUTracker(num_classes=12)
+#   tracks = tracker.update(frame_index, dets)    # detection frame, dets (N, 6) x1 y1 x2 y2 conf cls
+#   tracks = tracker.update(frame_index)          # in between: prediction only
+
+
+def xyxy_to_cxcywh(box):
+    x1, y1, x2, y2 = box
+    return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+
+class KalmanBox:
+    # Process / measurement noise scale with the box size, like DeepSORT's
+    POS = 1 / 20
+    VEL = 1 / 160
+
+    def __init__(self, box):
+        z = xyxy_to_cxcywh(box)
+        self.x = np.concatenate([z, np.zeros(4)])
+        s = max(z[2], z[3], 1.0)
+        self.P = np.diag(np.r_[[2 * self.POS * s] * 4, [10 * self.VEL * s] * 4] ** 2)
+
+    def predict(self, dt=1.0):
+        # dt in source frames, so dropped / skipped frames move the box as far as they should
+        if dt <= 0:
+            return
+        F = np.eye(8)
+        F[:4, 4:] = np.eye(4) * dt
+        s = max(self.x[2], self.x[3], 1.0)
+        Q = np.diag(np.r_[[self.POS * s] * 4, [self.VEL * s] * 4] ** 2) * dt
+        self.x = F @ self.x
+        self.x[2:4] = self.x[2:4].clip(1.0)
+        self.P = F @ self.P @ F.T + Q
+
+    def update(self, box):
+        z = xyxy_to_cxcywh(box)
+        s = max(z[2], z[3], 1.0)
+        R = np.eye(4) * (self.POS * s) ** 2
+        S = self.P[:4, :4] + R
+        K = self.P[:, :4] @ np.linalg.inv(S)
+        self.x = self.x + K @ (z - self.x[:4])
+        self.P = self.P - K @ self.P[:4, :]
+
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
+
+
+class Track:
+
+    def __init__(self, track_id, det, index, num_classes):
+        self.id = track_id
+        self.kf = KalmanBox(det[:4])
+        self.first = index
+        self.last_hit = index
+        self.frame = index
+        self.hits = 0
+        # Summed confidence and detection count per class
+        self.class_conf = np.zeros(num_classes)
+        self.class_hits = np.zeros(num_classes, dtype=np.int64)
+        self.vote(det)
+
+    def vote(self, det):
+        cls = int(det[5])
+        if cls >= len(self.class_conf):
+            self.class_conf = np.pad(self.class_conf, (0, cls + 1 - len(self.class_conf)))
+            self.class_hits = np.pad(self.class_hits, (0, cls + 1 - len(self.class_hits)))
+        self.class_conf[cls] += det[4]
+        self.class_hits[cls] += 1
+        self.hits += 1
+
+    @property
+    def cls(self):
+        return int(np.argmax(self.class_conf))
+
+    @property
+    def conf(self):
+        # Mean confidence of the detections that voted for the track's class
+        c = self.cls
+        return float(self.class_conf[c] / max(self.class_hits[c], 1))
+
+    def row(self):
+        # -> x1 y1 x2 y2 conf cls, the detection layout
+        return np.r_[self.kf.box(), self.conf, self.cls]
+
+
+class IoUTracker:
+
+    def __init__(self, num_classes=12, iou_thr=0.3, dist_thr=1.0, max_age=30, min_hits=2):
+        self.num_classes = num_classes
+        self.iou_thr = iou_thr
+        # Second pass for what IoU left over: center distance in track box diagonals. Catches small,
+        # fast objects that moved more than their own size between sparse detections.
+        self.dist_thr = dist_thr
+        # Source frames a track coasts without a matching detection before it is dropped
+        self.max_age = max_age
+        # Detections before a track is reported (one-frame false positives never show)
+        self.min_hits = min_hits
+        self.tracks = []
+        self.finished = []
+        self.next_id = 1
+
+    def predict(self, index):
+        for t in self.tracks:
+            t.kf.predict(index - t.frame)
+            t.frame = index
+
+    def match(self, dets):
+        # Greedy assignment, IoU first then center distance -> [(track i, det j)], unmatched det indices
+        if not self.tracks or not len(dets):
+            return [], list(range(len(dets)))
+        boxes = np.array([t.kf.box() for t in self.tracks])
+        det_boxes = dets[:, :4].astype(np.float64)
+        iou = pairwise_overlap(boxes, det_boxes, 'iou')
+        diag = np.hypot(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1]).clip(1.0)
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        dist = np.linalg.norm(centers[:, None] - (det_boxes[None, :, :2] + det_boxes[None, :, 2:]) / 2, axis=2)
+        pairs = []
+        used_t, used_d = set(), set()
+        # Both passes as "higher is better" scores with a cut-off
+        for score, thr in ((iou, self.iou_thr), (-dist / diag[:, None], -self.dist_thr)):
+            for flat in np.argsort(-score, axis=None, kind='stable'):
+                i, j = divmod(int(flat), score.shape[1])
+                if score[i, j] < thr:
+                    break
+                if i in used_t or j in used_d:
+                    continue
+                pairs.append((i, j))
+                used_t.add(i)
+                used_d.add(j)
+        return pairs, [j for j in range(len(dets)) if j not in used_d]
+
+    def update(self, index, dets=None):
+        # -> confirmed tracks after frame `index`; dets=None on frames the detector skipped
+        self.predict(index)
+        if dets is not None:
+            dets = np.asarray(dets, dtype=np.float32).reshape(-1, 6)
+            pairs, unmatched = self.match(dets)
+            for i, j in pairs:
+                track = self.tracks[i]
+                track.kf.update(dets[j, :4])
+                track.vote(dets[j])
+                track.last_hit = index
+            for j in unmatched:
+                self.tracks.append(Track(self.next_id, dets[j], index, self.num_classes))
+                self.next_id += 1
+
+        alive = []
+        for t in self.tracks:
+            if index - t.last_hit > self.max_age:
+                if t.hits >= self.min_hits:
+                    self.finished.append(t)
+            else:
+                alive.append(t)
+        self.tracks = alive
+        return self.confirmed()
+
+    def confirmed(self):
+        return [t for t in self.tracks if t.hits >= self.min_hits]
+
+    def all_tracks(self):
+        # Every track that was ever confirmed, finished or still alive
+        return sorted(self.finished + self.confirmed(), key=lambda t: t.id)
@@ -2,9 +2,16 @@
 from ultralytics import YOLO
 import os
 
+import train_hooks
+from online_paste import build_online_paste
+
 # Fix for CUDA memory fragmentation
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 
+# Rare-class copy-paste applied on the fly by the dataloader (online_paste.py).
+# Set to False to train on the dataset as-is.
+ONLINE_PASTE = True
+
 def train_model():
     # Define absolute path to dataset config
     data_yaml = r'D:\military_object_dataset\military_object_dataset\military_dataset.yaml'
@@ -19,10 +26,14 @@ def train_model():
         # Using 'l' (large) for better accuracy as primary goal is >95% mAP
         model = YOLO('yolov8l.pt') 
 
+    hooks = [build_online_paste(os.path.dirname(data_yaml))] if ONLINE_PASTE else []
+
     print("Starting training...")
     
     # Training arguments
-    results = model.train(
+    results = train_hooks.train(
+        model,
+        label_hooks=hooks,
         data=data_yaml,
         epochs=30,           # Sufficient for fine-tuning
         imgsz=640,
@@ -39,7 +50,7 @@ def train_model():
         seed=42,
         cos_lr=True,         # Cosine learning rate scheduler
         
-        # Augmentation hyperparameters (mild mixup/mosaic as we already did synthetic)
+        # Augmentation hyperparameters (mild mixup/mosaic on top of the online rare-class paste)
         mosaic=1.0,
         mixup=0.1,
         copy_paste=0.1,      # Additional built-in copy-paste
@@ -2,6 +2,8 @@
 from ultralytics import YOLO
 import os
 
+import train_hooks
+
 # Fix for CUDA memory fragmentation
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 
@@ -22,7 +24,11 @@ def train_balanced():
 
     # Training Configuration
     # Goal: >95% in ~8-10 hours
-    results = model.train(
+    results = train_hooks.train(
+        model,
+        # Rare-class images drawn more often (balanced_sampler.py) instead of training on cloned files;
+        # class weights capped at 50x the most common class
+        class_balance={'cap': 50.0},
         data=data_yaml,
         epochs=100,          # 100 is the sweet spot for high accuracy
         imgsz=640,
@@ -2,16 +2,25 @@
 from ultralytics import YOLO
 import os
 
+import train_hooks
+from online_paste import build_online_paste
+
+from model_registry import resolve_path
+
 # Fix for CUDA memory fragmentation
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 
+# Rare-class copy-paste applied on the fly by the dataloader (online_paste.py).
+# Set to False to train on the dataset as-is.
+ONLINE_PASTE = True
+
 def train_emergency():
     print("--- EMERGENCY HYPER-TUNING (The 'Final Push') ---")
     print("Strategy: High Res (800p) + Low LR + Aggressive Augmentation")
     
     # 1. Load the Best 80-Epoch Model
     # This is our "Pre-trained" base. We don't start from scratch.
-    model_path = r'runs/train/yolov8l_military_resumed/weights/best.pt'
+    model_path = resolve_path('military-l')
     
     if not os.path.exists(model_path):
         print(f"❌ Error: Model not found at {model_path}")
@@ -20,9 +29,15 @@ def train_emergency():
     print(f"Loading weights from: {model_path}")
     model = YOLO(model_path)
 
+    data_yaml = r'D:\military_object_dataset\military_object_dataset\military_dataset.yaml'
+    hooks = [build_online_paste(os.path.dirname(data_yaml))] if ONLINE_PASTE else []
+
     # 2. Train with "Hyper-Focused" Settings
-    results = model.train(
-        data=r'D:\military_object_dataset\military_object_dataset\military_dataset.yaml',
+    results = train_hooks.train(
+        model,
+        label_hooks=hooks,
+        cache_images=True,   # Decoded 800p images from a memory-mapped disk cache (image_cache.py)
+        data=data_yaml,
         
         # TIME CRITICAL SETTINGS
         epochs=50,           # We don't have time for 140. 50 High-Quality epochs is enough.
@@ -40,7 +55,7 @@ def train_emergency():
         # MEMORY SAFETY
         batch=2,             # Keep it low for High Res
         workers=2,
-        cache=False,
+        cache=False,         # Save RAM (cache_images above instead)
         
         # ROBUSTNESS (The "Weather" & "Lighting" request)
         hsv_h=0.015,         # Hue variation
@@ -49,7 +64,7 @@ def train_emergency():
         scale=0.5,           # Scale variation (0.5x to 1.5x)
         mosaic=1.0,
         mixup=0.15,
-        copy_paste=0.15,     # Keep using our synthetic data trick
+        copy_paste=0.15,     # Built-in copy-paste on top of the online rare-class paste
         
         project='runs/train',
         name='yolov8l_emergency_finetune',
@@ -2,6 +2,8 @@
 from ultralytics import YOLO
 import os
 
+import train_hooks
+
 # Fix for CUDA memory fragmentation
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 
@@ -16,7 +18,9 @@ def train_hd_sniper():
     # 'Medium' model @ 1280p fits in your 8GB.
     model = YOLO('yolov8m.pt') 
 
-    results = model.train(
+    results = train_hooks.train(
+        model,
+        cache_images=True,   # Decoded 1280p images from a memory-mapped disk cache (image_cache.py)
         data=data_yaml,
         epochs=50,           # 50 Epochs of HD training is worth 200 of SD
         imgsz=1280,          # THE KEY TO 95%: HD Resolution
@@ -24,7 +28,7 @@ def train_hd_sniper():
         # Memory Optimization for 8GB VRAM
         batch=2,             # Very small batch for massive images
         workers=2,
-        cache=False,         # Save RAM
+        cache=False,         # Save RAM (cache_images above instead)
         
         save=True,
         project='runs/train',
@@ -0,0 +1,127 @@
+import os
+
+import torch
+from ultralytics.data.build import PIN_MEMORY, InfiniteDataLoader, seed_worker
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.detect import DetectionTrainer, DetectionValidator
+
+from balanced_sampler import BalancedSampler, class_matrix, distribution, format_distribution, image_weights, \
+    labels_dir_for
+from image_cache import load_image_cache
+from label_index import load_index
+
+# Extension point for the ultralytics training pipeline (train.py, train_finetune.py, train_ultimate.py).
+#   results = train(model, label_hooks=[OnlinePaste(...)], cache_images=True, data=..., epochs=...)
+#   metrics = val(model, data=..., imgsz=1280)
+# Label hooks run on every image the train dataset loads: the base image of a batch sample and
+# the extra images pulled in by mosaic/mixup, inside the dataloader workers, before the
+# ultralytics augmentations. A hook takes and returns the ultralytics label dict
+# ('img', 'instances', 'cls', ...).
+# cache_images serves train and val images from image_cache.py's memory-mapped cache at the
+# run's imgsz instead of decoding them every epoch (keep the ultralytics cache=False), with
+# the split's own resize interpolation.
+# class_balance=True (or a dict of balanced_sampler.image_weights options: cap, power,
+# skip_synthetic) draws train images with a class-balanced sampler instead of shuffling, and
+# prints the class distribution each epoch was drawn with.
+
+
+class HookedDataset(YOLODataset):
+    # Swapped in as the class of a built dataset; module-level so dataloader workers can unpickle it
+    label_hooks = ()
+    image_cache = None
+
+    def load_image(self, i, rect_mode=True):
+        hit = None
+        if self.image_cache is not None and rect_mode:
+            # Augmentations may edit the image in place, so training gets its own copy
+            hit = self.image_cache.get(self.im_files[i], copy=self.augment)
+        if hit is None:
+            return super().load_image(i, rect_mode)
+        im, hw0 = hit
+        if self.augment:
+            # Mosaic draws its partner images from this buffer of recently loaded indices
+            self.buffer.append(i)
+            if len(self.buffer) >= self.max_buffer_length:
+                self.buffer.pop(0)
+        return im, hw0, im.shape[:2]
+
+    def get_image_and_label(self, index):
+        label = super().get_image_and_label(index)
+        for hook in self.label_hooks:
+            label = hook(label)
+        return label
+
+
+def hook_dataset(dataset, label_hooks=(), image_cache=None):
+    if not label_hooks and image_cache is None:
+        return dataset
+    dataset.__class__ = HookedDataset
+    dataset.label_hooks = list(label_hooks)
+    dataset.image_cache = image_cache
+    return dataset
+
+
+class HookedTrainer(DetectionTrainer):
+    # model.train(trainer=...) instantiates the class itself, so options are passed as class attributes
+    label_hooks = []
+    cache_images = False
+    class_balance = None
+
+    def build_dataset(self, img_path, mode='train', batch=None):
+        dataset = super().build_dataset(img_path, mode, batch)
+        # Train images are resized like the augmented dataset would (INTER_LINEAR), val ones with INTER_AREA
+        cache = load_image_cache(img_path, self.args.imgsz, augment=mode == 'train') if self.cache_images else None
+        return hook_dataset(dataset, self.label_hooks if mode == 'train' else (), cache)
+
+    def get_dataloader(self, dataset_path, batch_size=16, rank=0, mode='train'):
+        if mode != 'train' or not self.class_balance:
+            return super().get_dataloader(dataset_path, batch_size, rank, mode)
+        if rank != -1:
+            print("WARNING: class_balance is single-GPU only, using the default shuffled loader")
+            return super().get_dataloader(dataset_path, batch_size, rank, mode)
+
+        dataset = self.build_dataset(dataset_path, mode, batch_size)
+        options = self.class_balance if isinstance(self.class_balance, dict) else {}
+        index = load_index(labels_dir_for(dataset))
+        names = [os.path.splitext(os.path.basename(f))[0] for f in dataset.im_files]
+        self.sampler = BalancedSampler(image_weights(index, names, **options), seed=self.args.seed)
+        self.sampler_classes = class_matrix(index, names, len(self.data['names']))
+        self.add_callback('on_train_epoch_start', report_sampled_classes)
+        print(f"Class-balanced sampler: {self.sampler.num_samples} of {len(dataset)} images per epoch")
+
+        # Same loader as ultralytics' build_dataloader, with the sampler in place of shuffle
+        nw = min(os.cpu_count() // max(torch.cuda.device_count(), 1), self.args.workers)
+        generator = torch.Generator()
+        generator.manual_seed(6148914691236517205)
+        return InfiniteDataLoader(dataset=dataset, batch_size=min(batch_size, len(dataset)), shuffle=False,
+                                  num_workers=nw, sampler=self.sampler, pin_memory=PIN_MEMORY,
+                                  collate_fn=getattr(dataset, 'collate_fn', None), worker_init_fn=seed_worker,
+                                  generator=generator)
+
+
+def report_sampled_classes(trainer):
+    # The draw of the epoch that is starting (mosaic partners are not counted)
+    if trainer.sampler.last_draw is not None:
+        counts = distribution(trainer.sampler.last_draw, trainer.sampler_classes)
+        print(f"Epoch {trainer.epoch + 1} sampled classes: {format_distribution(counts, trainer.data['names'])}")
+
+
+class HookedValidator(DetectionValidator):
+    cache_images = True
+
+    def build_dataset(self, img_path, mode='val', batch=None):
+        dataset = super().build_dataset(img_path, mode, batch)
+        return hook_dataset(dataset, image_cache=load_image_cache(img_path, self.args.imgsz)
+                            if self.cache_images else None)
+
+
+def train(model, label_hooks=(), cache_images=False, class_balance=None, **train_args):
+    HookedTrainer.label_hooks = list(label_hooks)
+    HookedTrainer.cache_images = cache_images
+    HookedTrainer.class_balance = class_balance
+    return model.train(trainer=HookedTrainer, **train_args)
+
+
+def val(model, cache_images=True, **val_args):
+    HookedValidator.cache_images = cache_images
+    return model.val(validator=HookedValidator, **val_args)
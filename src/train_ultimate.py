@@ -2,9 +2,16 @@
 from ultralytics import YOLO
 import os
 
+import train_hooks
+from online_paste import build_online_paste
+
 # Fix for CUDA memory fragmentation
 os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
 
+# Rare-class copy-paste applied on the fly by the dataloader (online_paste.py).
+# Set to False to train on the dataset as-is.
+ONLINE_PASTE = True
+
 def train_ultimate():
     print("Initializing ULTIMATE TRAINING for MAX ACCURACY (>95%)...")
     
@@ -17,11 +24,14 @@ def train_ultimate():
     
     print(f"Loading {model_name} (The Beast)...")
     model = YOLO(model_name)
+    hooks = [build_online_paste(os.path.dirname(data_yaml))] if ONLINE_PASTE else []
 
     # Training Configuration for WINNING
     # 300 Epochs is standard for competition-grade accuracy.
     # Patience 50 allows it to learn through plateaus.
-    results = model.train(
+    results = train_hooks.train(
+        model,
+        label_hooks=hooks,
         data=data_yaml,
         epochs=300,          # The detailed study session
         imgsz=640,
@@ -2,12 +2,16 @@
 from ultralytics import YOLO
 import sys
 
+import train_hooks
+from model_registry import resolve_path
+
 def validate_model(model_path):
     print(f"Validating model: {model_path}")
-    model = YOLO(model_path)
+    model = YOLO(resolve_path(model_path))
     
-    # Run validation
-    metrics = model.val(
+    # Run validation (images from the memory-mapped decode cache shared with training, image_cache.py)
+    metrics = train_hooks.val(
+        model,
         data=r'D:\military_object_dataset\military_object_dataset\military_dataset.yaml',
         split='val',
         batch=16,
@@ -30,6 +34,6 @@ if __name__ == "__main__":
     if len(sys.argv) > 1:
         model_p = sys.argv[1]
     else:
-        model_p = 'runs/train/yolov8l_military/weights/best.pt'
+        model_p = 'military-l-base'
         
     validate_model(model_p)
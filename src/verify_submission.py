@@ -2,6 +2,10 @@
 import os
 import glob
 
+import numpy as np
+
+from label_index import load_index
+
 def verify_submission():
     print("--- Verifying Submission Compliance ---")
     
@@ -10,20 +14,14 @@ def verify_submission():
     
     # 1. Count Check
     test_imgs = glob.glob(os.path.join(test_dir, '*.jpg'))
-    pred_txts = glob.glob(os.path.join(pred_dir, '*.txt'))
-    
-    # We need to account for the fact that pred_dir might be zipped or inside the project.
-    # The predict.py saved to 'predictions' folder.
+    # pred_dir may also be the ZIP written by predict.py; both are read through the label index
+    preds = load_index(pred_dir)
     
     print(f"Test Images Found: {len(test_imgs)}")
-    print(f"Prediction Files Found: {len(pred_txts)}")
+    print(f"Prediction Files Found: {preds.num_images}")
     
-    missing = []
-    for img in test_imgs:
-        base = os.path.splitext(os.path.basename(img))[0]
-        txt_path = os.path.join(pred_dir, base + '.txt')
-        if not os.path.exists(txt_path):
-            missing.append(base)
+    have = set(preds.names.tolist())
+    missing = [b for b in (os.path.splitext(os.path.basename(img))[0] for img in test_imgs) if b not in have]
             
     if missing:
         print(f"CRITICAL ERROR: Missing {len(missing)} prediction files!")
@@ -34,18 +32,17 @@ def verify_submission():
 
     # 2. Format Check
     print("\nChecking File Content Format...")
-    valid_format = True
-    if pred_txts:
-        # Check first 5
-        for p in pred_txts[:5]:
-            with open(p, 'r') as f:
-                lines = f.readlines()
-                for line in lines:
-                    parts = line.strip().split()
-                    if len(parts) != 6:
-                        print(f"ERROR in {os.path.basename(p)}: Found {len(parts)} values, expected 6 (class x y w h conf)")
-                        valid_format = False
-                        break
+    # Every line of every file, not just a sample: one vector compare over the index
+    bad = np.flatnonzero(preds.nvals != 6)
+    unparsable = np.flatnonzero(preds.skipped)
+    valid_format = len(bad) == 0 and len(unparsable) == 0
+    for i in unparsable[:5]:
+        print(f"ERROR in {preds.names[i]}.txt: {preds.skipped[i]} unreadable lines")
+    for row in bad[:5]:
+        name = preds.names[preds.image_id[row]]
+        print(f"ERROR in {name}.txt: Found {preds.nvals[row]} values, expected 6 (class x y w h conf)")
+    if len(bad) > 5:
+        print(f"... {len(bad)} malformed lines in total")
     
     if valid_format:
         print("SUCCESS: Content format looks correct (6 values per line).")
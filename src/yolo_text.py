@@ -0,0 +1,36 @@
+import numpy as np
+
+# Shared serializer for the submission format:
+#   class_id x_center y_center width height confidence   (normalized, one box per line)
+
+ROW_FORMAT = "%d %.6f %.6f %.6f %.6f %.6f\n"
+
+
+def to_numpy(x):
+    # Accepts torch tensors (any device) or array-likes; one device->host copy at most
+    if hasattr(x, 'cpu'):
+        x = x.cpu().numpy()
+    return np.asarray(x)
+
+
+def xyxy_to_rows(xyxy, conf, cls, orig_shape):
+    # Absolute pixel boxes -> (N, 6) rows in output column order
+    h, w = orig_shape
+    xyxy = np.asarray(xyxy, dtype=np.float64).reshape(-1, 4)
+    rows = np.empty((len(xyxy), 6), dtype=np.float64)
+    rows[:, 0] = np.asarray(cls).reshape(-1)
+    rows[:, 1] = (xyxy[:, 0] + xyxy[:, 2]) / (2 * w)
+    rows[:, 2] = (xyxy[:, 1] + xyxy[:, 3]) / (2 * h)
+    rows[:, 3] = (xyxy[:, 2] - xyxy[:, 0]) / w
+    rows[:, 4] = (xyxy[:, 3] - xyxy[:, 1]) / h
+    rows[:, 5] = np.asarray(conf).reshape(-1)
+    return rows
+
+
+def format_rows(rows):
+    # One %-format call over the whole image's rows (after a single device->host copy in
+    # to_numpy) instead of a Python f-string per box; each value is still a Python float.
+    rows = np.asarray(rows, dtype=np.float64)
+    if len(rows) == 0:
+        return ""
+    return (ROW_FORMAT * len(rows)) % tuple(rows.ravel().tolist())